@@ -0,0 +1 @@
+"""Offline benchmarks package, with a synthetic MKV corpus and fake Aria2/Discord stand-ins."""
@@ -0,0 +1,162 @@
+"""Corpus module generating synthetic Matroska files with mkvmerge."""
+
+import math
+import os
+import struct
+import subprocess
+import wave
+from pathlib import Path
+
+from utils.logger import get_logger
+
+# Configure logging
+logger = get_logger("bench_corpus")
+
+LANGUAGES = ["eng", "jpn", "fre", "ger", "spa", "ita", "por", "rus"]
+
+class CorpusSpec(dict):
+    """Type definition for the layout of a synthetic Matroska file."""
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.name = data.get("name", "")
+        self.duration = data.get("duration", 60)
+        self.subtitle_tracks = data.get("subtitle_tracks", 1)
+        self.audio_tracks = data.get("audio_tracks", 1)
+        self.fonts = data.get("fonts", 0)
+        self.font_size = data.get("font_size", 256 * 1024)
+        self.chapters = data.get("chapters", 0)
+
+    name: str
+    """Preset name, used as the file name."""
+    duration: int
+    """Duration in seconds, the PCM audio tracks make up most of the file size (~192 KB/s per track)."""
+    subtitle_tracks: int
+    """Number of subtitle tracks, alternating SRT and ASS."""
+    audio_tracks: int
+    """Number of PCM audio tracks."""
+    fonts: int
+    """Number of font attachments."""
+    font_size: int
+    """Size of each font attachment in bytes."""
+    chapters: int
+    """Number of chapters."""
+
+PRESETS = {
+    "small": CorpusSpec(name="small", duration=30, subtitle_tracks=2, audio_tracks=1, fonts=2, chapters=4),
+    "medium": CorpusSpec(name="medium", duration=300, subtitle_tracks=6, audio_tracks=2, fonts=10, chapters=12),
+    "large": CorpusSpec(name="large", duration=1200, subtitle_tracks=12, audio_tracks=3, fonts=30, font_size=1024 * 1024, chapters=24),
+    "many_tracks": CorpusSpec(name="many_tracks", duration=60, subtitle_tracks=40, audio_tracks=4, fonts=60, chapters=48),
+}
+
+def _timestamp(seconds: float, separator: str = ",") -> str:
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{int(secs):02d}{separator}{int((secs % 1) * 1000):03d}"
+
+def write_srt(path: Path, duration: int, line_interval: float = 2.0):
+    """Writes an SRT subtitle with one line every `line_interval` seconds."""
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(int(duration / line_interval)):
+            start = i * line_interval
+            f.write(f"{i + 1}\n{_timestamp(start)} --> {_timestamp(start + line_interval * 0.9)}\nLine {i + 1} of {path.stem}\n\n")
+
+def write_ass(path: Path, duration: int, line_interval: float = 2.0):
+    """Writes an ASS subtitle with one line every `line_interval` seconds."""
+    def ass_time(seconds: float) -> str:
+        return _timestamp(seconds, ".")[1:-1]
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            "[Script Info]\nScriptType: v4.00+\nPlayResX: 1920\nPlayResY: 1080\n\n"
+            "[V4+ Styles]\nFormat: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+            "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, "
+            "Alignment, MarginL, MarginR, MarginV, Encoding\n"
+            "Style: Default,Arial,48,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,1,2,10,10,10,1\n\n"
+            "[Events]\nFormat: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+        )
+        for i in range(int(duration / line_interval)):
+            start = i * line_interval
+            f.write(f"Dialogue: 0,{ass_time(start)},{ass_time(start + line_interval * 0.9)},Default,,0,0,0,,Line {i + 1} of {path.stem}\n")
+
+def write_wav(path: Path, duration: int, frequency: float = 440.0, sample_rate: int = 48000, channels: int = 2):
+    """Writes a 16-bit PCM sine wave."""
+    period = [
+        struct.pack("<h", int(8000 * math.sin(2 * math.pi * frequency * i / sample_rate))) * channels
+        for i in range(sample_rate)
+    ]
+    second = b"".join(period)
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        for _ in range(duration):
+            f.writeframes(second)
+
+def write_font(path: Path, size: int):
+    """Writes a font-sized blob with a TrueType signature (mkvmerge does not parse attachments)."""
+    with open(path, "wb") as f:
+        f.write(b"\x00\x01\x00\x00")
+        f.write(os.urandom(max(size - 4, 0)))
+
+def write_chapters(path: Path, count: int, duration: int):
+    """Writes OGM-style simple chapters evenly spread over the duration."""
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(f"CHAPTER{i + 1:02d}={_timestamp(duration * i / count, '.')}\nCHAPTER{i + 1:02d}NAME=Chapter {i + 1}\n")
+
+def build_mkv(spec: CorpusSpec, output_dir: Path) -> Path:
+    """
+    Generates the sources of a spec and muxes them into a Matroska file.
+
+    Args:
+        spec (CorpusSpec): The layout of the file.
+        output_dir (Path): The directory to write the file (and its sources) to.
+
+    Returns:
+        Path: The path of the generated file, reused if it already exists.
+    """
+    output_path = output_dir / f"{spec.name}.mkv"
+    if output_path.exists():
+        return output_path
+
+    sources_dir = output_dir / f"{spec.name}_sources"
+    sources_dir.mkdir(parents=True, exist_ok=True)
+    cmd = ["mkvmerge", "-q", "-o", str(output_path), "--title", f"Subxtract benchmark ({spec.name})"]
+
+    for i in range(spec.audio_tracks):
+        wav_path = sources_dir / f"audio_{i}.wav"
+        write_wav(wav_path, spec.duration, frequency=220.0 * (i + 1))
+        cmd += ["--language", f"0:{LANGUAGES[i % len(LANGUAGES)]}", "--track-name", f"0:Audio {i + 1}", str(wav_path)]
+
+    for i in range(spec.subtitle_tracks):
+        language = LANGUAGES[i % len(LANGUAGES)]
+        if i % 2:
+            sub_path = sources_dir / f"subtitle_{i}.ass"
+            write_ass(sub_path, spec.duration)
+        else:
+            sub_path = sources_dir / f"subtitle_{i}.srt"
+            write_srt(sub_path, spec.duration)
+        cmd += [
+            "--language", f"0:{language}", "--track-name", f"0:{'Signs' if i % 4 == 3 else 'Full'} {i + 1}",
+            "--default-track-flag", f"0:{'yes' if i == 0 else 'no'}", str(sub_path)
+        ]
+
+    for i in range(spec.fonts):
+        font_path = sources_dir / f"font_{i}.ttf"
+        write_font(font_path, spec.font_size)
+        cmd += ["--attachment-mime-type", "font/ttf", "--attach-file", str(font_path)]
+
+    if spec.chapters:
+        chapters_path = sources_dir / "chapters.txt"
+        write_chapters(chapters_path, spec.chapters, spec.duration)
+        cmd += ["--chapters", str(chapters_path)]
+
+    logger.info("Generating %s (%ds, %d subtitles, %d audio, %d fonts, %d chapters)",
+                output_path.name, spec.duration, spec.subtitle_tracks, spec.audio_tracks, spec.fonts, spec.chapters)
+    subprocess.run(cmd, check=True)
+    return output_path
+
+def generate_corpus(output_dir: Path, presets: list[str]) -> list[Path]:
+    """Generates (or reuses) one Matroska file per preset."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    return [build_mkv(PRESETS[name], output_dir) for name in presets]
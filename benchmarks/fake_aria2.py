@@ -0,0 +1,272 @@
+"""Fake Aria2 JSON-RPC server serving corpus files as simulated downloads."""
+
+import asyncio
+import hashlib
+import os
+import random
+import socket
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from aiohttp import web
+
+class FakeDownload:
+    """State of a simulated download, its progress is derived from the elapsed time."""
+    def __init__(self, gid: str, uri: str, source: Path | None, dir_path: str, speed: int, options: dict | None = None, paused: bool = False, is_metadata: bool = False):
+        self.gid = gid
+        self.uri = uri
+        self.options = options or {}
+        self.source = source
+        self.dir = dir_path
+        self.speed = speed
+        self.is_metadata = is_metadata
+        self.total_length = 16 * 1024 if is_metadata else (source.stat().st_size if source else 0)
+        self.completed_length = 0
+        self.status = "paused" if paused else "active"
+        self.followed_by: list[str] = []
+        self.following = ""
+        self.last_tick = time.monotonic()
+        self.written = 0
+        self.error_message = ""
+
+    @property
+    def path(self) -> str:
+        if self.is_metadata:
+            return f"[METADATA]{self.source.name if self.source else self.gid}"
+        return os.path.join(self.dir, self.source.name) if self.source else ""
+
+    def tick(self):
+        """Advances the download by the bytes received since the last tick, writing them to disk."""
+        now = time.monotonic()
+        elapsed, self.last_tick = now - self.last_tick, now
+        if self.status != "active":
+            return
+        self.completed_length = min(self.total_length, self.completed_length + int(elapsed * self.speed))
+
+        if not self.is_metadata and self.source and self.completed_length > self.written:
+            os.makedirs(self.dir, exist_ok=True)
+            with open(self.source, "rb") as src, open(self.path, "ab") as dst:
+                src.seek(self.written)
+                dst.write(src.read(self.completed_length - self.written))
+            self.written = self.completed_length
+
+        if self.completed_length >= self.total_length:
+            self.status = "complete"
+
+    def struct(self, piece_length: int) -> dict:
+        """Returns the download as an aria2.tellStatus struct (numbers as strings, like Aria2)."""
+        num_pieces = max(1, -(-self.total_length // piece_length))
+        done_pieces = self.completed_length // piece_length if self.status != "complete" else num_pieces
+        bits = "".join("1" if i < done_pieces else "0" for i in range(-(-num_pieces // 4) * 4))
+        bitfield = "".join(f"{int(bits[i:i + 4], 2):x}" for i in range(0, len(bits), 4))
+        struct = {
+            "gid": self.gid,
+            "status": self.status,
+            "totalLength": str(self.total_length),
+            "completedLength": str(self.completed_length),
+            "uploadLength": "0",
+            "bitfield": bitfield,
+            "downloadSpeed": str(self.speed if self.status == "active" else 0),
+            "uploadSpeed": "0",
+            "pieceLength": str(piece_length),
+            "numPieces": str(num_pieces),
+            "connections": "1" if self.status == "active" else "0",
+            "errorCode": "1" if self.error_message else "0",
+            "errorMessage": self.error_message,
+            "dir": self.dir,
+            "followedBy": self.followed_by,
+            "files": [{
+                "index": "1",
+                "path": self.path,
+                "length": str(self.total_length),
+                "completedLength": str(self.completed_length),
+                "selected": "true",
+                "uris": [{"uri": self.uri, "status": "used"}] if not self.uri.startswith("magnet:") else [],
+            }],
+        }
+        if self.following:
+            struct["following"] = self.following
+        if self.uri.startswith("magnet:"):
+            struct["infoHash"] = hashlib.sha1(self.uri.encode()).hexdigest()
+            struct["numSeeders"] = "10"
+            struct["seeder"] = "false"
+            if not self.is_metadata and self.source:
+                struct["bittorrent"] = {"info": {"name": self.source.name}, "mode": "single"}
+        return struct
+
+class FakeAria2Server:
+    """
+    Local Aria2 JSON-RPC server resolving URIs to corpus files by name.
+
+    Direct links (`http://fake.local/<file>`) download the file straight away. Magnet links
+    (`magnet:?xt=urn:btih:<hash>&dn=<file>`) first complete a metadata download followed by the
+    actual download, paused when `pause-metadata` is set, like Aria2 does.
+    """
+    def __init__(self, corpus_dir: Path, speed: int = 200 * 1024 * 1024, metadata_speed: int = 64 * 1024, piece_length: int = 1024 * 1024):
+        self.corpus_dir = corpus_dir
+        self.speed = speed
+        self.metadata_speed = metadata_speed
+        self.piece_length = piece_length
+        self.downloads: dict[str, FakeDownload] = {}
+        self.calls: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._next_gid = 1
+        # Aria2 GIDs are random, several servers (sharded backends) never share one
+        self._gid_prefix = random.getrandbits(32)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self.port = 0
+
+    def _new_gid(self) -> str:
+        gid = f"{self._gid_prefix:08x}{self._next_gid:08x}"
+        self._next_gid += 1
+        return gid
+
+    def _resolve(self, uri: str) -> Path | None:
+        if uri.startswith("magnet:"):
+            name = parse_qs(urlparse(uri).query).get("dn", [""])[0]
+        else:
+            name = os.path.basename(urlparse(uri).path)
+        path = self.corpus_dir / name
+        return path if name and path.exists() else None
+
+    def _get(self, gid: str) -> FakeDownload:
+        download = self.downloads.get(gid)
+        if download is None:
+            raise KeyError(f"GID {gid} is not found")
+        download.tick()
+        # The metadata download completed, start the actual download
+        if download.is_metadata and download.status == "complete" and not download.followed_by:
+            follower = FakeDownload(
+                self._new_gid(), download.uri, download.source, download.dir, self.speed, download.options,
+                paused=download.options.get("pause-metadata") == "true"
+            )
+            follower.following = download.gid
+            download.followed_by = [follower.gid]
+            self.downloads[follower.gid] = follower
+        return download
+
+    def _add_uri(self, uris: list[str], options: dict | None = None, *_):
+        options = options or {}
+        uri = uris[0]
+        source = self._resolve(uri)
+        is_magnet = uri.startswith("magnet:")
+        download = FakeDownload(
+            self._new_gid(), uri, source, options.get("dir", "."),
+            self.metadata_speed if is_magnet else self.speed, options, is_metadata=is_magnet
+        )
+        if source is None:
+            download.status = "error"
+            download.error_message = f"No corpus file for {uri}"
+            download.total_length = 0
+        self.downloads[download.gid] = download
+        return download.gid
+
+    def _tell(self, statuses: tuple[str, ...]) -> list[dict]:
+        structs = []
+        for gid in list(self.downloads):
+            download = self._get(gid)
+            if download.status in statuses:
+                structs.append(download.struct(self.piece_length))
+        return structs
+
+    def _set_status(self, gid: str, status: str) -> str:
+        self._get(gid).status = status
+        return gid
+
+    def _remove_result(self, gid: str) -> str:
+        self.downloads.pop(gid, None)
+        return "OK"
+
+    def _global_stat(self) -> dict:
+        active = [d for d in (self._get(gid) for gid in list(self.downloads)) if d.status == "active"]
+        return {
+            "downloadSpeed": str(sum(d.speed for d in active)),
+            "uploadSpeed": "0",
+            "numActive": str(len(active)),
+            "numWaiting": str(sum(1 for d in self.downloads.values() if d.status in ("waiting", "paused"))),
+            "numStopped": str(sum(1 for d in self.downloads.values() if d.status in ("complete", "error", "removed"))),
+            "numStoppedTotal": "0",
+        }
+
+    def dispatch(self, method: str, params: list):
+        """Runs a JSON-RPC method, the secret token parameter is ignored."""
+        if params and isinstance(params[0], str) and params[0].startswith("token:"):
+            params = params[1:]
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        with self._lock:
+            if method == "aria2.getVersion":
+                return {"version": "1.37.0-fake", "enabledFeatures": ["BitTorrent", "Metalink"]}
+            if method == "aria2.addUri":
+                return self._add_uri(*params)
+            if method == "aria2.tellStatus":
+                return self._get(params[0]).struct(self.piece_length)
+            if method == "aria2.getFiles":
+                return self._get(params[0]).struct(self.piece_length)["files"]
+            if method == "aria2.tellActive":
+                return self._tell(("active",))
+            if method == "aria2.tellWaiting":
+                return self._tell(("waiting", "paused"))
+            if method == "aria2.tellStopped":
+                return self._tell(("complete", "error", "removed"))
+            if method in ("aria2.pause", "aria2.forcePause"):
+                return self._set_status(params[0], "paused")
+            if method == "aria2.unpause":
+                download = self._get(params[0])
+                if download.status == "paused":
+                    download.status = "active"
+                    download.last_tick = time.monotonic()
+                return download.gid
+            if method in ("aria2.remove", "aria2.forceRemove"):
+                return self._set_status(params[0], "removed")
+            if method == "aria2.removeDownloadResult":
+                return self._remove_result(params[0])
+            if method == "aria2.getGlobalStat":
+                return self._global_stat()
+            if method in ("aria2.changeOption", "aria2.changeGlobalOption", "aria2.saveSession", "aria2.purgeDownloadResult"):
+                return "OK"
+        raise NotImplementedError(f"Method {method} is not supported by the fake server")
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        try:
+            result = self.dispatch(payload.get("method", ""), payload.get("params", []))
+            body = {"jsonrpc": "2.0", "id": payload.get("id"), "result": result}
+        except (KeyError, NotImplementedError) as e:
+            body = {"jsonrpc": "2.0", "id": payload.get("id"), "error": {"code": 1, "message": str(e)}}
+        return web.json_response(body)
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        """Starts the server on its own thread (the bot calls Aria2 synchronously), returns its port."""
+        started = threading.Event()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        self.port = sock.getsockname()[1]
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            app = web.Application()
+            app.router.add_post("/jsonrpc", self._handle)
+            runner = web.AppRunner(app, access_log=None)
+            self._loop.run_until_complete(runner.setup())
+            self._loop.run_until_complete(web.SockSite(runner, sock).start())
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="fake-aria2", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.port
+
+    def stop(self):
+        """Stops the server thread."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
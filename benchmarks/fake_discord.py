@@ -0,0 +1,79 @@
+"""Fake Discord stand-ins for running the commands without a gateway connection."""
+
+import asyncio
+import os
+import time
+from itertools import count
+
+_ids = count(1)
+
+def _file_size(file) -> int:
+    """Returns the size of an interactions.File (or path) attachment."""
+    path = getattr(file, "file", file)
+    return os.path.getsize(path) if isinstance(path, (str, os.PathLike)) and os.path.exists(path) else 0
+
+class FakeAuthor:
+    """Author of the fake context."""
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.mention = f"<@{user_id}>"
+
+class FakeMessage:
+    """Message sent through the fake context, recording its edits and attachments."""
+    def __init__(self, ctx: "FakeContext", content: str | None = None):
+        self.id = next(_ids)
+        self.ctx = ctx
+        self.content = content
+        self.edits = 0
+        self.files: list = []
+
+    async def edit(self, content: str | None = None, files: list | None = None, **_kwargs) -> "FakeMessage":
+        """Edits the message, simulating the upload time of its attachments."""
+        self.edits += 1
+        if content is not None:
+            self.content = content
+        if files:
+            self.files.extend(files)
+        await self.ctx.simulate_request(files)
+        return self
+
+class FakeContext:
+    """
+    SlashContext stand-in for `download_and_extract` and `process_queue`.
+
+    Every request waits `latency` seconds, and attachments are uploaded at `upload_speed` bytes
+    per second, so the Discord side of a job shows up in the measured latency like it would live.
+    """
+    def __init__(self, user_id: int = 1, guild_id: int = 1, channel_id: int = 1, latency: float = 0.05, upload_speed: int = 8 * 1024 * 1024):
+        self.author = FakeAuthor(user_id)
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.latency = latency
+        self.upload_speed = upload_speed
+        self.messages: list[FakeMessage] = []
+        self.requests = 0
+        self.uploaded_bytes = 0
+        self.uploaded_files = 0
+        self.request_time = 0.0
+
+    async def simulate_request(self, files: list | None = None):
+        """Waits for the simulated round trip and upload of a request."""
+        start = time.perf_counter()
+        self.requests += 1
+        size = sum(_file_size(f) for f in files or [])
+        self.uploaded_bytes += size
+        self.uploaded_files += len(files or [])
+        await asyncio.sleep(self.latency + (size / self.upload_speed if self.upload_speed else 0))
+        self.request_time += time.perf_counter() - start
+
+    async def send(self, content: str | None = None, files: list | None = None, **_kwargs) -> FakeMessage:
+        """Sends a message to the fake channel."""
+        message = FakeMessage(self, content)
+        message.files = list(files or [])
+        self.messages.append(message)
+        await self.simulate_request(files)
+        return message
+
+    async def defer(self, **_kwargs):
+        """Acknowledges the interaction."""
+        await self.simulate_request()
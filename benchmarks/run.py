@@ -0,0 +1,352 @@
+"""
+Benchmark runner for the extraction engine and end-to-end jobs, fully offline.
+
+Run from the repository root:
+
+    python -m benchmarks.run mkv --presets small,medium --iterations 3
+    python -m benchmarks.run e2e --preset small --jobs 5 --magnet
+    python -m benchmarks.run e2e --preset small --jobs 4 --concurrency 2 --same-release
+    python -m benchmarks.run queue --preset small --jobs 5 --output results.json
+    python -m benchmarks.run workers --preset small --jobs 6 --workers 3
+
+The `mkv` suite times identification, every extractor, zipping and splitting against a synthetic
+corpus. The `e2e` and `queue` suites run `download_and_extract` and `process_queue` (what /extract
+and /start_queue call) against the fake Aria2 server and a fake Discord context. The `workers`
+suite runs the same jobs through the job broker and `worker.py` processes, each with its own fake
+Aria2 server.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import platform
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parents[1]
+
+class Results:
+    """Durations and processed bytes recorded per stage."""
+    def __init__(self):
+        self.stages: dict[str, list[tuple[float, int]]] = {}
+        self.counters: dict[str, int] = {}
+
+    def add(self, stage: str, duration: float, size: int = 0):
+        """Records one run of a stage."""
+        self.stages.setdefault(stage, []).append((duration, size))
+
+    def count(self, name: str, amount: int = 1):
+        """Increments a counter (job outcomes, RPC calls...)."""
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def measure(self, stage: str, size: int = 0):
+        """Records the wall time of the wrapped block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, size)
+
+    def summary(self) -> dict:
+        """Returns the latency percentiles and throughput of every stage."""
+        summary = {}
+        for stage, runs in self.stages.items():
+            durations = sorted(d for d, _ in runs)
+            total_time = sum(durations)
+            total_bytes = sum(s for _, s in runs)
+            summary[stage] = {
+                "count": len(runs),
+                "total_s": round(total_time, 4),
+                "p50_ms": round(_percentile(durations, 50) * 1000, 2),
+                "p95_ms": round(_percentile(durations, 95) * 1000, 2),
+                "max_ms": round(durations[-1] * 1000, 2),
+                "mean_ms": round(statistics.fmean(durations) * 1000, 2),
+                "bytes": total_bytes,
+                "mb_per_s": round(total_bytes / total_time / (1024 * 1024), 2) if total_bytes and total_time else None,
+            }
+        return summary
+
+    def print_table(self):
+        """Prints the summary as a text table."""
+        print(f"{'Stage':<28} {'Runs':>5} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10} {'MB/s':>9}")
+        for stage, row in self.summary().items():
+            throughput = f"{row['mb_per_s']:.2f}" if row["mb_per_s"] is not None else "-"
+            print(f"{stage:<28} {row['count']:>5} {row['p50_ms']:>10.2f} {row['p95_ms']:>10.2f} {row['max_ms']:>10.2f} {throughput:>9}")
+        for name, value in self.counters.items():
+            print(f"{name}: {value}")
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+class SpanCollector(logging.Handler):
+    """Records the span_end trace events (one per subprocess call) as `span:<name>` stages."""
+    def __init__(self, results: Results):
+        super().__init__(level=logging.DEBUG)
+        self.results = results
+
+    def emit(self, record: logging.LogRecord):
+        if getattr(record, "event", None) != "span_end":
+            return
+        fields = getattr(record, "fields", {}) or {}
+        self.results.add(f"span:{record.span}", fields.get("duration_ms", 0) / 1000, fields.get("bytes", 0))
+
+def configure_environment(workspace: Path, aria2_port: int, verbose: bool):
+    """Points the configuration at the workspace, must run before any project module is imported."""
+    data_dir = workspace / "data"
+    temp_dir = data_dir / "temp"
+    os.environ.update({
+        "DISCORD_TOKEN": "benchmark",
+        "APP_ID": "0",
+        "ARIA2_RPC_HOST": "http://127.0.0.1",
+        "ARIA2_RPC_PORT": str(aria2_port),
+        "ARIA2_RPC_SECRET": "",
+        "TEMP_DIR": str(temp_dir),
+        "DOWNLOAD_DIR": str(temp_dir / "downloads"),
+        "EXTRACT_DIR": str(temp_dir / "extracted"),
+        "SCHEMAS_DIR": str(REPO_DIR / "schemas"),
+        "ALLOWED_CHANNELS_FILE": str(data_dir / "allowed_channels.json"),
+        "QUEUE_FILE": str(data_dir / "queue.json"),
+        "JOB_STATE_FILE": str(data_dir / "job_state.json"),
+        "RETENTION_INDEX_FILE": str(data_dir / "retention.json"),
+        "LOG_LEVEL": "INFO" if verbose else "WARNING",
+        "LOG_FILE": str(data_dir / "logs" / "jobs.jsonl"),
+        "METRICS_PORT": "",
+    })
+
+def bench_mkv(args, workspace: Path, results: Results):
+    """Times identification, extraction, zipping and splitting of every corpus file."""
+    from benchmarks.corpus import generate_corpus
+    from utils import mkv_service
+    from utils.file_utils import create_split_zip
+
+    files = generate_corpus(workspace / "corpus", args.presets.split(","))
+    service = mkv_service.MKVService()
+    for iteration in range(args.iterations):
+        for file in files:
+            filepath = str(file)
+            size = file.stat().st_size
+            out_dir = workspace / "extract" / f"{file.stem}_{iteration}"
+
+            mkv_service.identification_cache.clear()
+            mkv_service.mediainfo_cache.clear()
+            with results.measure("identify", size):
+                service.get_mkv_formatted_info(filepath)
+            with results.measure("identify_cached", size):
+                service.get_mkv_formatted_info(filepath)
+            with results.measure("identify_full", size):
+                service.get_mkv_formatted_info(filepath, full=True)
+            with results.measure("media_report", size):
+                service.get_media_report(filepath)
+
+            with results.measure("extract_subtitles", size):
+                service.extract_subtitles(filepath, out_dir / "subtitles")
+            with results.measure("extract_attachments", size):
+                service.extract_attachments(filepath, out_dir / "attachments")
+            with results.measure("extract_chapters", size):
+                service.extract_chapters(filepath, out_dir / "chapters")
+            with results.measure("extract_audio", size):
+                service.extract_audio(filepath, out_dir / "audio")
+
+            # Zip and split every extracted file again, with parts small enough to always split
+            outputs = [p for p in out_dir.rglob("*") if p.is_file() and p.suffix != ".zip"]
+            outputs_size = sum(p.stat().st_size for p in outputs)
+            out_dir.mkdir(parents=True, exist_ok=True)
+            zip_path = out_dir / "bench.zip"
+            with results.measure("zip", outputs_size), zipfile.ZipFile(zip_path, "w") as zipf:
+                for output in outputs:
+                    zipf.write(output, arcname=output.name)
+            zip_size = zip_path.stat().st_size
+            with results.measure("split", zip_size):
+                create_split_zip(zip_path, part_size=max(zip_size // 4, 64 * 1024))
+
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+def _job_urls(corpus_file: Path, jobs: int, magnet: bool, same_release: bool = False) -> list[str]:
+    urls = []
+    for i in range(jobs):
+        # Jobs of the same release share one download
+        i = 0 if same_release else i
+        if magnet:
+            infohash = hashlib.sha1(f"{corpus_file.name}:{i}".encode()).hexdigest()
+            urls.append(f"magnet:?xt=urn:btih:{infohash}&dn={corpus_file.name}")
+        else:
+            urls.append(f"http://fake.local/{corpus_file.name}?job={i}")
+    return urls
+
+def _cleanup():
+    # Every job removes its own files, this only clears what a failed run left behind
+    from utils import aria2_service, file_utils
+
+    aria2_service.remove_all_downloads(force=True)
+    file_utils.clear_temp()
+
+async def _run_job(args, results: Results, i: int, url: str, size: int):
+    from benchmarks.fake_discord import FakeContext
+    from utils import utils
+
+    ctx = FakeContext(user_id=i + 1, latency=args.discord_latency, upload_speed=args.upload_speed)
+    start = time.perf_counter()
+    completed = await utils.download_and_extract(ctx, url, extraction_type=args.type)
+    elapsed = time.perf_counter() - start
+    results.add("job", elapsed, size if completed else 0)
+    results.add("discord_requests", ctx.request_time, ctx.uploaded_bytes)
+    results.count("jobs_completed" if completed else "jobs_failed")
+    results.count("discord_request_count", ctx.requests)
+
+async def bench_e2e(args, corpus_file: Path, results: Results):
+    """Submits every `download_and_extract` job at once, the scheduler runs `concurrency` at a time."""
+    size = corpus_file.stat().st_size
+    urls = _job_urls(corpus_file, args.jobs, args.magnet, args.same_release)
+    with results.measure("all_jobs", size * len(urls)):
+        await asyncio.gather(*(_run_job(args, results, i, url, size) for i, url in enumerate(urls)))
+    _cleanup()
+
+async def bench_queue(args, corpus_file: Path, results: Results):
+    """Runs `process_queue` (what /start_queue calls) over a queue of `jobs` links."""
+    from benchmarks.fake_discord import FakeContext
+    from utils import file_utils, utils
+
+    ctx = FakeContext(user_id=1000, latency=args.discord_latency, upload_speed=args.upload_speed)
+    file_utils.save_queue(str(ctx.author.id), _job_urls(corpus_file, args.jobs, args.magnet), extraction_type=args.type)
+
+    start = time.perf_counter()
+    await utils.process_queue(ctx, args.type)
+    results.add("queue", time.perf_counter() - start, corpus_file.stat().st_size * args.jobs)
+    _cleanup()
+
+    remaining = file_utils.get_user_queue(str(ctx.author.id))
+    results.count("links_completed", args.jobs - (len(remaining.links) if remaining else 0))
+    results.count("discord_request_count", ctx.requests)
+
+async def bench_workers(args, corpus_file: Path, results: Results, workspace: Path, aria2_ports: list[int]):
+    """Submits every job at once to the job broker, run by one `worker.py` process per fake Aria2 server."""
+    from config import BROKER_HOST, BROKER_PORT
+    from utils.broker import job_broker
+
+    await job_broker.start(BROKER_HOST, BROKER_PORT)
+    workers = [
+        await asyncio.create_subprocess_exec(
+            sys.executable, str(REPO_DIR / "worker.py"),
+            "--data-dir", str(workspace / "workers" / str(i)), "--aria2-port", str(port), "--worker-id", f"bench-{i}",
+            cwd=REPO_DIR
+        )
+        for i, port in enumerate(aria2_ports)
+    ]
+    try:
+        size = corpus_file.stat().st_size
+        urls = _job_urls(corpus_file, args.jobs, args.magnet)
+        with results.measure("all_jobs", size * len(urls)):
+            await asyncio.gather(*(_run_job(args, results, i, url, size) for i, url in enumerate(urls)))
+    finally:
+        for worker in workers:
+            worker.terminate()
+            await worker.wait()
+        await job_broker.stop()
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline Subxtract benchmarks.")
+    parser.add_argument("suite", choices=["mkv", "e2e", "queue", "workers"], help="Benchmark suite to run.")
+    parser.add_argument("--presets", default="small,medium", help="Corpus presets of the mkv suite (small, medium, large, many_tracks).")
+    parser.add_argument("--preset", default="small", help="Corpus preset downloaded by the e2e and queue suites.")
+    parser.add_argument("--iterations", type=int, default=3, help="Iterations of the mkv suite.")
+    parser.add_argument("--jobs", type=int, default=3, help="Jobs (e2e) or queued links (queue).")
+    parser.add_argument("--concurrency", type=int, default=1, help="Jobs run at the same time (MAX_CONCURRENT_JOBS) by the e2e suite.")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes of the workers suite.")
+    parser.add_argument("--type", default="all", help="Extraction type of the e2e and queue suites.")
+    parser.add_argument("--magnet", action="store_true", help="Use magnet links (metadata download first) instead of direct links.")
+    parser.add_argument("--same-release", action="store_true", help="Every e2e job requests the same link, coalesced into one download.")
+    parser.add_argument("--speed", type=int, default=200 * 1024 * 1024, help="Fake Aria2 download speed in bytes/s.")
+    parser.add_argument("--discord-latency", type=float, default=0.05, help="Fake Discord round trip in seconds.")
+    parser.add_argument("--upload-speed", type=int, default=8 * 1024 * 1024, help="Fake Discord upload speed in bytes/s.")
+    parser.add_argument("--workspace", type=Path, help="Workspace directory, kept between runs to reuse the corpus.")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON to this file.")
+    parser.add_argument("--verbose", action="store_true", help="Show the bot logs.")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    workspace = (args.workspace or Path(tempfile.mkdtemp(prefix="subxtract-bench-"))).resolve()
+    workspace.mkdir(parents=True, exist_ok=True)
+
+    # The fake server only needs the corpus directory, it is started before the configuration is loaded
+    from benchmarks.fake_aria2 import FakeAria2Server
+
+    # The workers suite gives every worker its own Aria2 server, like separate machines
+    servers = [FakeAria2Server(workspace / "corpus", speed=args.speed) for _ in range(args.workers if args.suite == "workers" else 1)]
+    ports = [server.start() for server in servers]
+    configure_environment(workspace, ports[0], args.verbose)
+    os.environ["MAX_CONCURRENT_JOBS"] = str(args.concurrency)
+    if args.suite == "workers":
+        broker_port = _free_port()
+        os.environ.update({
+            "WORKER_MODE": "broker",
+            "BROKER_PORT": str(broker_port),
+            "BROKER_URL": f"http://127.0.0.1:{broker_port}",
+            "BROKER_DB": str(workspace / "data" / "broker.db"),
+            "BROKER_SPOOL_DIR": str(workspace / "data" / "broker_spool"),
+        })
+
+    # Import after the environment is configured, config reads it at import time
+    from benchmarks.corpus import generate_corpus
+    from utils.logger import trace_logger
+
+    results = Results()
+    trace_logger.addHandler(SpanCollector(results))
+
+    started = time.perf_counter()
+    try:
+        if args.suite == "mkv":
+            bench_mkv(args, workspace, results)
+        else:
+            corpus_file = generate_corpus(workspace / "corpus", [args.preset])[0]
+            if args.suite == "workers":
+                asyncio.run(bench_workers(args, corpus_file, results, workspace, ports))
+            else:
+                suite = bench_e2e if args.suite == "e2e" else bench_queue
+                asyncio.run(suite(args, corpus_file, results))
+    finally:
+        for server in servers:
+            server.stop()
+
+    for server in servers:
+        for method, calls in sorted(server.calls.items()):
+            results.count(f"rpc:{method}", calls)
+    print(f"Suite {args.suite} finished in {time.perf_counter() - started:.2f}s (workspace: {workspace})")
+    results.print_table()
+
+    if args.output:
+        report = {
+            "suite": args.suite,
+            "args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "stages": results.summary(),
+            "counters": results.counters,
+        }
+        args.output.write_text(json.dumps(report, indent=4), encoding="utf-8")
+        print(f"Results written to {args.output}")
+
+    if not args.workspace:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Startup benchmark, the import time of the bot's modules in fresh interpreters.
+
+Run from the repository root:
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeat 5 --top 30 --output startup.json
+    python -m benchmarks.startup --modules utils.extraction
+
+Every run imports what bot.py imports before connecting to Discord (the modules below and every
+extension) under `python -X importtime`, and reports the cumulative import time of every project
+module and third-party package, the total import time and the peak memory of the interpreter.
+A module's cumulative time includes the modules it was the first to import.
+"""
+
+import argparse
+import json
+import pkgutil
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.run import REPO_DIR, configure_environment
+
+# Imported by bot.py at module level, the feature modules (API, watch folder) are imported when enabled
+BOT_MODULES = [
+    "interactions", "config", "utils.aria2_service", "utils.file_utils", "utils.metrics", "utils.broker",
+    "utils.utils", "utils.discord_api", "utils.scheduler", "utils.watchdog",
+]
+PROJECT_PACKAGES = ("config", "utils", "extensions", "gen_types", "benchmarks")
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+# Runs in the child interpreter, prints the import time and the peak RSS (KiB on Linux)
+_IMPORT_SCRIPT = """
+import resource, sys, time
+start = time.perf_counter()
+for name in sys.argv[1:]:
+    # __import__ goes through the import statement's C path, importlib.import_module is not timed
+    __import__(name)
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+def get_bot_modules() -> list[str]:
+    """Returns the modules bot.py imports, followed by every extension."""
+    extensions = [m.name for m in pkgutil.iter_modules([str(REPO_DIR / "extensions")], prefix="extensions.")]
+    return BOT_MODULES + extensions
+
+def run_once(modules: list[str]) -> tuple[dict[str, int], float, int]:
+    """
+    Imports the modules in a fresh interpreter.
+
+    Returns:
+        tuple[dict[str, int], float, int]: The cumulative import time of every imported module in
+        microseconds, the total import time in seconds and the peak RSS in KiB.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _IMPORT_SCRIPT, *modules],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True
+    )
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            cumulative[match.group(4)] = int(match.group(2))
+    elapsed, max_rss = result.stdout.split()[-2:]
+    return cumulative, float(elapsed), int(max_rss)
+
+def is_reported(name: str) -> bool:
+    """Project modules and third-party top-level packages, the standard library is left out."""
+    if name.split(".")[0] in PROJECT_PACKAGES:
+        return True
+    return "." not in name and not name.startswith("_") and name not in sys.stdlib_module_names
+
+def main():
+    args = parse_args()
+    # config reads the environment at import time, point it at a scratch workspace
+    configure_environment(Path(tempfile.mkdtemp(prefix="subxtract-startup-")), 6800, verbose=False)
+
+    modules = args.modules.split(",") if args.modules else get_bot_modules()
+    _, _, baseline_rss = run_once([])
+    runs = [run_once(modules) for _ in range(args.repeat)]
+
+    names = {name for cumulative, _, _ in runs for name in cumulative if is_reported(name)}
+    times = {
+        name: statistics.median(cumulative.get(name, 0) for cumulative, _, _ in runs) / 1000
+        for name in names
+    }
+    report = {
+        "python": sys.version.split()[0],
+        "repeat": args.repeat,
+        "modules": modules,
+        "import_ms": round(statistics.median(elapsed for _, elapsed, _ in runs) * 1000, 1),
+        "max_rss_kib": statistics.median(rss for _, _, rss in runs),
+        "baseline_rss_kib": baseline_rss,
+        "cumulative_ms": {name: round(ms, 2) for name, ms in sorted(times.items(), key=lambda item: -item[1])},
+    }
+
+    print(f"{'Module':<48} {'Cumulative ms':>14}")
+    for name, ms in list(report["cumulative_ms"].items())[:args.top]:
+        print(f"{name:<48} {ms:>14.2f}")
+    print(f"Import time: {report['import_ms']:.1f} ms (median of {args.repeat})")
+    print(f"Peak RSS: {report['max_rss_kib'] / 1024:.1f} MiB (interpreter alone {baseline_rss / 1024:.1f} MiB)")
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=4), encoding="utf-8")
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Import time of the bot's modules.")
+    parser.add_argument("--modules", default="", help="Comma separated modules to import instead of the bot's.")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters to run, the median is reported.")
+    parser.add_argument("--top", type=int, default=20, help="Modules shown in the table.")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON to this file.")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,19 @@
 """Main bot file to run the Discord bot."""
 
+import asyncio
 import pkgutil
 
 from interactions import Activity, ActivityType, Client, Intents, listen
-from config import DISCORD_TOKEN
-from utils.utils import get_logger
+from config import API_HOST, API_PORT, BROKER_HOST, BROKER_PORT, DISCORD_TOKEN, LOOP_WATCHDOG_THRESHOLD, METRICS_HOST, METRICS_PORT, WATCH_DIR, WORKER_MODE
+from utils import aria2_service, file_utils, metrics
+from utils.broker import job_broker
+from utils.cleanup import trash_collector
+from utils.utils import get_logger, resume_jobs
+from utils.discord_api import discord_api
+from utils.retention import retention_store
+from utils.scheduler import job_scheduler
+from utils.staging import staging_area
+from utils.watchdog import loop_watchdog
 
 # Configure logging
 logger = get_logger("bot")
@@ -12,6 +21,37 @@ logger = get_logger("bot")
 # Initialize bot with all intents
 bot = Client(token=DISCORD_TOKEN, intents=Intents.ALL)
 
+def get_queue_depth() -> int:
+    """Returns the number of links waiting in every user queue."""
+    return sum(len(queue.links) for queue in file_utils.load_queue() or [])
+
+async def start_metrics():
+    """Registers the scrape-time gauges and starts the metrics endpoint."""
+    metrics.register_gauge_callback("subxtract_queue_depth", "Links waiting in the user queues.", get_queue_depth)
+    metrics.register_gauge_callback(
+        "subxtract_aria2_download_speed_bytes", "Aria2 global download speed in bytes per second.",
+        lambda: aria2_service.get_global_stats()["download_speed"]
+    )
+    metrics.register_gauge_callback(
+        "subxtract_aria2_healthy_backends", "Aria2 backends responding to RPC calls.",
+        lambda: aria2_service.get_global_stats()["healthy_backends"]
+    )
+    if WORKER_MODE == "broker":
+        metrics.register_gauge_callback(
+            "subxtract_broker_queued_jobs", "Jobs waiting for a worker.", lambda: len(job_broker.list_jobs("queued"))
+        )
+    else:
+        metrics.register_gauge_callback(
+            "subxtract_scheduler_waiting_jobs", "Jobs waiting for a slot of the scheduler.", lambda: len(job_scheduler.waiting)
+        )
+        metrics.register_gauge_callback(
+            "subxtract_retained_bytes", "Bytes of the completed downloads kept for reuse.", lambda: retention_store.used
+        )
+    try:
+        await metrics.start_metrics_server(METRICS_HOST, int(METRICS_PORT))
+    except OSError as e:
+        logger.error("Failed to start the metrics endpoint: %s", e)
+
 # On start
 @listen()
 async def on_startup():
@@ -27,6 +67,47 @@ async def on_startup():
         )
     )
 
+    # Report the synchronous calls blocking the event loop, disabled when the threshold is 0
+    if LOOP_WATCHDOG_THRESHOLD > 0:
+        loop_watchdog.start()
+
+    # Expose the job and stage metrics, disabled when METRICS_PORT is empty
+    if METRICS_PORT:
+        await start_metrics()
+
+    # Fetch the /help metadata ahead of the first call and keep it fresh
+    asyncio.create_task(discord_api.warm())
+    discord_api.start_refresh()
+
+    # Serve the jobs to the worker processes instead of running them here
+    if WORKER_MODE == "broker":
+        await job_broker.start(BROKER_HOST, BROKER_PORT)
+
+    # Accept jobs over HTTP alongside the slash commands, disabled when API_PORT is empty
+    if API_PORT:
+        from utils.api import job_api
+
+        try:
+            await job_api.start(API_HOST, int(API_PORT))
+        except OSError as e:
+            logger.error("Failed to start the job API: %s", e)
+
+    # Extract the files landing in the watch folder, disabled when WATCH_DIR is empty
+    if WATCH_DIR:
+        from utils.watch_folder import folder_watcher
+
+        await folder_watcher.start(bot)
+
+    # Delete the temp files the last run moved to the trash but had no time to delete
+    trash_collector.reclaim()
+    if WORKER_MODE != "broker":
+        staging_area.clear()
+        # Delete the downloads kept by the last run that expired, or that no index entry refers to
+        retention_store.start()
+
+    # Resume the jobs interrupted by the last restart
+    asyncio.create_task(resume_jobs(bot))
+
 # Load all extensions in the extensions directory
 extension_names = [m.name for m in pkgutil.iter_modules(["extensions"], prefix="extensions.")]
 
@@ -1,5 +1,6 @@
 """Configuration module for the Discord bot and Aria2 integration."""
 
+import json
 import os
 from dotenv import load_dotenv
 
@@ -15,5 +16,70 @@ DOWNLOAD_DIR = os.getenv("DOWNLOAD_DIR", "./data/temp/downloads")
 EXTRACT_DIR = os.getenv("EXTRACT_DIR", "./data/temp/extracted")
 SCHEMAS_DIR = os.getenv("SCHEMAS_DIR", "./schemas")
 ALLOWED_CHANNELS_FILE = os.getenv("ALLOWED_CHANNELS_FILE", "./data/allowed_channels.json")
-CURRENT_DL_FILE = os.getenv("CURRENT_DL_FILE", "./data/current_download.json")
 QUEUE_FILE = os.getenv("QUEUE_FILE", "./data/queue.json")
+JOB_STATE_FILE = os.getenv("JOB_STATE_FILE", "./data/job_state.json")
+INSPECT_HEAD_SIZE = int(os.getenv("INSPECT_HEAD_SIZE", str(8 * 1024 * 1024)))
+INSPECT_TIMEOUT = int(os.getenv("INSPECT_TIMEOUT", "120"))
+IDENTIFICATION_CACHE_SIZE = int(os.getenv("IDENTIFICATION_CACHE_SIZE", "2048"))
+MAX_DOWNLOAD_SIZE = int(os.getenv("MAX_DOWNLOAD_SIZE", str(20 * 1024 * 1024 * 1024)))
+DISK_SAFETY_MARGIN = int(os.getenv("DISK_SAFETY_MARGIN", str(1024 * 1024 * 1024)))
+ADMISSION_TIMEOUT = int(os.getenv("ADMISSION_TIMEOUT", "600"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = os.getenv("METRICS_PORT", "9108")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FILE = os.getenv("LOG_FILE", "./data/logs/jobs.jsonl")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./data/profiles")
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sampler")
+PROFILE_NEXT_JOBS = int(os.getenv("PROFILE_NEXT_JOBS", "0"))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+LOOP_WATCHDOG_INTERVAL = float(os.getenv("LOOP_WATCHDOG_INTERVAL", "0.1"))
+LOOP_WATCHDOG_THRESHOLD = float(os.getenv("LOOP_WATCHDOG_THRESHOLD", "0.25"))
+DISCORD_API_CACHE_TTL = int(os.getenv("DISCORD_API_CACHE_TTL", "3600"))
+WORKER_MODE = os.getenv("WORKER_MODE", "local").lower()
+BROKER_HOST = os.getenv("BROKER_HOST", "127.0.0.1")
+BROKER_PORT = int(os.getenv("BROKER_PORT", "8765"))
+BROKER_URL = os.getenv("BROKER_URL", "http://127.0.0.1:8765")
+BROKER_TOKEN = os.getenv("BROKER_TOKEN", "")
+BROKER_DB = os.getenv("BROKER_DB", "./data/broker.db")
+BROKER_SPOOL_DIR = os.getenv("BROKER_SPOOL_DIR", "./data/broker_spool")
+BROKER_LEASE_TIMEOUT = int(os.getenv("BROKER_LEASE_TIMEOUT", "60"))
+WORKER_ID = os.getenv("WORKER_ID", "")
+# JSON list of Aria2 backends, e.g. [{"url": "http://localhost:6801", "secret": "", "dir": "/mnt/disk1/downloads"}]
+ARIA2_BACKENDS = json.loads(os.getenv("ARIA2_BACKENDS") or "[]")
+ARIA2_HEALTH_INTERVAL = int(os.getenv("ARIA2_HEALTH_INTERVAL", "30"))
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "1"))
+MAX_JOBS_PER_USER = int(os.getenv("MAX_JOBS_PER_USER", "1"))
+MAX_JOBS_PER_GUILD = int(os.getenv("MAX_JOBS_PER_GUILD", "0"))
+MAX_QUEUE_JOBS = int(os.getenv("MAX_QUEUE_JOBS", "0"))
+# JSON object of Aria2 options by link type (magnet, torrent, ddl) or DDL host, merged over the built-in profiles
+DOWNLOAD_PROFILES = json.loads(os.getenv("DOWNLOAD_PROFILES") or "{}")
+STALL_TIMEOUT = int(os.getenv("STALL_TIMEOUT", "600"))
+STALL_MIN_SPEED = int(os.getenv("STALL_MIN_SPEED", "10240"))
+STALL_RETRIES = int(os.getenv("STALL_RETRIES", "1"))
+LINK_RESOLVE_TIMEOUT = int(os.getenv("LINK_RESOLVE_TIMEOUT", "15"))
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = os.getenv("API_PORT", "")
+API_TOKEN = os.getenv("API_TOKEN", "")
+API_RESULTS_DIR = os.getenv("API_RESULTS_DIR", "./data/api_results")
+API_RESULT_TTL = int(os.getenv("API_RESULT_TTL", "86400"))
+WATCH_DIR = os.getenv("WATCH_DIR", "")
+WATCH_OUTPUT_DIR = os.getenv("WATCH_OUTPUT_DIR", "./data/watch_output")
+WATCH_CHANNEL_ID = os.getenv("WATCH_CHANNEL_ID", "")
+WATCH_INDEX_FILE = os.getenv("WATCH_INDEX_FILE", "./data/watch_index.json")
+WATCH_EXTRACTION_TYPE = os.getenv("WATCH_EXTRACTION_TYPE", "all_without_audio")
+WATCH_FILTERS = os.getenv("WATCH_FILTERS", "")
+WATCH_SETTLE_TIME = float(os.getenv("WATCH_SETTLE_TIME", "5"))
+WATCH_POLLING = os.getenv("WATCH_POLLING", "false").lower() == "true"
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", "10"))
+CLEANUP_IO_CLASS = os.getenv("CLEANUP_IO_CLASS", "best-effort").lower()
+CLEANUP_NICE = int(os.getenv("CLEANUP_NICE", "19"))
+STAGING_DIR = os.getenv("STAGING_DIR", "")
+STAGING_BUDGET = int(os.getenv("STAGING_BUDGET", str(256 * 1024 * 1024)))
+PAGE_CACHE_HINTS = os.getenv("PAGE_CACHE_HINTS", "true").lower() == "true"
+PREFETCH_BYTES = int(os.getenv("PREFETCH_BYTES", str(32 * 1024 * 1024)))
+# JSON object of the CPU and I/O priority of the tools by stage (identify, mediainfo, extract),
+# e.g. {"extract": {"nice": 10, "io_class": "best-effort", "io_level": 6}}
+TOOL_PRIORITIES = json.loads(os.getenv("TOOL_PRIORITIES") or "{}")
+RETENTION_TTL = int(os.getenv("RETENTION_TTL", "3600"))
+RETENTION_BUDGET = int(os.getenv("RETENTION_BUDGET", str(20 * 1024 * 1024 * 1024)))
+RETENTION_INDEX_FILE = os.getenv("RETENTION_INDEX_FILE", "./data/retention.json")
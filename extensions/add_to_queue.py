@@ -3,7 +3,8 @@
 from interactions import Extension, SlashContext, slash_command, check, slash_option, OptionType
 from utils import file_utils
 from utils.logger import get_logger
-from utils.utils import is_allowed_channel
+from utils.track_filter import FILTER_HELP, parse_track_filter
+from utils.utils import is_allowed_channel, remove_duplicates_preserve_order
 
 # Configure logging
 logger = get_logger("add_to_queue")
@@ -18,16 +19,30 @@ class AddToQueue(Extension):
         required=True,
         opt_type=OptionType.STRING,
     )
-    async def add_to_queue(self, ctx: SlashContext, links: str):
+    @slash_option(
+        name="filters",
+        description="Track filters stored with the links, e.g. \"subs.lang:eng audio.lang:jpn\".",
+        required=False,
+        opt_type=OptionType.STRING,
+    )
+    async def add_to_queue(self, ctx: SlashContext, links: str, filters: str = ""):
         """Adds links to the download queue, separated by commas (,)."""
         await ctx.defer()
         # try:
-        links_list = [link.strip() for link in links.split(",") if link.strip()]
+        links_list = remove_duplicates_preserve_order([link for link in links.split(",") if link.strip()])
         if not links_list:
             await ctx.send("No valid links provided.")
             return
 
-        added = file_utils.save_queue(str(ctx.author.id), links_list)
+        try:
+            track_filter = parse_track_filter(filters)
+        except ValueError as e:
+            await ctx.send(f"Invalid filters: {e}\n{FILTER_HELP}")
+            return
+
+        added = file_utils.save_queue(
+            str(ctx.author.id), links_list, filters=track_filter.expression if track_filter else ""
+        )
         await ctx.send(f"Added {added} links to your download queue.")
         logger.info("User %s added %d links to the queue.", str(ctx.author.id), added)
         # except Exception as e:
@@ -2,8 +2,9 @@
 
 from interactions import Extension, SlashContext, OptionType
 from interactions import slash_command, slash_option, check
-from utils import aria2_service, utils, file_utils
+from utils import utils
 from utils.logger import get_logger
+from utils.track_filter import FILTER_HELP, parse_track_filter
 
 # Configure logging
 logger = get_logger("extractor")
@@ -30,14 +31,37 @@ class Extractor(Extension):
             {"name": "Audio", "value": "audio"},
             {"name": "All", "value": "all"},
             {"name": "All (Without Audio)", "value": "all_without_audio"},
+            {"name": "Inspect (Track Layout Only)", "value": "inspect"},
         ],
     )
-    async def extract(self, ctx: SlashContext, url: str, type: str):
+    @slash_option(
+        name="filters",
+        description="Only extract matching tracks, e.g. \"subs.lang:eng !name:signs audio.lang:jpn\".",
+        required=False,
+        opt_type=OptionType.STRING,
+    )
+    @slash_option(
+        name="full_mediainfo",
+        description="Attach the full MediaInfo report instead of the built-in track report.",
+        required=False,
+        opt_type=OptionType.BOOLEAN,
+    )
+    async def extract(self, ctx: SlashContext, url: str, type: str, filters: str = "", full_mediainfo: bool = False):
         """Downloads using Aria2 (magnet/torrent/ddl links), Extracts MKV tracks, then uploads them."""
         await ctx.defer()
 
+        # Parse track filters before starting anything
+        try:
+            track_filter = parse_track_filter(filters)
+        except ValueError as e:
+            await ctx.send(f"Invalid filters: {e}\n{FILTER_HELP}")
+            logger.warning("Invalid filters from user %s: %s", ctx.author.id, e)
+            return
+
         # Start download and extraction process
-        completed = await utils.download_and_extract(ctx, url, extraction_type=type)
+        completed = await utils.download_and_extract(
+            ctx, url, extraction_type=type, track_filter=track_filter, full_mediainfo=full_mediainfo
+        )
 
         # Check if completed successfully
         if completed is True:
@@ -46,15 +70,6 @@ class Extractor(Extension):
                 f"{ctx.author.mention}, Extraction process completed for all files, Have Fun :grin:"
             )
 
-        #region ---- Clean up ----
-        try:
-            aria2_service.remove_all_downloads(force=True)
-        except Exception as e:
-            logger.error("Error removing downloads during cleanup: %s", e)
-        file_utils.clear_current_dl()
-        file_utils.clear_temp()
-        #endregion
-
 def setup(bot):
     """Sets up the Extractor extension."""
     Extractor(bot)
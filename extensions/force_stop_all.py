@@ -1,8 +1,10 @@
 """ForceStopAll extension for stopping all processes."""
 
 from interactions import Extension, slash_command, SlashContext, Permissions, check
+from config import WORKER_MODE
+from utils.broker import job_broker
 from utils.logger import get_logger
-from utils.controller import extraction_cancel_event
+from utils.scheduler import job_scheduler
 from utils.utils import is_allowed_channel
 
 # Configure logging
@@ -18,12 +20,14 @@ class ForceStopAll(Extension):
         """Stops all processes (admin only)."""
         await ctx.defer()
         try:
-            extraction_cancel_event.set()
-            logger.info("Extraction cancellation event fired by %s", ctx.author.id)
+            if WORKER_MODE == "broker":
+                cancelled = job_broker.cancel_jobs()
+            else:
+                cancelled = job_scheduler.cancel()
+            logger.info("%d jobs cancelled by %s", cancelled, ctx.author.id)
             message = await ctx.send("Stopping all processes...")
-            if extraction_cancel_event.is_set():
-                logger.info("All processes have been forcefully stopped by %s", ctx.author.id)
-                await message.edit(content="All processes have been forcefully stopped.")
+            logger.info("All processes have been forcefully stopped by %s", ctx.author.id)
+            await message.edit(content="All processes have been forcefully stopped.")
         except Exception as e:
             await ctx.send(f"An error occurred while stopping all processes: {e}")
             logger.error("Error stopping all processes: %s", e)
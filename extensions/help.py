@@ -1,8 +1,9 @@
 """Help extension for showing various bot commands."""
 
 from interactions import Embed, Extension, slash_command, check, SlashContext
+from utils.discord_api import discord_api
 from utils.logger import get_logger
-from utils.utils import get_bot_infos, get_commands, is_allowed_channel
+from utils.utils import is_allowed_channel
 
 # Configure logging
 logger = get_logger("help")
@@ -21,8 +22,9 @@ class Help(Extension):
             color="#800080"  # You can set the color of the embed
         )
 
-        bot_infos = get_bot_infos()
-        cmds: list[dict] = get_commands()
+        # Served from the cache warmed at startup, fetched only when it expired
+        bot_infos = await discord_api.get_application()
+        cmds: list[dict] = await discord_api.get_commands()
 
         # Build a valid thumbnail URL. Discord application API may return an
         # avatar hash rather than a full URL, which causes the embed error
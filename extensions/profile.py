@@ -0,0 +1,70 @@
+"""Profile extension for profiling live jobs."""
+
+from interactions import Extension, OptionType, Permissions, SlashContext, check
+from interactions import slash_command, slash_option
+from config import PROFILE_DIR
+from utils.logger import get_logger
+from utils.profiler import PROFILE_MODES, profiler
+from utils.utils import is_allowed_channel
+
+# Configure logging
+logger = get_logger("profile")
+
+class Profile(Extension):
+    """Extension for turning on profiling of the next jobs."""
+    @slash_command(
+        default_member_permissions=Permissions.ADMINISTRATOR,
+    )
+    @check(is_allowed_channel)
+    @slash_option(
+        name="action",
+        description="Start, stop or show the profiling.",
+        required=True,
+        opt_type=OptionType.STRING,
+        choices=[
+            {"name": "Start", "value": "start"},
+            {"name": "Stop", "value": "stop"},
+            {"name": "Status", "value": "status"},
+        ],
+    )
+    @slash_option(
+        name="jobs",
+        description="Profile the next N jobs.",
+        required=False,
+        opt_type=OptionType.INTEGER,
+        min_value=1,
+    )
+    @slash_option(
+        name="minutes",
+        description="Profile every job starting in the next N minutes.",
+        required=False,
+        opt_type=OptionType.INTEGER,
+        min_value=1,
+    )
+    @slash_option(
+        name="mode",
+        description="Stack sampler (low overhead) or cProfile (exact call counts, one job at a time).",
+        required=False,
+        opt_type=OptionType.STRING,
+        choices=[{"name": mode, "value": mode} for mode in PROFILE_MODES],
+    )
+    async def profile(self, ctx: SlashContext, action: str, jobs: int = 0, minutes: int = 0, mode: str = ""):
+        """Profiles the next jobs, results are saved under the profiles directory."""
+        await ctx.defer(ephemeral=True)
+
+        if action == "start":
+            if not jobs and not minutes:
+                jobs = 1
+            profiler.enable(jobs=jobs, seconds=minutes * 60, mode=mode or None)
+            await ctx.send(f"Profiling ({profiler.mode}) {profiler.describe()}, results are saved to `{PROFILE_DIR}`.")
+            logger.info("Profiling started by %s: %s", ctx.author.id, profiler.describe())
+        elif action == "stop":
+            profiler.disable()
+            await ctx.send("Profiling stopped, running profiles are saved when their job finishes.")
+        else:
+            active = ", ".join(f"`{job_id}` ({p.mode}, {p.stage})" for job_id, p in profiler.active.items()) or "none"
+            await ctx.send(f"Profiling ({profiler.mode}) armed for {profiler.describe()}.\nActive profiles: {active}")
+
+def setup(bot):
+    """Sets up the Profile extension."""
+    Profile(bot)
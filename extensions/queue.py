@@ -31,10 +31,14 @@ class Queue(Extension):
             if isinstance(item, dict):
                 link = item.get("link", item)
                 extraction_type = item.get("type", "all_without_audio")
+                filters = item.get("filters", "")
             else:
                 link = item
                 extraction_type = "all_without_audio"
+                filters = ""
             queue_items_str += f"\n{idx}. **{extraction_type}**: {link}"
+            if filters:
+                queue_items_str += f" [{filters}]"
         
         await ctx.send(
             f"Your download queue ({len(user_queue.links)} items):"
@@ -2,9 +2,9 @@
 
 from interactions import Extension, SlashContext, OptionType
 from interactions import slash_command, slash_option, check
-from utils import aria2_service, utils, file_utils
+from utils import utils, file_utils
 from utils.logger import get_logger
-from utils.controller import extraction_cancel_event
+from utils.track_filter import FILTER_HELP, parse_track_filter
 
 # Configure logging
 logger = get_logger("start_queue")
@@ -27,12 +27,32 @@ class StartQueue(Extension):
             {"name": "Audio", "value": "audio"},
             {"name": "All", "value": "all"},
             {"name": "All (Without Audio)", "value": "all_without_audio"},
+            {"name": "Inspect (Track Layout Only)", "value": "inspect"},
         ],
     )
-    async def start_queue(self, ctx: SlashContext, type: str):
+    @slash_option(
+        name="filters",
+        description="Track filters for all links, overrides the filters stored with each link.",
+        required=False,
+        opt_type=OptionType.STRING,
+    )
+    @slash_option(
+        name="full_mediainfo",
+        description="Attach the full MediaInfo report instead of the built-in track report.",
+        required=False,
+        opt_type=OptionType.BOOLEAN,
+    )
+    async def start_queue(self, ctx: SlashContext, type: str, filters: str = "", full_mediainfo: bool = False):
         """Downloads, Extracts, then uploads the results from multiple links in the queue."""
         await ctx.defer()
 
+        # Validate the override filters before touching the queue
+        try:
+            override_filter = parse_track_filter(filters)
+        except ValueError as e:
+            await ctx.send(f"Invalid filters: {e}\n{FILTER_HELP}")
+            return
+
         # Get the queue
         queue = file_utils.get_user_queue(str(ctx.author.id))
 
@@ -43,84 +63,24 @@ class StartQueue(Extension):
             )
             return
 
-        queue_items = queue.links.copy()
-        links_size = len(queue_items)
+        if str(ctx.author.id) in utils.running_queue_users:
+            await ctx.send(f"{ctx.author.mention}, Your queue is already being processed.")
+            return
 
+        links_size = len(queue.links)
         logger.info(
             "Starting queue processing for user %s with %d links.",
             str(ctx.author.id), links_size
         )
-        await ctx.send(f"Starting the download and extraction process for {links_size} links.")
-
-        i = 1
-        # Start download and extraction process
-        for queue_item in queue_items:
-            # Extract link from queue item (supports both old string format and new dict format)
-            url = queue_item.get("link", queue_item) if isinstance(queue_item, dict) else queue_item
-            extraction_type = type  # Use selected type for all links
-
-            # Check for cancellation
-            if extraction_cancel_event.is_set():
-                aria2_service.remove_all_downloads(force=True)
-                file_utils.clear_current_dl()
-                file_utils.clear_temp()
-                await ctx.send(content="queue processing has been cancelled.")
-                break
-
-            logger.info("Starting download and extraction for URL: %s with extraction type: %s", url, extraction_type)
-            completed = await utils.download_and_extract(ctx, url, extraction_type=extraction_type)
-
-            # Check if completed successfully
-            if completed is True:
-                # Remove the specific URL from queue
-                queue_items_remaining = [item for item in queue_items if (item.get("link") if isinstance(item, dict) else item) != url]
-                file_utils.clear_user_queue(str(ctx.author.id))
-                file_utils.save_queue(str(ctx.author.id), queue_items_remaining)
-                logger.info("Extraction process completed for (%d/%d) links.", i, links_size)
-                await ctx.send(
-                    f"{ctx.author.mention}, "
-                    f"Extraction process completed for ({i}/{links_size}) links.\n"
-                    f"{'Processing next link...' if i < links_size else ''}"
-                )
-            else:
-                logger.error("Extraction process failed for URL: %s", url)
-                await ctx.send(
-                    f"{ctx.author.mention}, "
-                    f"Extraction process failed for the link:\n"
-                    f"{url}\n\n"
-                    f"{'Skipping to the next link...' if i < links_size else ''}"
-                )
-
-            # Clean up after each link
-            try:
-                aria2_service.remove_all_downloads(force=True)
-            except Exception as e:
-                logger.error("Error removing downloads during cleanup: %s", e)
-            file_utils.clear_current_dl()
-            try:
-                file_utils.clear_temp()
-            except Exception as e:
-                logger.error("Error clearing temp files: %s", e)
-            # Increment link counter
-            i += 1
-
-
-        logger.info("Extraction process completed for all links.")
         await ctx.send(
-            f"{ctx.author.mention}, Extraction process completed for all links, Have Fun :grin:"
+            f"Starting the download and extraction process for {links_size} links, "
+            f"they run in the background whenever a download slot is free."
         )
 
-        #region ---- Clean up ----
-        try:
-            aria2_service.remove_all_downloads(force=True)
-        except Exception as e:
-            logger.error("Error removing downloads during cleanup: %s", e)
-        file_utils.clear_current_dl()
-        try:
-            file_utils.clear_temp()
-        except Exception as e:
-            logger.error("Error clearing temp files: %s", e)
-        #endregion
+        # Start download and extraction process
+        await utils.process_queue(
+            ctx, type, override_filter=override_filter, full_mediainfo=full_mediainfo
+        )
 
 def setup(bot):
     """Sets up the Extractor extension."""
@@ -1,8 +1,10 @@
 """Status extension for checking current download status."""
 
 from interactions import Extension, slash_command, check, SlashContext
-from utils import file_utils
+from config import WORKER_MODE
+from utils.broker import job_broker
 from utils.logger import get_logger
+from utils.scheduler import job_scheduler
 from utils.utils import is_allowed_channel
 
 # Configure logging
@@ -13,44 +15,48 @@ class Status(Extension):
     @slash_command()
     @check(is_allowed_channel)
     async def status(self, ctx: SlashContext):
-        """Checks the current status of the current download."""
+        """Checks the status of the running and waiting jobs."""
         await ctx.defer()
-        current_dl = file_utils.load_current_dl()
-        if not current_dl:
+        if WORKER_MODE == "broker":
+            await self.worker_status(ctx)
+            return
+
+        running = list(job_scheduler.running.values())
+        if not running and not job_scheduler.waiting:
             await ctx.send("No download in progress.")
             logger.info("No download in progress.")
             return
 
-        user_id = current_dl.get("user_id", "")
-        guild_id = current_dl.get("guild_id", "")
-
-        # If the command is invoked by the user who started the download
-        if str(ctx.author.id) == str(user_id):
-            # Check if the download is in the same guild
-            if ctx.guild and str(ctx.guild.id) == str(guild_id):
-                await ctx.send(f"{ctx.author.mention}, You already have a download in progress.")
-            else:
-                await ctx.send(
-                    f"{ctx.author.mention}, "
-                    f"You have a download in progress in another server."
-                )
-        # If the command is invoked by a different user
-        else:
-            user = await self.bot.fetch_user(int(user_id)) if user_id else None
-            # Check if the download is in the same guild
-            if user and ctx.guild:
-                if str(ctx.guild.id) == str(guild_id):
-                    await ctx.send(f"{user.mention} has a download in progress.")
-                elif str(ctx.guild.id) != str(guild_id):
-                    await ctx.send(
-                        f"{ctx.author.mention}, "
-                        f"Another user has a download in progress in another server."
-                    )
-            else:
-                await ctx.send("A download is currently in progress by another user.")
+        lines = [
+            f"{len(running)}/{job_scheduler.max_jobs} download slots in use, "
+            f"{len(job_scheduler.waiting)} jobs waiting."
+        ]
+        # Only the user's own links are listed
+        for ticket in [*running, *job_scheduler.waiting]:
+            if ticket.user_id != str(ctx.author.id):
+                continue
+            where = "running" if job_scheduler.is_running(ticket) else f"waiting, number {job_scheduler.position(ticket)} in line"
+            lines.append(f"- {ticket.url}: {where}")
+        await ctx.send("\n".join(lines))
 
         logger.info("User %s checked the download status.", ctx.author.id)
 
+    async def worker_status(self, ctx: SlashContext):
+        """Lists the jobs queued for and run by the workers."""
+        jobs = [job for job in job_broker.list_jobs() if job.status != "done"]
+        if not jobs:
+            await ctx.send("No download in progress.")
+            return
+
+        running = [job for job in jobs if job.status == "running"]
+        own = [job for job in jobs if job.payload.get("user_id") == str(ctx.author.id)]
+        lines = [f"{len(running)} jobs running on the workers, {len(jobs) - len(running)} waiting."]
+        for job in own:
+            where = f"on worker `{job.worker_id}`" if job.status == "running" else "waiting for a worker"
+            lines.append(f"- {job.payload.get('url')}: {where}")
+        await ctx.send("\n".join(lines))
+        logger.info("User %s checked the worker jobs status.", ctx.author.id)
+
 
 def setup(bot):
     """Sets up the Status extension."""
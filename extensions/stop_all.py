@@ -1,9 +1,10 @@
 """StopAll extension for stopping all processes."""
 
 from interactions import Extension, SlashContext, slash_command, check
-from utils import file_utils
+from config import WORKER_MODE
+from utils.broker import job_broker
 from utils.logger import get_logger
-from utils.controller import extraction_cancel_event
+from utils.scheduler import job_scheduler
 from utils.utils import is_allowed_channel
 
 # Configure logging
@@ -17,26 +18,24 @@ class StopAll(Extension):
         """Stops all processes (if initiated by the same user)."""
         await ctx.defer()
         try:
-            current_dl = file_utils.load_current_dl()
-            if not current_dl:
-                await ctx.send("No active processes to stop.")
-                logger.info("No active processes to stop.")
+            # The workers stop the user's jobs at their next heartbeat
+            if WORKER_MODE == "broker":
+                if not job_broker.cancel_jobs(user_id=str(ctx.author.id)):
+                    await ctx.send("No active processes to stop.")
+                    return
+                logger.info("Worker jobs of %s cancelled.", ctx.author.id)
+                await ctx.send("All your processes are being stopped.")
                 return
 
-            if ctx.author.id != int(current_dl.get("user_id", 0)):
-                await ctx.send("You do not have permission to stop the current processes.")
-                logger.warning(
-                    "User %s attempted to stop processes without permission.",
-                    ctx.author.id
-                )
+            # Only the jobs of the user are stopped, the other users' jobs keep their slots
+            cancelled = job_scheduler.cancel(user_id=str(ctx.author.id))
+            if not cancelled:
+                await ctx.send("No active processes to stop.")
+                logger.info("No active processes to stop.")
                 return
 
-            extraction_cancel_event.set()
-            logger.info("Extraction cancellation event fired by %s", ctx.author.id)
-            message = await ctx.send("Stopping all processes...")
-            if extraction_cancel_event.is_set():
-                logger.info("All processes have been stopped by %s", ctx.author.id)
-                await message.edit(content="All processes have been stopped.")
+            logger.info("%d jobs cancelled by %s", cancelled, ctx.author.id)
+            await ctx.send("All your processes have been stopped.")
         except Exception as e:
             await ctx.send(f"An error occurred while stopping all processes: {e}")
             logger.error("Error stopping all processes: %s", e)
@@ -0,0 +1,157 @@
+"""
+Headless batch extraction of local Matroska files, without Discord or Aria2.
+
+Takes files and directories (searched recursively), e.g.:
+
+    python subxtract.py ~/Videos/Show --type subtitles --filters "subs.lang:eng" -j 8 -o ./extracted
+    python subxtract.py a.mkv b.mkv --summary summary.json
+
+Every file gets its own directory under the output directory, holding its media report, chapters and
+zips. Progress goes to stderr, the JSON summary of every file to stdout (or --summary).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent
+
+def configure_environment(args: argparse.Namespace):
+    """Configures the engine for a local run, must run before any project module is imported."""
+    # Run from any directory
+    os.environ.setdefault("SCHEMAS_DIR", str(REPO_DIR / "schemas"))
+    os.environ["LOG_LEVEL"] = "INFO" if args.verbose else "WARNING"
+    # The job log only matters to the bot
+    os.environ.setdefault("LOG_FILE", "")
+    os.environ["METRICS_PORT"] = ""
+
+def collect_files(paths: list[str]) -> list[Path]:
+    """Returns the Matroska files given directly or found in the given directories, without duplicates."""
+    from utils.file_utils import MATROSKA_EXTENSIONS, get_temp_files
+
+    files: list[Path] = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            found = get_temp_files(path)
+            files.extend(Path(f) for f in found["full_paths"])
+        elif path.is_file() and path.suffix.lower() in MATROSKA_EXTENSIONS:
+            files.append(path)
+        else:
+            print(f"Skipping {path}: not a Matroska file or a directory.", file=sys.stderr)
+    return list(dict.fromkeys(f.resolve() for f in files))
+
+def get_output_names(files: list[Path]) -> dict[Path, str]:
+    """Names the output directory of every file after it, numbering the files sharing a name."""
+    names: dict[Path, str] = {}
+    used: set[str] = set()
+    for file in files:
+        name, n = file.stem, 1
+        while name in used:
+            n += 1
+            name = f"{file.stem}_{n}"
+        used.add(name)
+        names[file] = name
+    return names
+
+def extract_one(file: Path, destination: Path, args: argparse.Namespace, track_filter) -> dict:
+    """Extracts one file into its output directory, returns its summary entry."""
+    from utils import extraction
+    from utils.mkv_service import MKVService
+
+    start = time.perf_counter()
+    entry = {"file": str(file), "output_dir": str(destination), "status": "failed", "counts": {}, "outputs": [], "error": ""}
+    # Extract to a scratch directory, only the results are kept
+    work_dir = Path(tempfile.mkdtemp(prefix=".work-", dir=destination.parent))
+    try:
+        if MKVService.get_mkv_formatted_info(str(file)) is None:
+            raise RuntimeError("mkvmerge could not identify the file")
+        result = extraction.extract_file(
+            str(file), work_dir, extraction_type=args.type, track_filter=track_filter,
+            full_mediainfo=args.full_mediainfo, split_size=args.split_size
+        )
+        destination.mkdir(parents=True, exist_ok=True)
+        for path in result.paths:
+            target = destination / path.name
+            shutil.move(path, target)
+            entry["outputs"].append(str(target))
+        entry.update(status="completed", counts=result.counts())
+    except Exception as e:
+        entry["error"] = str(e)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        entry["duration_s"] = round(time.perf_counter() - start, 3)
+    return entry
+
+def main(args: argparse.Namespace) -> int:
+    from utils.extraction import EXTRACTION_TYPES
+    from utils.track_filter import FILTER_HELP, parse_track_filter
+
+    if args.type not in EXTRACTION_TYPES:
+        print(f"Invalid type {args.type}, choose from: {', '.join(EXTRACTION_TYPES)}", file=sys.stderr)
+        return 2
+    try:
+        track_filter = parse_track_filter(args.filters)
+    except ValueError as e:
+        print(f"Invalid filters: {e}\n{FILTER_HELP}", file=sys.stderr)
+        return 2
+
+    files = collect_files(args.paths)
+    if not files:
+        print("No Matroska files (.mkv, .mk3d, .mka) found.", file=sys.stderr)
+        return 1
+
+    output_dir = Path(args.output_dir).resolve()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    names = get_output_names(files)
+
+    started = time.perf_counter()
+    entries = []
+    with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+        futures = [executor.submit(extract_one, file, output_dir / names[file], args, track_filter) for file in files]
+        for i, future in enumerate(as_completed(futures), start=1):
+            entry = future.result()
+            entries.append(entry)
+            details = ", ".join(f"{content} {count}" for content, count in entry["counts"].items()) or entry["error"]
+            print(f"[{i}/{len(files)}] {entry['status']}: {entry['file']} ({details}) in {entry['duration_s']:.2f}s", file=sys.stderr)
+
+    # Keep the input order in the summary
+    entries.sort(key=lambda entry: files.index(Path(entry["file"])))
+    summary = {
+        "output_dir": str(output_dir),
+        "extraction_type": args.type,
+        "filters": track_filter.expression if track_filter else "",
+        "completed": sum(entry["status"] == "completed" for entry in entries),
+        "failed": sum(entry["status"] == "failed" for entry in entries),
+        "elapsed_s": round(time.perf_counter() - started, 3),
+        "files": entries,
+    }
+    report = json.dumps(summary, indent=4, ensure_ascii=False)
+    if args.summary == "-":
+        print(report)
+    else:
+        Path(args.summary).write_text(report, encoding="utf-8")
+    return 1 if summary["failed"] else 0
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Extract subtitles, attachments, chapters and audio from local Matroska files.")
+    parser.add_argument("paths", nargs="+", help="Matroska files, or directories searched recursively.")
+    parser.add_argument("-t", "--type", default="all_without_audio", help="What to extract: all, all_without_audio, subtitles, attachments, chapters or audio.")
+    parser.add_argument("-f", "--filters", default="", help="Track filters, e.g. \"subs.lang:eng audio.lang:jpn\".")
+    parser.add_argument("-j", "--jobs", type=int, default=min(4, os.cpu_count() or 1), help="Files extracted at the same time.")
+    parser.add_argument("-o", "--output-dir", default="./extracted", help="Directory the results are written to, one subdirectory per file.")
+    parser.add_argument("--summary", default="-", help="Write the JSON summary to this file instead of stdout.")
+    parser.add_argument("--split-size", type=int, default=0, help="Split the zips into parts of this many bytes (0 keeps single zips).")
+    parser.add_argument("--full-mediainfo", action="store_true", help="Save the full MediaInfo report instead of the built-in one.")
+    parser.add_argument("--verbose", action="store_true", help="Show the engine logs.")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure_environment(arguments)
+    sys.exit(main(arguments))
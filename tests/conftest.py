@@ -0,0 +1,22 @@
+"""Test configuration, points the configuration at a scratch directory before any project module is imported."""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_DIR))
+
+_data_dir = Path(tempfile.mkdtemp(prefix="subxtract-tests-"))
+os.environ.update({
+    "TEMP_DIR": str(_data_dir / "temp"),
+    "DOWNLOAD_DIR": str(_data_dir / "temp" / "downloads"),
+    "EXTRACT_DIR": str(_data_dir / "temp" / "extracted"),
+    "JOB_STATE_FILE": str(_data_dir / "job_state.json"),
+    "QUEUE_FILE": str(_data_dir / "queue.json"),
+    "LOG_FILE": str(_data_dir / "logs" / "jobs.jsonl"),
+    "RETENTION_INDEX_FILE": str(_data_dir / "retention.json"),
+    "WATCH_INDEX_FILE": str(_data_dir / "watch_index.json"),
+    "METRICS_PORT": "",
+})
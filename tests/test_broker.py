@@ -0,0 +1,110 @@
+"""Tests of the event uploads of the job broker."""
+
+import asyncio
+import json
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from utils.broker import JobBroker
+
+def _post_events(broker: JobBroker, job_id: str, forms: list) -> list[tuple[int, dict]]:
+    """Posts multipart forms to the event endpoint, returns the status and body of every response."""
+    async def run():
+        app = web.Application()
+        app.router.add_post("/jobs/{job_id}/events", broker._handle_event)
+        async with TestClient(TestServer(app)) as client:
+            responses = []
+            for form in forms:
+                response = await client.post(f"/jobs/{job_id}/events", data=form)
+                responses.append((response.status, await response.json()))
+            return responses
+    return asyncio.run(run())
+
+def _claim(broker: JobBroker, headers: dict) -> int:
+    """Posts a claim through the authentication of the broker, returns the response status."""
+    async def run():
+        app = web.Application(middlewares=[broker._auth])
+        app.router.add_post("/claim", broker._handle_claim)
+        async with TestClient(TestServer(app)) as client:
+            response = await client.post("/claim", json={"worker_id": "worker-1"}, headers=headers)
+            return response.status
+    return asyncio.run(run())
+
+def _form(event: dict | None, files: list[tuple[str, bytes]] = (), event_last: bool = False) -> aiohttp.FormData:
+    form = aiohttp.FormData()
+    if event is not None and not event_last:
+        form.add_field("event", json.dumps(event), content_type="application/json")
+    for name, content in files:
+        form.add_field("file", content, filename=name, content_type="application/octet-stream")
+    if event is not None and event_last:
+        form.add_field("event", json.dumps(event), content_type="application/json")
+    return form
+
+def _running_broker(tmp_path) -> tuple[JobBroker, str]:
+    broker = JobBroker(str(tmp_path / "broker.db"), str(tmp_path / "spool"), "", 60)
+    job_id = broker.submit({"url": "magnet:?xt=urn:btih:" + "a" * 40, "user_id": "1", "guild_id": "2"})
+    assert broker.claim("worker-1").job_id == job_id
+    return broker, job_id
+
+def test_event_files_are_spooled_with_unique_names(tmp_path):
+    broker, job_id = _running_broker(tmp_path)
+    files = [("mediainfo.txt", b"first"), ("mediainfo.txt", b"second"), ("subs.ass", b"third")]
+    [(status, body)] = _post_events(broker, job_id, [_form({"type": "send", "worker_id": "worker-1"}, files)])
+
+    assert status == 200
+    [(seq, event)] = broker.get_events(job_id, 0)
+    assert seq == body["seq"]
+    assert event["files"] == ["mediainfo.txt", "mediainfo_2.txt", "subs.ass"]
+    spooled = tmp_path / "spool" / job_id / str(seq)
+    assert [(spooled / name).read_bytes() for name in event["files"]] == [b"first", b"second", b"third"]
+    assert [path.name for path in (tmp_path / "spool" / job_id).iterdir()] == [str(seq)]
+
+def test_unknown_job_is_rejected_before_spooling(tmp_path):
+    broker, _job_id = _running_broker(tmp_path)
+    [(status, _body)] = _post_events(broker, "missing", [_form({"worker_id": "worker-1"}, [("a.ass", b"x")])])
+
+    assert status == 404
+    assert not (tmp_path / "spool" / "missing").exists()
+
+def test_other_worker_is_rejected_before_spooling(tmp_path):
+    broker, job_id = _running_broker(tmp_path)
+    [(status, _body)] = _post_events(broker, job_id, [_form({"worker_id": "worker-2"}, [("a.ass", b"x")])])
+
+    assert status == 409
+    assert broker.get_events(job_id, 0) == []
+    assert not (tmp_path / "spool" / job_id).exists()
+
+def test_finished_job_is_rejected(tmp_path):
+    broker, job_id = _running_broker(tmp_path)
+    assert broker.finish(job_id, "worker-1", True)
+    [(status, _body)] = _post_events(broker, job_id, [_form({"worker_id": "worker-1"}, [("a.ass", b"x")])])
+
+    assert status == 409
+    assert not (tmp_path / "spool" / job_id).exists()
+
+def test_event_must_come_first(tmp_path):
+    broker, job_id = _running_broker(tmp_path)
+    responses = _post_events(broker, job_id, [
+        _form({"worker_id": "worker-1"}, [("a.ass", b"x")], event_last=True),
+        _form(None, [("a.ass", b"x")]),
+    ])
+
+    assert [status for status, _body in responses] == [400, 400]
+    assert broker.get_events(job_id, 0) == []
+    assert not (tmp_path / "spool" / job_id).exists()
+
+def test_unauthenticated_claim_is_rejected(tmp_path):
+    broker = JobBroker(str(tmp_path / "broker.db"), str(tmp_path / "spool"), "secret", 60)
+    job_id = broker.submit({"url": "https://example.com/ep01.mkv", "user_id": "1", "guild_id": "2"})
+
+    assert _claim(broker, {}) == 401
+    assert _claim(broker, {"Authorization": "Bearer wrong"}) == 401
+    assert broker.get_job(job_id).status == "queued"
+    assert _claim(broker, {"Authorization": "Bearer secret"}) == 200
+    assert broker.get_job(job_id).status == "running"
+
+def test_broker_without_token_only_listens_on_localhost(tmp_path):
+    broker = JobBroker(str(tmp_path / "broker.db"), str(tmp_path / "spool"), "", 60)
+    assert asyncio.run(broker.start("0.0.0.0", 0)) is None
@@ -0,0 +1,88 @@
+"""Tests of the download sharing between the jobs of a release."""
+
+from pathlib import Path
+
+import pytest
+
+from utils import coalescer
+from utils.coalescer import DownloadCoalescer
+from utils.file_utils import JobStateObject
+
+KEY = "btih:" + "a" * 40
+
+@pytest.fixture
+def unheld(monkeypatch) -> list[str]:
+    """Records the jobs let out of the scheduler by the coalescer."""
+    calls: list[str] = []
+    monkeypatch.setattr(coalescer.job_scheduler, "unhold", calls.append)
+    return calls
+
+def _jobs(count: int) -> list[JobStateObject]:
+    return [JobStateObject(job_id=f"job{i}", user_id="1", url="magnet:?xt=urn:btih:" + "a" * 40) for i in range(count)]
+
+def test_first_job_leads_and_late_jobs_are_held(unheld):
+    downloads = DownloadCoalescer()
+    first, second = _jobs(2)
+    shared = downloads.join(KEY, first)
+    assert downloads.join(KEY, second) is shared
+    assert shared.leader == "job0"
+    assert not downloads.is_held(shared, "job0")
+    assert downloads.is_held(shared, "job1")
+
+    downloads.publish(shared, "gid", Path("/downloads/release"))
+    assert not downloads.is_held(shared, "job1")
+    assert unheld == ["job0", "job1"]
+
+def test_leader_failing_before_publish_hands_over(unheld):
+    downloads = DownloadCoalescer()
+    first, second, third = _jobs(3)
+    shared = downloads.join(KEY, first)
+    downloads.join(KEY, second)
+    downloads.join(KEY, third)
+
+    # Nothing was downloaded, the leader's files are cleaned up at once
+    assert downloads.leave(shared, first) == [first]
+    assert shared.leader == "job1"
+    assert unheld == ["job1"]
+    assert not downloads.is_held(shared, "job1")
+    assert downloads.is_held(shared, "job2")
+    assert downloads.downloads[KEY] is shared
+
+def test_held_job_leaving_keeps_the_leader(unheld):
+    downloads = DownloadCoalescer()
+    first, second = _jobs(2)
+    shared = downloads.join(KEY, first)
+    downloads.join(KEY, second)
+
+    assert downloads.leave(shared, second) == [second]
+    assert shared.leader == "job0"
+    assert unheld == []
+
+def test_last_member_leaving_before_publish_drops_the_download(unheld):
+    downloads = DownloadCoalescer()
+    first, second = _jobs(2)
+    shared = downloads.join(KEY, first)
+    downloads.join(KEY, second)
+    downloads.leave(shared, first)
+
+    assert downloads.leave(shared, second) == [second]
+    assert KEY not in downloads.downloads
+    # The next job of the release starts a new download
+    third = JobStateObject(job_id="job3")
+    assert downloads.join(KEY, third).leader == "job3"
+
+def test_last_member_leaving_after_publish_triggers_cleanup(unheld):
+    downloads = DownloadCoalescer()
+    first, second, third = _jobs(3)
+    shared = downloads.join(KEY, first)
+    downloads.join(KEY, second)
+    downloads.publish(shared, "gid", Path("/downloads/release"))
+    # Joining a ready download does not wait
+    downloads.join(KEY, third)
+    assert not downloads.is_held(shared, "job2")
+
+    assert downloads.leave(shared, first) == []
+    assert downloads.leave(shared, third) == []
+    assert KEY in downloads.downloads
+    assert downloads.leave(shared, second) == [first, third, second]
+    assert KEY not in downloads.downloads
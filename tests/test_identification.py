@@ -0,0 +1,183 @@
+"""Tests of the streaming mkvmerge identification parser."""
+
+import io
+import json
+
+import pytest
+
+from utils.identification import Identification, JsonStreamReader, read_identification
+
+# mkvmerge -J output of a file with video, audio, subtitles, fonts, chapters and tags
+MKVMERGE_SAMPLE = {
+    "attachments": [
+        {"content_type": "font/ttf", "description": "", "file_name": "Roboto-Bold.ttf", "id": 1, "properties": {"uid": 12345678901234567}, "size": 167336, "type": "attachment"},
+        {"content_type": "application/vnd.ms-opentype", "description": "", "file_name": "Gandhi Sans.otf", "id": 2, "properties": {"uid": 2}, "size": 58424, "type": "attachment"},
+    ],
+    "chapters": [{"num_entries": 6}],
+    "container": {
+        "properties": {
+            "container_type": 17,
+            "date_local": "2024-01-01T12:00:00+01:00",
+            "duration": 1420053000000,
+            "is_providing_timestamps": True,
+            "muxing_application": "libebml v1.4.4 + libmatroska v1.7.1",
+            "segment_uid": "9a4b1c2d3e4f5a6b7c8d9e0f1a2b3c4d",
+            "timestamp_scale": 1000000,
+            "title": "Episode 01 \"Pilot\" — \\ special",
+            "writing_application": "mkvmerge v80.0 ('Roundabout') 64-bit",
+        },
+        "recognized": True,
+        "supported": True,
+        "type": "Matroska",
+    },
+    "errors": [],
+    "file_name": "/downloads/Show - 01 [1080p].mkv",
+    "global_tags": [{"num_entries": 3}],
+    "identification_format_version": 17,
+    "track_tags": [{"num_entries": 7, "track_id": 0}],
+    "tracks": [
+        {
+            "codec": "AVC/H.264/MPEG-4p10",
+            "id": 0,
+            "properties": {
+                "codec_id": "V_MPEG4/ISO/AVC",
+                "codec_private_data": "01640028ffe1001b67640028acd940780227e5c044000003000400000300c83c60c658",
+                "default_duration": 41708333,
+                "default_track": True,
+                "display_dimensions": "1920x1080",
+                "forced_track": False,
+                "language": "und",
+                "minimum_timestamp": 0,
+                "pixel_dimensions": "1920x1080",
+                "tag_bps": "7412345",
+                "tag_duration": "00:23:40.042000000",
+                "tag_number_of_bytes": "1315432187",
+                "uid": 1,
+            },
+            "type": "video",
+        },
+        {
+            "codec": "AAC",
+            "id": 1,
+            "properties": {
+                "audio_channels": 2,
+                "audio_sampling_frequency": 48000,
+                "codec_id": "A_AAC",
+                "default_track": True,
+                "forced_track": False,
+                "language": "jpn",
+                "language_ietf": "ja",
+                "tag_number_of_bytes": "22712533",
+                "track_name": "Japanese 2.0",
+                "uid": 2,
+            },
+            "type": "audio",
+        },
+        {
+            "codec": "SubStationAlpha",
+            "id": 2,
+            "properties": {
+                "codec_id": "S_TEXT/ASS",
+                "default_track": True,
+                "forced_track": False,
+                "language": "eng",
+                "language_ietf": "en",
+                "tag_number_of_bytes": "63142",
+                "text_subtitles": True,
+                "track_name": "Full [Group]",
+                "uid": 3,
+            },
+            "type": "subtitles",
+        },
+        {
+            "codec": "SubRip/SRT",
+            "id": 3,
+            "properties": {
+                "codec_id": "S_TEXT/UTF8",
+                "default_track": False,
+                "forced_track": True,
+                "language": "spa",
+                "text_subtitles": True,
+                "track_name": "Signs",
+                "uid": 4,
+            },
+            "type": "subtitles",
+        },
+    ],
+    "warnings": ["Unknown element 0x1f43b675 with a float 2.5e-3 in \"quotes\""],
+}
+
+JSON_TEXTS = [
+    "[1.5]",
+    "[-2.5e3]",
+    "[0, -0.125, 1E+10, 3e-7, 42]",
+    '{"a": [true, false, null], "b": {"c": "d\\"e\\\\"}, "f": -12.75}',
+    '  [ "x" , [ ] , { } , 1.0e0 ]  ',
+    json.dumps(MKVMERGE_SAMPLE),
+]
+
+def _reader(text: str, chunk_size: int) -> JsonStreamReader:
+    return JsonStreamReader(io.StringIO(text), chunk_size)
+
+def _record_fields(records) -> list[dict]:
+    """The fields of the records, the nested record lists are compared separately."""
+    nested = ("tracks", "attachments", "chapters")
+    return [{slot: getattr(record, slot) for slot in record.__slots__ if slot not in nested} for record in records or []]
+
+@pytest.mark.parametrize("text", JSON_TEXTS)
+def test_read_value_matches_json_loads_at_every_chunk_size(text):
+    expected = json.loads(text)
+    for chunk_size in range(1, min(len(text), 64) + 1):
+        assert _reader(text, chunk_size).read_value() == expected, chunk_size
+
+@pytest.mark.parametrize("text", JSON_TEXTS)
+def test_skip_value_consumes_the_whole_value_at_every_chunk_size(text):
+    for chunk_size in range(1, min(len(text), 64) + 1):
+        reader = _reader(f"[{text}, 7]", chunk_size)
+        values = []
+        for index, _ in enumerate(reader.iter_array()):
+            if index == 0:
+                reader.skip_value()
+            else:
+                values.append(reader.read_value())
+        assert values == [7], chunk_size
+
+@pytest.mark.parametrize("text", ["[1.5", "[1 2]", '["a]', "[tru]", "{1: 2}"])
+def test_invalid_json_raises_value_error(text):
+    with pytest.raises(ValueError):
+        _reader(text, 2).read_value()
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 64 * 1024])
+def test_read_identification_matches_the_records_of_the_parsed_output(chunk_size):
+    text = json.dumps(MKVMERGE_SAMPLE, indent=2)
+    info = read_identification(_reader(text, chunk_size))
+    expected = Identification.from_dict(MKVMERGE_SAMPLE)
+
+    assert _record_fields([info]) == _record_fields([expected])
+    assert _record_fields(info.tracks) == _record_fields(expected.tracks)
+    assert _record_fields(info.attachments) == _record_fields(expected.attachments)
+    assert info.chapter_count == 6
+
+def test_read_identification_keeps_the_fields_of_the_records():
+    info = read_identification(_reader(json.dumps(MKVMERGE_SAMPLE), 5))
+
+    assert info.title == 'Episode 01 "Pilot" — \\ special'
+    assert info.duration == 1420053000000
+    assert [(t.id, t.type, t.language, t.size) for t in info.tracks] == [
+        (0, "video", "und", 1315432187), (1, "audio", "jpn", 22712533),
+        (2, "subtitles", "eng", 63142), (3, "subtitles", "spa", None),
+    ]
+    assert info.tracks[1].name == "Japanese 2.0" and info.tracks[1].audio_channels == 2
+    assert info.tracks[3].forced and not info.tracks[3].default
+    assert [(a.id, a.file_name, a.size) for a in info.attachments] == [(1, "Roboto-Bold.ttf", 167336), (2, "Gandhi Sans.otf", 58424)]
+
+def test_read_identification_without_attachments_or_chapters():
+    text = json.dumps({"container": {"type": "Matroska", "properties": {}}, "tracks": []})
+    info = read_identification(_reader(text, 3))
+
+    assert info.tracks == [] and info.attachments is None and info.chapters is None
+
+def test_read_identification_rejects_a_track_without_id():
+    text = json.dumps({"tracks": [{"type": "video", "properties": {"language": "und"}}]})
+    with pytest.raises(ValueError):
+        read_identification(_reader(text, 4))
@@ -0,0 +1,63 @@
+"""Tests of the single run of a user's queue."""
+
+import asyncio
+from types import SimpleNamespace
+
+from utils import file_utils, utils
+
+class FakeContext:
+    def __init__(self, user_id: int):
+        self.author = SimpleNamespace(id=user_id, mention=f"<@{user_id}>")
+        self.sent: list[str] = []
+
+    async def send(self, content: str | None = None, **_kwargs):
+        self.sent.append(content)
+
+def test_resumed_and_started_runs_share_the_guard(monkeypatch):
+    started = asyncio.Event()
+    release = asyncio.Event()
+    runs: list[str | None] = []
+
+    async def fake_process_queue(ctx, user_id, extraction_type, override_filter, full_mediainfo, resume_job):
+        runs.append(resume_job.job_id if resume_job else None)
+        started.set()
+        await release.wait()
+
+    removed: list[str] = []
+    monkeypatch.setattr(utils, "_process_queue", fake_process_queue)
+    monkeypatch.setattr(utils, "cleanup_job", lambda job: None)
+    monkeypatch.setattr(file_utils, "remove_job", removed.append)
+
+    async def run():
+        resumed_ctx, command_ctx, other_ctx = FakeContext(1), FakeContext(1), FakeContext(2)
+        resume_job = file_utils.JobStateObject(job_id="job1", kind="queue", user_id="1", url="https://example.com/a.mkv")
+        resumed = asyncio.create_task(utils.process_queue(resumed_ctx, "subtitles", resume_job=resume_job))
+        await started.wait()
+
+        # /start_queue while the resumed run is still going
+        await utils.process_queue(command_ctx, "subtitles")
+        assert command_ctx.sent == ["<@1>, Your queue is already being processed."]
+
+        # Another user's queue is not blocked
+        other = asyncio.create_task(utils.process_queue(other_ctx, "subtitles"))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(resumed, other)
+
+        # The guard is released once the run is over
+        await utils.process_queue(command_ctx, "subtitles")
+
+    asyncio.run(run())
+    assert runs == ["job1", None, None]
+    assert removed == []
+    assert utils.running_queue_users == set()
+
+def test_resumed_run_of_a_running_queue_drops_its_job(monkeypatch):
+    removed: list[str] = []
+    monkeypatch.setattr(utils, "cleanup_job", lambda job: None)
+    monkeypatch.setattr(file_utils, "remove_job", removed.append)
+    monkeypatch.setattr(utils, "running_queue_users", {"1"})
+
+    resume_job = file_utils.JobStateObject(job_id="job1", kind="queue", user_id="1")
+    asyncio.run(utils.process_queue(FakeContext(1), "subtitles", resume_job=resume_job))
+    assert removed == ["job1"]
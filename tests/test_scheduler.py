@@ -0,0 +1,68 @@
+"""Tests of the fair scheduling order and caps of the jobs."""
+
+from itertools import count
+
+from utils.scheduler import PRIORITY_ADMIN, FairPolicy, Ticket
+
+_seq = count()
+
+def _ticket(job_id: str, user_id: str = "u1", guild_id: str = "g1", **data) -> Ticket:
+    return Ticket(job_id=job_id, user_id=user_id, guild_id=guild_id, seq=next(_seq), **data)
+
+def _drain(policy: FairPolicy, waiting: list[Ticket], running: list[Ticket] | None = None) -> list[str]:
+    """Picks jobs until every waiting job started or is capped, returns the starting order."""
+    waiting, running, order = list(waiting), list(running or []), []
+    while (ticket := policy.pick(waiting, running)) is not None:
+        waiting.remove(ticket)
+        running.append(ticket)
+        order.append(ticket.job_id)
+    return order
+
+def test_empty_waiting_list():
+    assert FairPolicy(0, 0, 0).pick([], []) is None
+
+def test_submission_order_without_contention():
+    waiting = [_ticket("a"), _ticket("b"), _ticket("c")]
+    assert _drain(FairPolicy(0, 0, 0), waiting) == ["a", "b", "c"]
+
+def test_round_robin_across_users():
+    waiting = [_ticket("a1", "a"), _ticket("a2", "a"), _ticket("a3", "a"), _ticket("b1", "b"), _ticket("b2", "b")]
+    assert _drain(FairPolicy(0, 0, 0), waiting) == ["a1", "b1", "a2", "b2", "a3"]
+
+def test_round_robin_across_guilds_before_users():
+    waiting = [
+        _ticket("x1", "u1", "x"), _ticket("x2", "u2", "x"), _ticket("x3", "u3", "x"),
+        _ticket("y1", "u4", "y"),
+    ]
+    assert _drain(FairPolicy(0, 0, 0), waiting) == ["x1", "y1", "x2", "x3"]
+
+def test_admin_and_interactive_jobs_go_first():
+    waiting = [
+        _ticket("queue", "a", background=True),
+        _ticket("normal", "b"),
+        _ticket("admin", "c", priority=PRIORITY_ADMIN),
+    ]
+    assert _drain(FairPolicy(0, 0, 0), waiting) == ["admin", "normal", "queue"]
+
+def test_per_user_cap():
+    waiting = [_ticket("a1", "a"), _ticket("a2", "a"), _ticket("a3", "a"), _ticket("b1", "b")]
+    assert _drain(FairPolicy(2, 0, 0), waiting) == ["a1", "b1", "a2"]
+
+def test_per_guild_cap():
+    waiting = [_ticket("x1", "u1", "x"), _ticket("x2", "u2", "x"), _ticket("y1", "u3", "y")]
+    assert _drain(FairPolicy(0, 1, 0), waiting) == ["x1", "y1"]
+
+def test_caps_count_the_running_jobs():
+    policy = FairPolicy(1, 2, 0)
+    running = [_ticket("a0", "a", "x"), _ticket("b0", "b", "y")]
+    waiting = [_ticket("a1", "a", "x"), _ticket("c1", "c", "x"), _ticket("d1", "d", "x")]
+    assert _drain(policy, waiting, running) == ["c1"]
+
+def test_background_cap():
+    waiting = [_ticket("q1", "a", background=True), _ticket("q2", "b", background=True), _ticket("i1", "c")]
+    assert _drain(FairPolicy(0, 0, 1), waiting) == ["i1", "q1"]
+
+def test_held_jobs_never_start():
+    held = _ticket("held", "a", held=True)
+    assert FairPolicy(0, 0, 0).pick([held], []) is None
+    assert _drain(FairPolicy(0, 0, 0), [held, _ticket("b1", "b")]) == ["b1"]
@@ -0,0 +1,233 @@
+"""Admission control module for reserving temp disk space per job."""
+
+import asyncio
+import os
+import shutil
+import time
+from pathlib import Path
+
+from config import TEMP_DIR, DISK_SAFETY_MARGIN
+from utils.identification import Identification
+from utils.logger import get_logger
+
+# Configure logging
+logger = get_logger("admission")
+
+# Share of the largest file reserved for extraction outputs until the identification is known
+EXTRACTION_RATIOS = {
+    "audio": 0.5,
+    "all": 0.5,
+}
+DEFAULT_EXTRACTION_RATIO = 0.05
+
+# Extracted tracks, their zip and the split zip parts can all be on disk at the same time
+EXTRACTION_COPIES = 3
+
+def format_bytes(size: int) -> str:
+    """Formats a byte count for user messages."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024 or unit == "GB":
+            return f"{size:.1f}{unit}" if unit != "B" else f"{size}B"
+        size /= 1024
+    return f"{size}B"
+
+def estimate_extraction_bytes(largest_file_bytes: int, extraction_type: str) -> int:
+    """Estimates the extraction space of a job before its files are identified."""
+    ratio = EXTRACTION_RATIOS.get(extraction_type, DEFAULT_EXTRACTION_RATIO)
+    return int(largest_file_bytes * ratio) * EXTRACTION_COPIES
+
+def estimate_extraction_bytes_from_info(info: Identification, extraction_type: str, track_filter=None) -> int | None:
+    """
+    Estimates the extraction space of one file from its identification output.
+
+    Returns:
+        int | None: The estimate, or None if a selected track has no size statistics.
+    """
+    total = 0
+    track_types = []
+    if extraction_type in ("subtitles", "all", "all_without_audio"):
+        track_types.append("subtitles")
+    if extraction_type in ("audio", "all"):
+        track_types.append("audio")
+
+    for track_type in track_types:
+        selected = track_filter.select(info.tracks, track_type) if track_filter else [
+            t for t in info.tracks if t.type == track_type
+        ]
+        for track in selected:
+            # Statistics tags written by mkvmerge
+            if track.size is None:
+                if track_type == "audio":
+                    return None
+                continue
+            total += track.size
+
+    if extraction_type in ("attachments", "all", "all_without_audio"):
+        total += sum(a.size for a in info.attachments or [])
+
+    return total * EXTRACTION_COPIES
+
+class Reservation(dict):
+    """Type definition for the disk space reserved by a job."""
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.download = data.get("download", 0)
+        self.extraction = data.get("extraction", 0)
+        self.downloaded = data.get("downloaded", 0)
+
+    download: int
+    """Bytes the download will occupy once complete."""
+    extraction: int
+    """Peak bytes of the extraction outputs."""
+    downloaded: int
+    """Bytes of the download already on disk (already counted in the free space)."""
+
+    @property
+    def pending(self) -> int:
+        """Bytes reserved but not yet written."""
+        return max(0, self.download - self.downloaded) + self.extraction
+
+class AdmissionController:
+    """
+    Reserves temp disk space for jobs before their download starts.
+
+    A job is admitted when its expected download and extraction bytes fit in the free space
+    of the temp directory, minus the safety margin and the space still pending for the other
+    jobs. Jobs that could fit once others finish wait, jobs that can never fit are rejected.
+    """
+    def __init__(self, path: Path, safety_margin: int):
+        self.path = path
+        self.safety_margin = safety_margin
+        self.reservations: dict[str, Reservation] = {}
+        self.reclaimers: list = []
+        self._released = asyncio.Event()
+
+    def _get_volume_path(self) -> Path:
+        path = self.path
+        while not path.exists() and path != path.parent:
+            path = path.parent
+        return path
+
+    def free_bytes(self) -> int:
+        """Returns the free space of the volume holding the temp directory."""
+        return shutil.disk_usage(self._get_volume_path()).free
+
+    def add_reclaimer(self, reclaimer):
+        """
+        Registers space that can be freed on demand (e.g. the retention store), with a
+        `reclaimable_bytes(device)` method and an async `reclaim(nbytes, device)` method.
+        """
+        if reclaimer not in self.reclaimers:
+            self.reclaimers.append(reclaimer)
+
+    def reclaimable_bytes(self) -> int:
+        """Returns the bytes the reclaimers can free on the volume holding the temp directory."""
+        if not self.reclaimers:
+            return 0
+        device = os.stat(self._get_volume_path()).st_dev
+        return sum(reclaimer.reclaimable_bytes(device) for reclaimer in self.reclaimers)
+
+    async def reclaim(self, nbytes: int) -> int:
+        """Frees up to `nbytes` through the reclaimers, returns the bytes freed."""
+        device = os.stat(self._get_volume_path()).st_dev
+        freed = 0
+        for reclaimer in self.reclaimers:
+            if freed >= nbytes:
+                break
+            freed += await reclaimer.reclaim(nbytes - freed, device)
+        return freed
+
+    def pending_bytes(self, exclude_job_id: str | None = None) -> int:
+        """Returns the bytes reserved but not yet written by the other jobs."""
+        return sum(r.pending for job_id, r in self.reservations.items() if job_id != exclude_job_id)
+
+    def available_bytes(self, job_id: str | None = None) -> int:
+        """Returns the bytes a job can reserve right now."""
+        return self.free_bytes() - self.safety_margin - self.pending_bytes(exclude_job_id=job_id)
+
+    def fits_now(self, job_id: str, download: int, extraction: int, downloaded: int = 0) -> bool:
+        """Checks if a reservation would be admitted without waiting, freeing reclaimable space if needed."""
+        return max(0, download - downloaded) + extraction <= self.available_bytes(job_id) + self.reclaimable_bytes()
+
+    async def reserve(self, job_id: str, download: int, extraction: int, timeout: float, downloaded: int = 0) -> tuple[bool, str]:
+        """
+        Reserves disk space for a job, waiting up to `timeout` seconds for other jobs to release theirs.
+
+        Args:
+            job_id (str): The job reserving the space, a new reservation replaces the previous one.
+            download (int): Bytes of the complete download.
+            extraction (int): Peak bytes of the extraction outputs.
+            timeout (float): Seconds to wait for space released by other jobs.
+            downloaded (int): Bytes of a resumed download already on disk.
+
+        Returns:
+            tuple[bool, str]: Whether the job was admitted, and the reason if it was not.
+        """
+        needed = download + extraction
+        deadline = time.monotonic() + timeout
+        while True:
+            # Even with every other job finished and the reclaimable space freed, the job would not fit
+            capacity = self.free_bytes() - self.safety_margin + self.reclaimable_bytes()
+            if needed - downloaded > capacity:
+                reason = (
+                    f"Not enough disk space: the job needs {format_bytes(needed)} "
+                    f"but only {format_bytes(max(capacity, 0))} can be used."
+                )
+                logger.warning("Job %s rejected: %s", job_id, reason)
+                return False, reason
+
+            shortfall = max(0, download - downloaded) + extraction - self.available_bytes(job_id)
+            if shortfall > 0 and self.fits_now(job_id, download, extraction, downloaded):
+                freed = await self.reclaim(shortfall)
+                logger.info("Job %s freed %s of reclaimable space.", job_id, format_bytes(freed))
+                shortfall = max(0, download - downloaded) + extraction - self.available_bytes(job_id)
+
+            if shortfall <= 0:
+                self.reservations[job_id] = Reservation(
+                    download=download, extraction=extraction, downloaded=downloaded
+                )
+                logger.info(
+                    "Job %s admitted: %s download + %s extraction reserved.",
+                    job_id, format_bytes(download), format_bytes(extraction)
+                )
+                return True, ""
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                reason = (
+                    f"Timed out waiting for disk space: the job needs {format_bytes(needed)}, "
+                    f"{format_bytes(max(self.available_bytes(job_id), 0))} are available."
+                )
+                logger.warning("Job %s rejected: %s", job_id, reason)
+                return False, reason
+
+            self._released.clear()
+            try:
+                await asyncio.wait_for(self._released.wait(), timeout=min(remaining, 30))
+            except asyncio.TimeoutError:
+                pass
+
+    def update(self, job_id: str, **changes):
+        """Updates a reservation (download progress or refined extraction estimate)."""
+        reservation = self.reservations.get(job_id)
+        if reservation is None:
+            return
+        updated = Reservation(**{**reservation, **changes})
+        self.reservations[job_id] = updated
+        if updated.pending < reservation.pending:
+            self._released.set()
+
+    def release(self, job_id: str, stage: str | None = None):
+        """Releases the extraction part of a reservation, or all of it when no stage is given."""
+        reservation = self.reservations.get(job_id)
+        if reservation is None:
+            return
+        if stage == "extraction":
+            self.reservations[job_id] = Reservation(**{**reservation, "extraction": 0})
+        else:
+            del self.reservations[job_id]
+        logger.info("Job %s released its %s reservation.", job_id, stage or "whole")
+        self._released.set()
+
+# Shared admission controller for the temp directory
+admission_controller = AdmissionController(Path(os.path.abspath(TEMP_DIR)), DISK_SAFETY_MARGIN)
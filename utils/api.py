@@ -0,0 +1,422 @@
+"""REST job API module, submitting and following download and extraction jobs over HTTP."""
+
+import asyncio
+import hmac
+import json
+import os
+import shutil
+import time
+import uuid
+from itertools import count
+from pathlib import Path
+from types import SimpleNamespace
+
+from aiohttp import web
+
+from config import API_RESULT_TTL, API_RESULTS_DIR, API_TOKEN, WORKER_MODE
+from utils import file_utils
+from utils.broker import LOOPBACK_HOSTS, job_broker
+from utils.extraction import EXTRACTION_TYPES
+from utils.logger import get_logger
+from utils.scheduler import PRIORITY_NORMAL, job_scheduler
+from utils.track_filter import parse_track_filter
+from utils.utils import download_and_extract
+
+# Configure logging
+logger = get_logger("api")
+
+# Extraction types accepted by the API, the ones of /extract
+JOB_TYPES = (*EXTRACTION_TYPES, "inspect")
+
+# Events kept per job for the progress streams, the oldest ones are dropped
+MAX_EVENTS = 1000
+
+# Seconds between the keep-alive comments of a progress stream
+KEEPALIVE_INTERVAL = 15
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+class ApiJob(dict):
+    """Type definition for a job submitted through the API."""
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.job_id = data.get("job_id", "")
+        self.user = data.get("user", "api")
+        self.url = data.get("url", "")
+        self.extraction_type = data.get("extraction_type", "all_without_audio")
+        self.filters = data.get("filters", "")
+        self.full_mediainfo = data.get("full_mediainfo", False)
+        self.status = data.get("status", "queued")
+        self.progress = data.get("progress", "")
+        self.results = data.get("results", [])
+        self.created_at = data.get("created_at", 0.0)
+        self.finished_at = data.get("finished_at")
+
+    job_id: str
+    user: str
+    """Name the client submitted the job under, the per-user scheduling caps apply to it."""
+    url: str
+    extraction_type: str
+    filters: str
+    full_mediainfo: bool
+    status: str
+    """queued, running, completed, failed or cancelled."""
+    progress: str
+    """Content of the last message of the job."""
+    results: list[dict]
+    """Result files, as {"name": file name, "size": bytes}."""
+    created_at: float
+    finished_at: float | None
+
+class ApiMessage:
+    """Message of an API job, its edits are recorded as events."""
+    def __init__(self, ctx: "ApiContext", ref: str):
+        self.id = ref
+        self.ctx = ctx
+
+    async def edit(self, content: str | None = None, files: list | None = None, **_kwargs) -> "ApiMessage":
+        """Edits the message, saving its attachments as results."""
+        await self.ctx.record("edit", self.id, content, files)
+        return self
+
+class ApiContext:
+    """
+    SlashContext stand-in for the jobs submitted through the API.
+
+    Every message `download_and_extract` sends or edits becomes an event of the job's progress
+    stream, and its attachments are saved as the results of the job.
+    """
+    def __init__(self, api: "JobApi", job: ApiJob):
+        self.api = api
+        self.job_id = job.job_id
+        self.guild_id = "api"
+        self.channel_id = ""
+        self.author = SimpleNamespace(id=job.user, mention=f"@{job.user}")
+        self._refs = count(1)
+
+    async def record(self, op: str, ref: str, content: str | None, files: list | None):
+        names = await self.api.save_results(self.job_id, files or [])
+        self.api.add_event(self.job_id, {"type": "message", "op": op, "ref": ref, "content": content, "files": names})
+
+    async def send(self, content: str | None = None, files: list | None = None, **_kwargs) -> ApiMessage:
+        """Sends a message to the job's progress stream."""
+        message = ApiMessage(self, f"m{next(self._refs)}")
+        await self.record("send", message.id, content, files)
+        return message
+
+    async def defer(self, **_kwargs):
+        """API requests are answered when the job is submitted."""
+
+def _copy_results(files: list, results_dir: Path, taken: set[str]) -> list[dict]:
+    """Copies interactions.File attachments (or paths) to the results directory, renaming the duplicates."""
+    results_dir.mkdir(parents=True, exist_ok=True)
+    results = []
+    for file in files:
+        path = getattr(file, "file", file)
+        name = file_utils.get_unique_name(os.path.basename(getattr(file, "file_name", None) or path), taken)
+        shutil.copyfile(path, results_dir / name)
+        results.append({"name": name, "size": (results_dir / name).stat().st_size})
+    return results
+
+class JobApi:
+    """
+    Local HTTP front end of the job engine, alongside the Discord one.
+
+    Jobs run through `download_and_extract` like the /extract ones, in the local scheduler or on
+    the workers of the broker. Their messages are kept as events streamed to the clients, and
+    their attachments as result files. Jobs live in memory, finished ones expire after `result_ttl`.
+    """
+    def __init__(self, token: str, results_dir: str, result_ttl: int):
+        self.token = token
+        self.results_dir = Path(results_dir)
+        self.result_ttl = result_ttl
+        self.jobs: dict[str, ApiJob] = {}
+        self._events: dict[str, list[dict]] = {}
+        self._seqs: dict[str, int] = {}
+        self._notifiers: dict[str, asyncio.Event] = {}
+        self._cancel_events: dict[str, asyncio.Event] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._reaper: asyncio.Task | None = None
+        self._runner: web.AppRunner | None = None
+
+    #region Jobs
+    def _update(self, job_id: str, **changes) -> ApiJob:
+        job = self.jobs[job_id] = ApiJob(**{**self.jobs[job_id], **changes})
+        if "status" in changes:
+            self.add_event(job_id, {"type": "status", "status": job.status})
+        return job
+
+    def submit(self, url: str, extraction_type: str, filters: str = "", full_mediainfo: bool = False, user: str = "api") -> ApiJob:
+        """Starts a job, `filters` must have been validated."""
+        job = ApiJob(
+            job_id=uuid.uuid4().hex[:12], user=user, url=url, extraction_type=extraction_type,
+            filters=filters, full_mediainfo=full_mediainfo, status="queued", progress="", results=[],
+            created_at=time.time(), finished_at=None
+        )
+        self.jobs[job.job_id] = job
+        self._events[job.job_id] = []
+        self._seqs[job.job_id] = 0
+        self._notifiers[job.job_id] = asyncio.Event()
+        self._cancel_events[job.job_id] = asyncio.Event()
+        self._tasks[job.job_id] = asyncio.create_task(self._run(job))
+        logger.info("API job %s submitted by %s: %s", job.job_id, user, url)
+        return job
+
+    async def _run(self, job: ApiJob):
+        ctx = ApiContext(self, job)
+        cancel_event = self._cancel_events[job.job_id]
+        state = dict(
+            job_id=job.job_id, kind="api", user_id=job.user, guild_id="api", channel_id="", url=job.url,
+            extraction_type=job.extraction_type, filters=job.filters, full_mediainfo=job.full_mediainfo,
+            priority=PRIORITY_NORMAL
+        )
+        # Local jobs are checkpointed like the /extract ones, broker jobs by the worker that claims them
+        engine_job = file_utils.JobStateObject(**state) if WORKER_MODE == "broker" else file_utils.create_job(**state)
+        self._update(job.job_id, status="running")
+        completed = False
+        try:
+            completed = await download_and_extract(
+                ctx, job.url, extraction_type=job.extraction_type, track_filter=parse_track_filter(job.filters),
+                full_mediainfo=job.full_mediainfo, job=engine_job, event=cancel_event
+            )
+        except Exception as e:
+            logger.error("API job %s failed: %s", job.job_id, e)
+            self.add_event(job.job_id, {"type": "message", "op": "send", "ref": "error", "content": f"Job failed: {e}", "files": []})
+        finally:
+            status = "cancelled" if cancel_event.is_set() else "completed" if completed else "failed"
+            self._update(job.job_id, status=status, finished_at=time.time())
+            self._tasks.pop(job.job_id, None)
+            logger.info("API job %s %s.", job.job_id, status)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels an unfinished job, returns False if it is finished."""
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return False
+        self._cancel_events[job_id].set()
+        if WORKER_MODE == "broker":
+            job_broker.cancel_jobs(job_id=job_id)
+        else:
+            job_scheduler.cancel(job_id=job_id)
+        logger.info("API job %s cancelled.", job_id)
+        return True
+
+    def remove(self, job_id: str):
+        """Forgets a finished job and deletes its results."""
+        self.jobs.pop(job_id, None)
+        self._events.pop(job_id, None)
+        self._seqs.pop(job_id, None)
+        self._notifiers.pop(job_id, None)
+        self._cancel_events.pop(job_id, None)
+        shutil.rmtree(self.results_dir / job_id, ignore_errors=True)
+
+    def expire(self):
+        """Removes the jobs finished for longer than the result TTL."""
+        deadline = time.time() - self.result_ttl
+        for job in list(self.jobs.values()):
+            if job.finished_at is not None and job.finished_at < deadline:
+                self.remove(job.job_id)
+                logger.info("API job %s expired.", job.job_id)
+    #endregion
+
+    #region Events
+    def add_event(self, job_id: str, data: dict) -> int:
+        """Records an event of a job and wakes up its progress streams, returns its sequence number."""
+        if job_id not in self._events:
+            return 0
+        seq = self._seqs[job_id] = self._seqs[job_id] + 1
+        events = self._events[job_id]
+        events.append({"seq": seq, **data})
+        del events[:-MAX_EVENTS]
+        if data.get("type") == "message" and data.get("content"):
+            self.jobs[job_id] = ApiJob(**{**self.jobs[job_id], "progress": data["content"]})
+        # Streams waiting for this job wake up, later waits use a new event
+        self._notifiers[job_id].set()
+        self._notifiers[job_id] = asyncio.Event()
+        return seq
+
+    def get_events(self, job_id: str, after: int) -> list[dict]:
+        """Returns the kept events of a job following a sequence number."""
+        return [event for event in self._events.get(job_id, []) if event["seq"] > after]
+
+    async def save_results(self, job_id: str, files: list) -> list[str]:
+        """Copies the attachments of a message to the results of a job, returns their names."""
+        job = self.jobs.get(job_id)
+        if job is None or not files:
+            return []
+        taken = {result["name"] for result in job.results}
+        try:
+            results = await asyncio.to_thread(_copy_results, files, self.results_dir / job_id, taken)
+        except OSError as e:
+            logger.error("Failed to save the results of API job %s: %s", job_id, e)
+            return []
+        if job_id in self.jobs:
+            self.jobs[job_id] = ApiJob(**{**self.jobs[job_id], "results": [*self.jobs[job_id].results, *results]})
+        return [result["name"] for result in results]
+    #endregion
+
+    #region HTTP API
+    @web.middleware
+    async def _auth(self, request: web.Request, handler):
+        expected = f"Bearer {self.token}"
+        if self.token and not hmac.compare_digest(request.headers.get("Authorization", ""), expected):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        return await handler(request)
+
+    async def _read_json(self, request: web.Request) -> dict:
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            raise web.HTTPBadRequest(text=json.dumps({"error": "invalid JSON body"}), content_type="application/json")
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(text=json.dumps({"error": "the body must be a JSON object"}), content_type="application/json")
+        return body
+
+    def _get_job(self, request: web.Request) -> ApiJob:
+        job = self.jobs.get(request.match_info["job_id"])
+        if job is None:
+            raise web.HTTPNotFound(text=json.dumps({"error": "unknown job"}), content_type="application/json")
+        return job
+
+    async def _handle_submit(self, request: web.Request) -> web.Response:
+        body = await self._read_json(request)
+        urls = body.get("urls") or ([body["url"]] if body.get("url") else [])
+        extraction_type = body.get("type", "all_without_audio")
+        filters = body.get("filters", "") or ""
+        if not urls or not all(isinstance(url, str) and url.strip() for url in urls):
+            return web.json_response({"error": "url or urls is required"}, status=400)
+        if extraction_type not in JOB_TYPES:
+            return web.json_response({"error": f"type must be one of {', '.join(JOB_TYPES)}"}, status=400)
+        try:
+            parse_track_filter(filters)
+        except ValueError as e:
+            return web.json_response({"error": f"invalid filters: {e}"}, status=400)
+
+        jobs = [
+            self.submit(url.strip(), extraction_type, filters, bool(body.get("full_mediainfo")), str(body.get("user") or "api"))
+            for url in urls
+        ]
+        return web.json_response({"jobs": jobs}, status=201)
+
+    async def _handle_list(self, request: web.Request) -> web.Response:
+        status, user = request.query.get("status"), request.query.get("user")
+        jobs = [
+            job for job in self.jobs.values()
+            if (not status or job.status == status) and (not user or job.user == user)
+        ]
+        return web.json_response({"jobs": jobs})
+
+    async def _handle_get(self, request: web.Request) -> web.Response:
+        return web.json_response(self._get_job(request))
+
+    async def _handle_delete(self, request: web.Request) -> web.Response:
+        job = self._get_job(request)
+        if self.cancel(job.job_id):
+            return web.json_response({"cancelled": True}, status=202)
+        self.remove(job.job_id)
+        return web.json_response({"removed": True})
+
+    async def _handle_events(self, request: web.Request) -> web.StreamResponse:
+        """Streams the events of a job as Server-Sent Events, until the job is finished."""
+        job = self._get_job(request)
+        try:
+            after = int(request.headers.get("Last-Event-ID") or request.query.get("after", 0))
+        except ValueError:
+            return web.json_response({"error": "after must be an event ID"}, status=400)
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        while True:
+            notifier = self._notifiers.get(job.job_id)
+            for event in self.get_events(job.job_id, after):
+                data = json.dumps(event, ensure_ascii=False)
+                await response.write(f"id: {event['seq']}\nevent: {event['type']}\ndata: {data}\n\n".encode("utf-8"))
+                after = event["seq"]
+
+            # The final status event is written before the stream ends
+            job = self.jobs.get(job.job_id)
+            if job is None or notifier is None or job.status in FINISHED_STATUSES:
+                break
+            try:
+                await asyncio.wait_for(notifier.wait(), timeout=KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                await response.write(b": keep-alive\n\n")
+        await response.write_eof()
+        return response
+
+    async def _handle_results(self, request: web.Request) -> web.Response:
+        job = self._get_job(request)
+        return web.json_response({"job_id": job.job_id, "status": job.status, "results": job.results})
+
+    async def _handle_result(self, request: web.Request) -> web.StreamResponse:
+        job = self._get_job(request)
+        name = request.match_info["name"]
+        if name not in {result["name"] for result in job.results}:
+            return web.json_response({"error": "unknown result"}, status=404)
+        return web.FileResponse(
+            self.results_dir / job.job_id / name, headers={"Content-Disposition": f'attachment; filename="{name}"'}
+        )
+
+    async def _handle_add_to_queue(self, request: web.Request) -> web.Response:
+        body = await self._read_json(request)
+        links = body.get("links") or []
+        if isinstance(links, str):
+            links = [link.strip() for link in links.split(",") if link.strip()]
+        extraction_type = body.get("type", "all_without_audio")
+        filters = body.get("filters", "") or ""
+        if not body.get("user") or not links:
+            return web.json_response({"error": "user and links are required"}, status=400)
+        if extraction_type not in EXTRACTION_TYPES:
+            return web.json_response({"error": f"type must be one of {', '.join(EXTRACTION_TYPES)}"}, status=400)
+        try:
+            parse_track_filter(filters)
+        except ValueError as e:
+            return web.json_response({"error": f"invalid filters: {e}"}, status=400)
+        added = file_utils.save_queue(str(body["user"]), links, extraction_type=extraction_type, filters=filters)
+        return web.json_response({"added": added})
+
+    async def _handle_get_queue(self, request: web.Request) -> web.Response:
+        queue = file_utils.get_user_queue(request.match_info["user"])
+        return web.json_response({"user": request.match_info["user"], "links": queue.links if queue else []})
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(min(max(self.result_ttl / 4, 1), 300))
+            self.expire()
+
+    async def start(self, host: str, port: int) -> web.AppRunner | None:
+        """Starts the HTTP API, refused without a token unless it only listens on the loopback interface."""
+        if not self.token and host not in LOOPBACK_HOSTS:
+            logger.error("Not starting the job API on %s: API_TOKEN is required outside of localhost.", host)
+            return None
+        # Results of the previous runs can't be listed anymore
+        shutil.rmtree(self.results_dir, ignore_errors=True)
+        app = web.Application(middlewares=[self._auth])
+        app.router.add_post("/jobs", self._handle_submit)
+        app.router.add_get("/jobs", self._handle_list)
+        app.router.add_get("/jobs/{job_id}", self._handle_get)
+        app.router.add_delete("/jobs/{job_id}", self._handle_delete)
+        app.router.add_get("/jobs/{job_id}/events", self._handle_events)
+        app.router.add_get("/jobs/{job_id}/results", self._handle_results)
+        app.router.add_get("/jobs/{job_id}/results/{name}", self._handle_result)
+        app.router.add_post("/queue", self._handle_add_to_queue)
+        app.router.add_get("/queue/{user}", self._handle_get_queue)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self._reaper = asyncio.create_task(self._reap())
+        logger.info("Job API listening on http://%s:%d", host, port)
+        return self._runner
+
+    async def stop(self):
+        """Stops the HTTP API and cancels the unfinished jobs."""
+        for job_id in list(self._tasks):
+            self.cancel(job_id)
+        if self._reaper is not None:
+            self._reaper.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+    #endregion
+
+# Shared job API of the bot, started when API_PORT is set
+job_api = JobApi(API_TOKEN, API_RESULTS_DIR, API_RESULT_TTL)
@@ -1,80 +1,355 @@
 """Aria2 service module for managing downloads via Aria2 RPC."""
 import json
+import shutil
 import time
 import os
+from contextlib import contextmanager
 from pathlib import Path
+from urllib.parse import urlparse
 
-import requests
-import aria2p
 from config import ARIA2_RPC_HOST, ARIA2_RPC_PORT, ARIA2_RPC_SECRET, DOWNLOAD_DIR
+from config import ARIA2_BACKENDS, ARIA2_HEALTH_INTERVAL, DISK_SAFETY_MARGIN, DOWNLOAD_PROFILES
 from utils.logger import get_logger
 
 # Configure logging
 logger = get_logger("aria2_service")
 
-client = aria2p.Client(host=ARIA2_RPC_HOST,
-                  port=int(ARIA2_RPC_PORT),
-                  secret=ARIA2_RPC_SECRET)
-api = aria2p.API(client)
+# Aria2 options of the downloads by link type, DOWNLOAD_PROFILES overrides them and adds DDL host profiles
+BUILTIN_PROFILES = {
+    # Stop as soon as the files are downloaded (no seeding), with more peers for the rare torrents
+    "magnet": {"seed-time": "0", "bt-max-peers": "100", "bt-tracker-connect-timeout": "30"},
+    "torrent": {"seed-time": "0", "bt-max-peers": "100", "bt-tracker-connect-timeout": "30"},
+    # Parallel connections for the hosts that throttle each connection
+    "ddl": {"split": "8", "max-connection-per-server": "8", "min-split-size": "8M", "max-tries": "5", "retry-wait": "10"},
+}
 
-def check_connection() -> bool:
-    """Checks the connection to the Aria2 RPC server."""
-    try:
-        jsonreq = json.dumps(
-            {
-                "jsonrpc":"2.0",
-                "id":"azert",
-                "method":"aria2.getVersion",
-                "params": [f"token:{ARIA2_RPC_SECRET}"]
-            }
-        )
-        c = requests.post(f"{ARIA2_RPC_HOST}:{ARIA2_RPC_PORT}/jsonrpc", data=jsonreq, timeout=20)
-        if c.status_code != 200:
-            logger.error("Failed to connect to Aria2 RPC server: HTTP %d", c.status_code)
+class Aria2BackendError(Exception):
+    """Raised when an Aria2 backend stops responding, or none is available."""
+
+class Aria2Backend:
+    """An Aria2 RPC endpoint and the download directory (volume) it writes to."""
+    def __init__(self, name: str, url: str, secret: str, download_dir: str):
+        parsed = urlparse(url)
+        self.name = name
+        self.url = f"{parsed.scheme}://{parsed.hostname}:{parsed.port or 6800}"
+        self.secret = secret
+        self.download_dir = download_dir
+        self.healthy = True
+        self.checked_at = 0.0
+        self._api = None
+
+    @property
+    def api(self):
+        """The aria2p API of the backend, created on first use."""
+        if self._api is None:
+            # aria2p and requests take a noticeable share of the startup, import them on the first RPC call
+            import aria2p
+
+            parsed = urlparse(self.url)
+            client = aria2p.Client(host=f"{parsed.scheme}://{parsed.hostname}", port=parsed.port, secret=self.secret, timeout=20)
+            self._api = aria2p.API(client)
+        return self._api
+
+    def mark_down(self, error: Exception):
+        """Excludes the backend from placement until its next health check."""
+        if self.healthy:
+            logger.warning("Aria2 backend %s (%s) stopped responding: %s", self.name, self.url, error)
+        self.healthy = False
+        self.checked_at = time.monotonic()
+
+    @property
+    def available(self) -> bool:
+        """Healthy, or due for a new health check."""
+        return self.healthy or time.monotonic() - self.checked_at >= ARIA2_HEALTH_INTERVAL
+
+    @contextmanager
+    def call(self):
+        """Yields the API of the backend, turning connection errors into Aria2BackendError."""
+        import requests
+
+        try:
+            yield self.api
+        except requests.exceptions.RequestException as e:
+            self.mark_down(e)
+            raise Aria2BackendError(f"Aria2 backend {self.name} is not responding: {e}") from e
+        if not self.healthy:
+            logger.info("Aria2 backend %s (%s) is responding again.", self.name, self.url)
+            self.healthy = True
+
+    def check(self) -> bool:
+        """Checks the connection to the backend (health check)."""
+        import requests
+
+        try:
+            jsonreq = json.dumps(
+                {
+                    "jsonrpc":"2.0",
+                    "id":"azert",
+                    "method":"aria2.getVersion",
+                    "params": [f"token:{self.secret}"]
+                }
+            )
+            c = requests.post(f"{self.url}/jsonrpc", data=jsonreq, timeout=20)
+            if c.status_code != 200:
+                logger.error("Failed to connect to Aria2 RPC server %s: HTTP %d", self.name, c.status_code)
+                self.mark_down(Exception(f"HTTP {c.status_code}"))
+                return False
+        except Exception as e:
+            logger.error("Failed to connect to Aria2 RPC server %s: %s", self.name, e)
+            self.mark_down(e)
             return False
-        logger.info("Successfully connected to Aria2 RPC server.")
+        self.healthy = True
+        self.checked_at = time.monotonic()
         return True
-    except Exception as e:
-        logger.error("Failed to connect to Aria2 RPC server: %s", e)
-        return False
 
-def add_torrent(torrent_url: str) -> str:
-    """Adds a torrent or magnet link to Aria2 for downloading."""
-    # Make sure download directory exists
-    os.makedirs(Path(DOWNLOAD_DIR), exist_ok=True)
+    def free_bytes(self) -> int | None:
+        """Returns the free space of the download volume, None when it is not mounted here."""
+        path = Path(os.path.abspath(self.download_dir))
+        while not path.exists() and path != path.parent:
+            path = path.parent
+        try:
+            return shutil.disk_usage(path).free
+        except OSError:
+            return None
+
+def _load_backends() -> list[Aria2Backend]:
+    # Without ARIA2_BACKENDS, the single ARIA2_RPC_* backend
+    if not ARIA2_BACKENDS:
+        return [Aria2Backend("default", f"{ARIA2_RPC_HOST}:{ARIA2_RPC_PORT}", ARIA2_RPC_SECRET, DOWNLOAD_DIR)]
+    return [
+        Aria2Backend(
+            backend.get("name", f"backend-{i}"), backend["url"],
+            backend.get("secret", ARIA2_RPC_SECRET), backend.get("dir", DOWNLOAD_DIR)
+        )
+        for i, backend in enumerate(ARIA2_BACKENDS, start=1)
+    ]
 
-    if torrent_url.startswith("magnet:"):
-        download = api.add_magnet(torrent_url, options={"dir": DOWNLOAD_DIR})
+backends = _load_backends()
+
+# Backend holding each download, GIDs missing after a restart are looked up on every backend
+_gid_backends: dict[str, Aria2Backend] = {}
+
+def _backend_for(gid: str) -> Aria2Backend:
+    import aria2p
+
+    backend = _gid_backends.get(gid)
+    if backend is not None:
+        return backend
+    if len(backends) > 1:
+        for candidate in backends:
+            if not candidate.available:
+                continue
+            try:
+                with candidate.call() as api:
+                    api.client.tell_status(gid, ["gid"])
+            except (aria2p.ClientException, Aria2BackendError):
+                continue
+            _gid_backends[gid] = candidate
+            return candidate
+    # Unknown GID, let the first backend raise the error
+    return backends[0]
+
+def select_backend() -> Aria2Backend:
+    """
+    Picks the backend of a new download: the fewest active and waiting downloads, then the lowest
+    download speed (most spare bandwidth), then the most free disk. Backends that stopped responding
+    are skipped until their next health check, and full volumes are skipped.
+    """
+    candidates = []
+    for index, backend in enumerate(backends):
+        if not backend.available:
+            continue
+        try:
+            with backend.call() as api:
+                stats = api.get_stats()
+        except Aria2BackendError:
+            continue
+        free = backend.free_bytes()
+        if free is not None and free < DISK_SAFETY_MARGIN:
+            logger.warning("Aria2 backend %s skipped, its download volume is full.", backend.name)
+            continue
+        candidates.append((stats.num_active + stats.num_waiting, stats.download_speed, -(free or 0), index, backend))
+
+    if not candidates:
+        raise Aria2BackendError("No Aria2 backend is available.")
+    return min(candidates)[-1]
+
+def check_connection() -> bool:
+    """Checks the connection to the Aria2 RPC servers, True if at least one responds."""
+    results = [backend.check() for backend in backends]
+    if any(results):
+        logger.info("Successfully connected to %d/%d Aria2 RPC servers.", sum(results), len(results))
+    return any(results)
+
+def get_download_profile(url: str) -> tuple[str, dict]:
+    """Returns the profile name and the Aria2 options of a link: magnet, torrent, or ddl with its host overrides."""
+    parsed = urlparse(url)
+    if url.startswith("magnet:"):
+        name = "magnet"
+    elif parsed.path.lower().endswith(".torrent"):
+        name = "torrent"
     else:
-        download = api.add_uris(uris=[torrent_url], options={"dir": DOWNLOAD_DIR})
-    return download.gid
+        name = "ddl"
+    options = {**BUILTIN_PROFILES[name], **DOWNLOAD_PROFILES.get(name, {})}
+
+    if name == "ddl" and parsed.hostname:
+        # The most specific host profile wins, e.g. "dl3.example.com" then "example.com"
+        labels = parsed.hostname.split(".")
+        for i in range(len(labels) - 1):
+            host = ".".join(labels[i:])
+            if host in DOWNLOAD_PROFILES:
+                options.update(DOWNLOAD_PROFILES[host])
+                name = host
+                break
+    return name, {key: str(value) for key, value in options.items()}
+
+def add_torrent(torrent_url: str, options: dict | None = None, subdir: str = "") -> str:
+    """
+    Adds a torrent or magnet link to the least loaded Aria2 backend, failing over to the next ones.
+    The files are saved to `subdir` (the job's directory) under the download directory of the backend,
+    with the options of the link's download profile (`options` override them).
+    """
+    profile, profile_options = get_download_profile(torrent_url)
+    for _ in backends:
+        backend = select_backend()
+        # Make sure download directory exists
+        download_dir = os.path.join(backend.download_dir, subdir)
+        os.makedirs(Path(download_dir), exist_ok=True)
+
+        # Pause torrents once their metadata is known, so they are only started after admission
+        download_options = {"dir": download_dir, "pause-metadata": "true", **profile_options, **(options or {})}
+        try:
+            with backend.call() as api:
+                if torrent_url.startswith("magnet:"):
+                    download = api.add_magnet(torrent_url, options=download_options)
+                else:
+                    download = api.add_uris(uris=[torrent_url], options=download_options)
+        except Aria2BackendError:
+            continue
+        _gid_backends[download.gid] = backend
+        logger.info("Download %s added with the %s profile.", download.gid, profile)
+        if len(backends) > 1:
+            logger.info("Download %s placed on Aria2 backend %s.", download.gid, backend.name)
+        return download.gid
+    raise Aria2BackendError("No Aria2 backend accepted the download.")
+
+def get_head_first_options(head_size: int) -> dict:
+    """Returns Aria2 options that download the first `head_size` bytes of every file first."""
+    return {
+        "bt-prioritize-piece": f"head={head_size}",  # Torrents: fetch the head pieces of each file first
+        "stream-piece-selector": "inorder",  # Direct links: download pieces from the start of the file
+        "split": "1",
+        "pause-metadata": "false",
+    }
+
+def get_file_heads(gid: str, head_size: int) -> list[dict]:
+    """Reports, for every file of a download, whether its first `head_size` bytes are downloaded."""
+    with _backend_for(gid).call() as api:
+        download = api.get_download(gid)
+    bitfield = int(download.bitfield, 16) if download.bitfield else 0
+    num_bits = len(download.bitfield) * 4 if download.bitfield else 0
+    piece_length = download.piece_length
+
+    heads = []
+    offset = 0  # Files of a torrent are laid out back to back in the piece space
+    for file in download.files:
+        head_end = offset + min(head_size, file.length)
+        if piece_length and num_bits and file.length:
+            first_piece = offset // piece_length
+            last_piece = (head_end - 1) // piece_length
+            head_complete = all(
+                (bitfield >> (num_bits - 1 - piece)) & 1
+                for piece in range(first_piece, last_piece + 1)
+            )
+        else:
+            head_complete = download.is_complete and file.length > 0
+        heads.append({
+            "path": str(file.path),
+            "length": file.length,
+            "selected": file.selected,
+            "head_complete": head_complete
+        })
+        offset += file.length
+    return heads
 
 def get_status(gid: str):
     """Retrieves the status of a download by its GID."""
-    task = api.get_download(gid)
+    backend = _backend_for(gid)
+    with backend.call() as api:
+        task = api.get_download(gid)
+    # The download following a metadata download is on the same backend
+    for followed_gid in task.followed_by_ids:
+        _gid_backends[followed_gid] = backend
     return {
         "name": task.name,
         "status": task.status,
         "progress": task.progress_string(),
         "dir": task.dir,
         "followed_by_ids": task.followed_by_ids,
-        "speed": task.download_speed_string()
+        "speed": task.download_speed_string(),
+        "total_length": task.total_length,
+        "completed_length": task.completed_length,
+        "seeders": task.num_seeders if task.bittorrent else None,
+        "connections": task.connections,
+        "backend": backend.name
     }
 
+def get_global_stats() -> dict:
+    """Retrieves the global Aria2 statistics (speeds and download counts) summed over the responding backends."""
+    totals = {"download_speed": 0, "upload_speed": 0, "num_active": 0, "num_waiting": 0, "healthy_backends": 0}
+    for backend in backends:
+        if not backend.available:
+            continue
+        try:
+            with backend.call() as api:
+                stats = api.get_stats()
+        except Aria2BackendError:
+            continue
+        totals["download_speed"] += stats.download_speed
+        totals["upload_speed"] += stats.upload_speed
+        totals["num_active"] += stats.num_active
+        totals["num_waiting"] += stats.num_waiting
+        totals["healthy_backends"] += 1
+    return totals
+
+def get_largest_selected_file_size(gid: str) -> int:
+    """Returns the size of the largest file selected for download."""
+    with _backend_for(gid).call() as api:
+        download = api.get_download(gid)
+    return max((f.length for f in download.files if f.selected), default=download.total_length)
+
+def pause_download(gid: str):
+    """Pauses a download by its GID."""
+    with _backend_for(gid).call() as api:
+        download = api.get_download(gid)
+        if download.status == "active":
+            api.pause([download], force=True)
+
+def resume_download(gid: str):
+    """Resumes a paused download by its GID."""
+    with _backend_for(gid).call() as api:
+        download = api.get_download(gid)
+        if download.status == "paused":
+            api.resume([download])
+
 def track_progress(gid: str):
     """Tracks the progress of a download by its GID."""
-    download = api.get_download(gid)
-    while not download.is_complete:
+    backend = _backend_for(gid)
+    with backend.call() as api:
         download = api.get_download(gid)
+    while not download.is_complete:
+        with backend.call() as api:
+            download = api.get_download(gid)
         yield {
             "name": download.name,
             "progress": download.progress_string(),
             "downloaded_size": download.completed_length_string(),
             "full_size": download.total_length_string(),
             "full_size_bytes": download.total_length,
+            "downloaded_bytes": download.completed_length,
             "status": download.status,
             "speed": download.download_speed_string(),
-            "seeders": download.num_seeders if isinstance(download, aria2p.BitTorrent) else "N/A",
+            "seeders": download.num_seeders if download.bittorrent else "N/A",
             "num_files": len(download.files),
             "eta": download.eta_string(),
             "dir": download.dir,
@@ -83,25 +358,46 @@ def track_progress(gid: str):
 
 def wait_for_completion(gid: str):
     """Waits for a download to complete and returns the download directory."""
-    download = api.get_download(gid)
-    while not download.is_complete:
+    backend = _backend_for(gid)
+    with backend.call() as api:
         download = api.get_download(gid)
+        while not download.is_complete:
+            download = api.get_download(gid)
     return download.dir
 
 def remove_download(gid: str, force: bool = False):
     """Removes a download by its GID."""
-    download = api.get_download(gid)
-    if force:
-        download.remove(force=True)
-    else:
-        download.remove()
-
-def remove_all_downloads(force: bool = False):
-    """Removes all downloads."""
-    downloads = api.get_downloads()
-    for download in downloads:
+    with _backend_for(gid).call() as api:
+        download = api.get_download(gid)
         if force:
             download.remove(force=True)
         else:
             download.remove()
+    _gid_backends.pop(gid, None)
+
+def remove_downloads(gids: list[str]):
+    """Force removes the downloads of a job, ignoring the ones Aria2 no longer knows about."""
+    import aria2p
+
+    for gid in gids:
+        try:
+            remove_download(gid, force=True)
+        except (aria2p.ClientException, Aria2BackendError) as e:
+            logger.debug("Download %s not removed: %s", gid, e)
+
+def remove_all_downloads(force: bool = False):
+    """Removes all downloads of every responding backend."""
+    for backend in backends:
+        if not backend.available:
+            continue
+        try:
+            with backend.call() as api:
+                for download in api.get_downloads():
+                    if force:
+                        download.remove(force=True)
+                    else:
+                        download.remove()
+        except Aria2BackendError as e:
+            logger.error("Failed to remove the downloads of Aria2 backend %s: %s", backend.name, e)
+    _gid_backends.clear()
     time.sleep(1)  # Give some time for Aria2 to process removals
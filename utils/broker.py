@@ -0,0 +1,430 @@
+"""Job broker module, queueing jobs for the worker processes and relaying their messages to Discord."""
+
+import asyncio
+import hmac
+import json
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+
+from aiohttp import web
+from interactions import File
+
+from config import BROKER_DB, BROKER_LEASE_TIMEOUT, BROKER_SPOOL_DIR, BROKER_TOKEN
+from config import MAX_JOBS_PER_USER, MAX_JOBS_PER_GUILD
+from utils import file_utils
+from utils.logger import get_logger
+from utils.scheduler import FairPolicy, Ticket
+
+# Configure logging
+logger = get_logger("broker")
+
+# Jobs whose worker stopped responding this many times are failed instead of queued again
+MAX_ATTEMPTS = 3
+
+# Longest time a worker waits for a job in a single claim request (seconds)
+MAX_CLAIM_WAIT = 30
+
+# Hosts the broker may listen on without a token
+LOOPBACK_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+# Size of the reads of uploaded files, written to the spool in a thread
+SPOOL_CHUNK_SIZE = 1 << 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    worker_id TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancelled INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    relayed_seq INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_job ON events (job_id, seq);
+"""
+
+class BrokerJob(dict):
+    """Type definition for a job stored by the broker."""
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.job_id = data.get("job_id", "")
+        self.payload = data.get("payload", {})
+        self.status = data.get("status", "queued")
+        self.worker_id = data.get("worker_id")
+        self.lease_until = data.get("lease_until")
+        self.attempts = data.get("attempts", 0)
+        self.cancelled = bool(data.get("cancelled", 0))
+        self.completed = bool(data.get("completed", 0))
+        self.relayed_seq = data.get("relayed_seq", 0)
+        self.created_at = data.get("created_at", 0.0)
+
+    job_id: str
+    payload: dict
+    """Job parameters (url, extraction_type, filters, full_mediainfo, user_id, guild_id, channel_id, kind, queue, priority)."""
+    status: str
+    """queued, running or done."""
+    worker_id: str | None
+    lease_until: float | None
+    """Time the worker's claim expires unless it sends a heartbeat."""
+    attempts: int
+    cancelled: bool
+    completed: bool
+    relayed_seq: int
+    """Last event relayed to Discord."""
+    created_at: float
+
+    def ticket(self) -> Ticket:
+        """Scheduling information of the job."""
+        return Ticket(
+            job_id=self.job_id, user_id=self.payload.get("user_id", ""), guild_id=self.payload.get("guild_id", ""),
+            url=self.payload.get("url", ""), priority=self.payload.get("priority", 0),
+            background=self.payload.get("kind") in ("queue", "api"), seq=self.created_at, enqueued_at=self.created_at
+        )
+
+class JobBroker:
+    """
+    Durable job queue shared by the bot and the workers.
+
+    The bot submits jobs and relays their events, the workers claim the jobs over HTTP and post
+    every message they would have sent (with its attachments) as an event. Jobs and events are
+    stored in SQLite, so a bot restart re-attaches to the running jobs, and a claim is a lease
+    renewed by heartbeats, so the job of a dead worker is queued again for another worker.
+    """
+    def __init__(self, db_path: str, spool_dir: str, token: str, lease_timeout: int):
+        self.db_path = db_path
+        self.spool_dir = Path(spool_dir)
+        self.token = token
+        self.lease_timeout = lease_timeout
+        self._db: sqlite3.Connection | None = None
+        self._submitted = asyncio.Event()
+        self._notifiers: dict[str, asyncio.Event] = {}
+        self._cancel_events: dict[str, asyncio.Event] = {}
+        # Workers claim the queued jobs in the order and within the caps of the local scheduler
+        self.policy = FairPolicy(MAX_JOBS_PER_USER, MAX_JOBS_PER_GUILD, 0)
+        self._reaper: asyncio.Task | None = None
+        self._runner: web.AppRunner | None = None
+        self._stopping = False
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(Path(self.db_path).parent, exist_ok=True)
+            # Also read by the metrics gauges, from the executor threads
+            self._db = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    #region Jobs
+    def get_job(self, job_id: str) -> BrokerJob | None:
+        """Retrieves a job."""
+        row = self.db.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return BrokerJob(**{**dict(row), "payload": json.loads(row["payload"])})
+
+    def list_jobs(self, status: str | None = None) -> list[BrokerJob]:
+        """Lists the jobs, oldest first, optionally only the ones with a status."""
+        query, params = "SELECT job_id FROM jobs ORDER BY created_at", ()
+        if status:
+            query, params = "SELECT job_id FROM jobs WHERE status = ? ORDER BY created_at", (status,)
+        return [job for (job_id,) in self.db.execute(query, params).fetchall() if (job := self.get_job(job_id))]
+
+    def submit(self, payload: dict, job_id: str | None = None) -> str:
+        """Queues a job for the workers, returns its ID (a new one unless `job_id` is given)."""
+        job_id = job_id or uuid.uuid4().hex[:12]
+        self.db.execute(
+            "INSERT INTO jobs (job_id, payload, status, created_at) VALUES (?, ?, 'queued', ?)",
+            (job_id, json.dumps(payload), time.time())
+        )
+        self._wake_claims()
+        logger.info("Job %s queued for the workers: %s", job_id, payload.get("url"))
+        return job_id
+
+    def claim(self, worker_id: str) -> BrokerJob | None:
+        """Leases the next queued job to a worker, in the fair scheduling order."""
+        running = [job.ticket() for job in self.list_jobs("running")]
+        ticket = self.policy.pick([job.ticket() for job in self.list_jobs("queued")], running)
+        if ticket is None:
+            return None
+        self.db.execute(
+            "UPDATE jobs SET status = 'running', worker_id = ?, lease_until = ?, attempts = attempts + 1 WHERE job_id = ?",
+            (worker_id, time.time() + self.lease_timeout, ticket.job_id)
+        )
+        job = self.get_job(ticket.job_id)
+        logger.info("Job %s claimed by worker %s (attempt %d)", job.job_id, worker_id, job.attempts)
+        return job
+
+    def heartbeat(self, job_id: str, worker_id: str) -> BrokerJob | None:
+        """Renews the lease of a worker, returns None if the job is no longer leased to it."""
+        cursor = self.db.execute(
+            "UPDATE jobs SET lease_until = ? WHERE job_id = ? AND worker_id = ? AND status = 'running'",
+            (time.time() + self.lease_timeout, job_id, worker_id)
+        )
+        return self.get_job(job_id) if cursor.rowcount else None
+
+    def finish(self, job_id: str, worker_id: str | None, completed: bool) -> bool:
+        """Marks a job as done, returns False if it is not leased to the worker."""
+        query = "UPDATE jobs SET status = 'done', lease_until = NULL, completed = ? WHERE job_id = ? AND status != 'done'"
+        params: tuple = (int(completed), job_id)
+        if worker_id is not None:
+            query += " AND worker_id = ?"
+            params += (worker_id,)
+        if not self.db.execute(query, params).rowcount:
+            return False
+        self._notify(job_id)
+        # A job held back by the per-user or per-guild caps may be claimed now
+        self._wake_claims()
+        logger.info("Job %s %s.", job_id, "completed" if completed else "failed")
+        return True
+
+    def cancel_jobs(self, user_id: str | None = None, job_id: str | None = None) -> int:
+        """Cancels the unfinished jobs (of a user, or a single one), returns how many were cancelled."""
+        cancelled = 0
+        for job in self.list_jobs():
+            if job.status == "done" or (user_id and job.payload.get("user_id") != user_id) or (job_id and job.job_id != job_id):
+                continue
+            # Stops the /start_queue run the job belongs to
+            if job.job_id in self._cancel_events:
+                self._cancel_events[job.job_id].set()
+            if job.status == "queued":
+                self.add_event(job.job_id, {"op": "send", "ref": "cancelled", "content": "Job has been cancelled before it started."})
+                self.finish(job.job_id, None, False)
+            else:
+                # Running workers stop at their next heartbeat
+                self.db.execute("UPDATE jobs SET cancelled = 1 WHERE job_id = ?", (job.job_id,))
+            cancelled += 1
+        return cancelled
+
+    def requeue_expired(self):
+        """Queues again the jobs of the workers that stopped sending heartbeats."""
+        expired = self.db.execute(
+            "SELECT job_id FROM jobs WHERE status = 'running' AND lease_until < ?", (time.time(),)
+        ).fetchall()
+        for (job_id,) in expired:
+            job = self.get_job(job_id)
+            if job.attempts >= MAX_ATTEMPTS or job.cancelled:
+                self.add_event(job_id, {"op": "send", "ref": f"lost-{job.attempts}", "content": f"Worker `{job.worker_id}` stopped responding, the job has been abandoned."})
+                self.finish(job_id, None, False)
+                logger.error("Job %s abandoned after %d attempts.", job_id, job.attempts)
+                continue
+            self.db.execute("UPDATE jobs SET status = 'queued', worker_id = NULL, lease_until = NULL WHERE job_id = ?", (job_id,))
+            self.add_event(job_id, {"op": "send", "ref": f"lost-{job.attempts}", "content": f"Worker `{job.worker_id}` stopped responding, the job is queued again."})
+            self._wake_claims()
+            logger.warning("Worker %s stopped responding, job %s queued again.", job.worker_id, job_id)
+
+    def remove_job(self, job_id: str):
+        """Removes a relayed job, its events and their spooled files."""
+        self.db.execute("DELETE FROM events WHERE job_id = ?", (job_id,))
+        self.db.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+        self._notifiers.pop(job_id, None)
+        self._cancel_events.pop(job_id, None)
+        shutil.rmtree(self.spool_dir / job_id, ignore_errors=True)
+    #endregion
+
+    #region Events
+    def add_event(self, job_id: str, data: dict) -> int:
+        """Stores an event of a job, returns its sequence number."""
+        seq = self.db.execute("INSERT INTO events (job_id, data) VALUES (?, ?)", (job_id, json.dumps(data))).lastrowid
+        self._notify(job_id)
+        return seq
+
+    def get_events(self, job_id: str, after: int) -> list[tuple[int, dict]]:
+        """Returns the events of a job following a sequence number."""
+        rows = self.db.execute("SELECT seq, data FROM events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after)).fetchall()
+        return [(seq, json.loads(data)) for seq, data in rows]
+
+    def _wake_claims(self):
+        # Wake up the workers waiting in a claim, later claims wait on a new event
+        self._submitted.set()
+        self._submitted = asyncio.Event()
+
+    def _notify(self, job_id: str):
+        notifier = self._notifiers.get(job_id)
+        if notifier is not None:
+            notifier.set()
+
+    async def _apply_event(self, ctx, event: dict, files_dir: Path, messages: dict):
+        files = [File(file=str(files_dir / name), file_name=name) for name in event.get("files", [])]
+        kwargs = {"files": files} if files else {}
+        message = messages.get(event.get("ref"))
+        if event["op"] == "send" or (event["op"] == "edit" and message is None):
+            # Messages sent before a bot restart can't be edited anymore, they are sent again
+            messages[event.get("ref")] = await ctx.send(content=event.get("content"), **kwargs)
+        elif event["op"] == "edit":
+            messages[event["ref"]] = await message.edit(content=event.get("content"), **kwargs) or message
+
+    async def relay(self, ctx, job_id: str) -> bool:
+        """Relays the events of a job to ctx until the job is done, returns True if it completed."""
+        notifier = self._notifiers.setdefault(job_id, asyncio.Event())
+        messages: dict = {}
+        while True:
+            job = self.get_job(job_id)
+            if job is None:
+                return False
+
+            for seq, event in self.get_events(job_id, job.relayed_seq):
+                files_dir = self.spool_dir / job_id / str(seq)
+                try:
+                    await self._apply_event(ctx, event, files_dir, messages)
+                except Exception as e:
+                    logger.error("Failed to relay event %d of job %s: %s", seq, job_id, e)
+                self.db.execute("UPDATE jobs SET relayed_seq = ? WHERE job_id = ?", (seq, job_id))
+                shutil.rmtree(files_dir, ignore_errors=True)
+
+            # Every event is posted before the job is finished, none can be left
+            if job.status == "done":
+                self.remove_job(job_id)
+                return job.completed
+
+            try:
+                await asyncio.wait_for(notifier.wait(), timeout=self.lease_timeout)
+            except asyncio.TimeoutError:
+                pass
+            notifier.clear()
+
+    async def submit_and_relay(self, ctx, payload: dict, event: asyncio.Event | None = None, job_id: str | None = None) -> bool:
+        """Queues a job and relays its events to ctx, returns True if it completed. `event` is set if the job is cancelled."""
+        job_id = self.submit(payload, job_id)
+        if event is not None:
+            self._cancel_events[job_id] = event
+        try:
+            return await self.relay(ctx, job_id)
+        except asyncio.CancelledError:
+            # The bot is shutting down, the job keeps running and is re-attached at startup
+            logger.warning("Stopped relaying job %s, it will be re-attached at startup.", job_id)
+            raise
+    #endregion
+
+    #region HTTP API
+    @web.middleware
+    async def _auth(self, request: web.Request, handler):
+        expected = f"Bearer {self.token}"
+        if self.token and not hmac.compare_digest(request.headers.get("Authorization", ""), expected):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        return await handler(request)
+
+    async def _handle_claim(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        worker_id = body["worker_id"]
+        deadline = time.monotonic() + min(float(body.get("wait", 0)), MAX_CLAIM_WAIT)
+        while True:
+            submitted = self._submitted
+            job = self.claim(worker_id)
+            remaining = deadline - time.monotonic()
+            if job is not None or remaining <= 0 or self._stopping:
+                break
+            try:
+                await asyncio.wait_for(submitted.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+        return web.json_response({
+            "job": {"job_id": job.job_id, **job.payload} if job else None,
+            "lease_timeout": self.lease_timeout,
+        })
+
+    async def _handle_heartbeat(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        job = self.heartbeat(request.match_info["job_id"], body["worker_id"])
+        if job is None:
+            return web.json_response({"error": "the job is not leased to this worker"}, status=409)
+        return web.json_response({"cancelled": job.cancelled})
+
+    async def _handle_event(self, request: web.Request) -> web.Response:
+        # The job ID comes from the URL, nothing touches the spool before the job is known
+        job_id = request.match_info["job_id"]
+        job = self.get_job(job_id)
+        if job is None:
+            return web.json_response({"error": "unknown job"}, status=404)
+
+        # The event carries the worker ID, it comes first so the lease is checked before any file is written
+        reader = await request.multipart()
+        part = await reader.next()
+        if part is None or part.name != "event":
+            return web.json_response({"error": "the event must be the first part"}, status=400)
+        event: dict = json.loads(await part.text())
+        if job.status != "running" or job.worker_id != event.get("worker_id"):
+            return web.json_response({"error": "the job is not leased to this worker"}, status=409)
+
+        files: list[str] = []
+        taken: set[str] = set()
+        tmp_dir = self.spool_dir / job_id / f"tmp-{uuid.uuid4().hex[:8]}"
+        try:
+            while (part := await reader.next()) is not None:
+                if part.name == "file" and part.filename:
+                    # Attachments of one message may share a name, e.g. the mediainfo.txt of every file
+                    name = file_utils.get_unique_name(os.path.basename(part.filename), taken)
+                    await asyncio.to_thread(tmp_dir.mkdir, parents=True, exist_ok=True)
+                    f = await asyncio.to_thread(open, tmp_dir / name, "wb")
+                    try:
+                        while chunk := await part.read_chunk(SPOOL_CHUNK_SIZE):
+                            await asyncio.to_thread(f.write, chunk)
+                    finally:
+                        await asyncio.to_thread(f.close)
+                    files.append(name)
+
+            event["files"] = files
+            seq = self.add_event(job_id, event)
+            if files:
+                tmp_dir.rename(self.spool_dir / job_id / str(seq))
+            return web.json_response({"seq": seq})
+        finally:
+            await asyncio.to_thread(shutil.rmtree, tmp_dir, True)
+
+    async def _handle_finish(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if not self.finish(request.match_info["job_id"], body["worker_id"], bool(body.get("completed"))):
+            return web.json_response({"error": "the job is not leased to this worker"}, status=409)
+        return web.json_response({"ok": True})
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(max(self.lease_timeout / 3, 1))
+            try:
+                self.requeue_expired()
+            except sqlite3.Error as e:
+                logger.error("Failed to requeue the expired jobs: %s", e)
+
+    async def start(self, host: str, port: int) -> web.AppRunner | None:
+        """Starts the HTTP API the workers connect to, refused without a token unless it only listens on the loopback interface."""
+        if not self.token and host not in LOOPBACK_HOSTS:
+            # Anyone reaching the port could claim the jobs and post messages to the users' channels
+            logger.error("Not starting the job broker on %s: BROKER_TOKEN is required outside of localhost.", host)
+            return None
+        app = web.Application(middlewares=[self._auth])
+        app.router.add_post("/claim", self._handle_claim)
+        app.router.add_post("/jobs/{job_id}/heartbeat", self._handle_heartbeat)
+        app.router.add_post("/jobs/{job_id}/events", self._handle_event)
+        app.router.add_post("/jobs/{job_id}/finish", self._handle_finish)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self._reaper = asyncio.create_task(self._reap())
+        logger.info("Job broker listening on http://%s:%d", host, port)
+        return self._runner
+
+    async def stop(self):
+        """Stops the HTTP API, the jobs stay stored."""
+        # Answer the workers waiting in a claim
+        self._stopping = True
+        self._submitted.set()
+        if self._reaper is not None:
+            self._reaper.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+    #endregion
+
+# Shared broker of the bot, used when WORKER_MODE is "broker"
+job_broker = JobBroker(BROKER_DB, BROKER_SPOOL_DIR, BROKER_TOKEN, BROKER_LEASE_TIMEOUT)
@@ -0,0 +1,129 @@
+"""Broker client module, used by the workers to claim jobs and stream their messages back to the bot."""
+
+import asyncio
+import json
+import os
+from itertools import count
+from types import SimpleNamespace
+
+import aiohttp
+
+from utils.logger import get_logger
+
+# Configure logging
+logger = get_logger("broker_client")
+
+class LeaseLostError(Exception):
+    """Raised when the broker gave the job to another worker (or finished it)."""
+
+def _read_attachments(files: list) -> list[tuple[str, bytes]]:
+    """Reads interactions.File attachments (or paths) as (file name, content)."""
+    attachments = []
+    for file in files:
+        path = getattr(file, "file", file)
+        name = getattr(file, "file_name", None) or os.path.basename(path)
+        with open(path, "rb") as f:
+            attachments.append((name, f.read()))
+    return attachments
+
+class BrokerClient:
+    """HTTP client of the job broker API, retrying the requests that failed to reach it."""
+    def __init__(self, url: str, token: str, worker_id: str, retries: int = 5):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.worker_id = worker_id
+        self.retries = retries
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+            self._session = aiohttp.ClientSession(headers=headers, timeout=aiohttp.ClientTimeout(total=None, sock_connect=10))
+        return self._session
+
+    async def _post(self, path: str, json_body: dict | None = None, data_factory=None) -> dict:
+        for attempt in range(1, self.retries + 1):
+            data = data_factory() if data_factory else None
+            try:
+                async with self._get_session().post(f"{self.url}{path}", json=json_body, data=data) as response:
+                    if response.status == 409:
+                        raise LeaseLostError((await response.json()).get("error", ""))
+                    response.raise_for_status()
+                    return await response.json()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    raise
+                logger.warning("Broker request %s failed (%s), retrying (%d/%d)...", path, e, attempt, self.retries)
+                await asyncio.sleep(min(2 ** attempt, 30))
+        return {}
+
+    async def claim(self, wait: float = 20) -> tuple[dict | None, int]:
+        """Waits up to `wait` seconds for a job, returns it (or None) and the lease timeout."""
+        body = await self._post("/claim", {"worker_id": self.worker_id, "wait": wait})
+        return body.get("job"), body.get("lease_timeout", 60)
+
+    async def heartbeat(self, job_id: str) -> bool:
+        """Renews the lease of a job, returns True if the job has been cancelled."""
+        body = await self._post(f"/jobs/{job_id}/heartbeat", {"worker_id": self.worker_id})
+        return bool(body.get("cancelled"))
+
+    async def post_event(self, job_id: str, event: dict, files: list | None = None):
+        """Posts a message event of a job, uploading its attachments."""
+        payload = json.dumps({**event, "worker_id": self.worker_id})
+        # Results are split into parts of at most 10 MB, read once so a retry can send them again
+        attachments = await asyncio.to_thread(_read_attachments, files or [])
+
+        def build() -> aiohttp.FormData:
+            form = aiohttp.FormData()
+            form.add_field("event", payload, content_type="application/json")
+            for name, content in attachments:
+                form.add_field("file", content, filename=name, content_type="application/octet-stream")
+            return form
+
+        await self._post(f"/jobs/{job_id}/events", data_factory=build)
+
+    async def finish(self, job_id: str, completed: bool):
+        """Reports the outcome of a job."""
+        await self._post(f"/jobs/{job_id}/finish", {"worker_id": self.worker_id, "completed": completed})
+
+    async def close(self):
+        """Closes the connection pool."""
+        if self._session is not None:
+            await self._session.close()
+
+class RemoteMessage:
+    """Message of a job running on a worker, its edits are posted to the broker."""
+    def __init__(self, ctx: "RemoteContext", ref: str):
+        self.id = ref
+        self.ctx = ctx
+
+    async def edit(self, content: str | None = None, files: list | None = None, **_kwargs) -> "RemoteMessage":
+        """Edits the message, uploading its attachments."""
+        await self.ctx.client.post_event(self.ctx.job_id, {"op": "edit", "ref": self.id, "content": content}, files)
+        return self
+
+class RemoteContext:
+    """
+    SlashContext stand-in for the jobs running on a worker.
+
+    Every message `download_and_extract` sends or edits is posted to the broker, which relays it
+    to the channel the job was submitted from.
+    """
+    def __init__(self, client: BrokerClient, job: dict):
+        self.client = client
+        self.job_id = job["job_id"]
+        self.guild_id = job.get("guild_id", "")
+        self.channel_id = job.get("channel_id", "")
+        user_id = job.get("user_id", "0")
+        # Jobs submitted through the job API are named after a client instead of a Discord user
+        self.author = SimpleNamespace(id=int(user_id) if user_id.isdigit() else user_id, mention=f"<@{user_id}>")
+        self._refs = count(1)
+
+    async def send(self, content: str | None = None, files: list | None = None, **_kwargs) -> RemoteMessage:
+        """Sends a message to the job's channel."""
+        message = RemoteMessage(self, f"m{next(self._refs)}")
+        await self.client.post_event(self.job_id, {"op": "send", "ref": message.id, "content": content}, files)
+        return message
+
+    async def defer(self, **_kwargs):
+        """Interactions are acknowledged by the bot."""
@@ -0,0 +1,138 @@
+"""Cleanup module, freeing temp paths at once and deleting them in a low priority background thread."""
+
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from config import TEMP_DIR, DOWNLOAD_DIR, ARIA2_BACKENDS, CLEANUP_IO_CLASS, CLEANUP_NICE
+from utils.io_control import IOPRIO_LOWEST_LEVEL, set_priority
+from utils.logger import get_logger
+
+# Configure logging
+logger = get_logger("cleanup")
+
+TRASH_DIR_NAME = ".trash"
+
+def _delete(path: Path):
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+class TrashCollector:
+    """
+    Deletes directories without blocking their callers.
+
+    A path is first renamed into the `.trash` directory of the temp root holding it (TEMP_DIR, the
+    download directory, or the directory of an Aria2 backend), which is atomic and frees the path at
+    once. A daemon thread with a low CPU and I/O priority then deletes the trash, one entry at a time.
+    Trash left by a restart is deleted again by `reclaim`.
+    """
+    def __init__(self, io_class: str, niceness: int):
+        self.io_class = io_class
+        self.niceness = niceness
+        self._queue: queue.Queue[Path] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_roots() -> list[Path]:
+        """Returns the temp roots, each with its own trash directory on the root's file system."""
+        roots = [TEMP_DIR, DOWNLOAD_DIR, *(backend.get("dir", DOWNLOAD_DIR) for backend in ARIA2_BACKENDS)]
+        return list(dict.fromkeys(Path(os.path.abspath(root)) for root in roots))
+
+    @classmethod
+    def get_root(cls, path: Path) -> Path | None:
+        """Returns the deepest temp root holding the (absolute) path."""
+        roots = [root for root in cls.get_roots() if path == root or root in path.parents]
+        return max(roots, key=lambda root: len(root.parts)) if roots else None
+
+    def get_trash_dir(self, path: Path) -> Path:
+        """Returns the trash directory of the temp root holding the (absolute) path, or next to the path."""
+        root = self.get_root(path)
+        return (root or path.parent) / TRASH_DIR_NAME
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="trash-collector", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        # The lowest priority within the class, on this thread only
+        set_priority(threading.get_native_id(), self.niceness, self.io_class, IOPRIO_LOWEST_LEVEL)
+        while True:
+            path = self._queue.get()
+            try:
+                start = time.perf_counter()
+                _delete(path)
+                logger.debug("Deleted %s in %.2fs", path, time.perf_counter() - start)
+            except OSError as e:
+                logger.warning("Failed to delete %s: %s", path, e)
+            finally:
+                self._queue.task_done()
+
+    def discard(self, path: Path):
+        """Moves a file or directory to the trash, deleting it in the background."""
+        path = Path(os.path.abspath(path))
+        if not path.exists() and not path.is_symlink():
+            return
+        trash_dir = self.get_trash_dir(path)
+        if trash_dir == path or trash_dir.parent == path:
+            # The trash lives inside the path, only its content can go
+            self.empty(path)
+            return
+        target = trash_dir / f"{path.name}-{uuid.uuid4().hex[:8]}"
+        try:
+            trash_dir.mkdir(parents=True, exist_ok=True)
+            os.rename(path, target)
+        except OSError as e:
+            # Not renamable into the trash (another file system), delete it in place
+            logger.warning("Could not move %s to the trash, deleting it now: %s", path, e)
+            _delete(path)
+            return
+        self._queue.put(target)
+        self._start()
+
+    def empty(self, path: Path):
+        """Moves the content of a directory to the trash, keeping the directory (and its trash)."""
+        path = Path(path)
+        if not path.is_dir():
+            return
+        for child in path.iterdir():
+            if child.name != TRASH_DIR_NAME:
+                self.discard(child)
+
+    def reclaim(self):
+        """Deletes in the background the trash left behind by the last run."""
+        count = 0
+        for root in self.get_roots():
+            trash_dir = root / TRASH_DIR_NAME
+            if not trash_dir.is_dir():
+                continue
+            for entry in trash_dir.iterdir():
+                self._queue.put(entry)
+                count += 1
+        if count:
+            logger.info("Reclaiming %d trash entries left by the last run.", count)
+            self._start()
+
+    @property
+    def pending(self) -> int:
+        """Trash entries waiting to be deleted, or being deleted."""
+        return self._queue.unfinished_tasks
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Waits until the trash is deleted, returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+trash_collector = TrashCollector(CLEANUP_IO_CLASS, CLEANUP_NICE)
@@ -0,0 +1,96 @@
+"""Coalescer module, sharing one download between the jobs requesting the same release."""
+
+from pathlib import Path
+
+from utils.file_utils import JobStateObject
+from utils.logger import get_logger
+from utils.scheduler import job_scheduler
+
+# Configure logging
+logger = get_logger("coalescer")
+
+class SharedDownload:
+    """The download of a release and the jobs extracting from it."""
+    def __init__(self, key: str):
+        self.key = key
+        self.leader = ""
+        self.members: dict[str, JobStateObject] = {}
+        self.gid = ""
+        self.dir_path: Path | None = None
+        self.finished: list[JobStateObject] = []
+        self.retained = False
+
+    key: str
+    """Canonical key of the release (see link_identity)."""
+    leader: str
+    """ID of the job downloading the release, the other members are held until it is ready."""
+    members: dict[str, JobStateObject]
+    """Jobs still running or waiting, in the order they joined."""
+    gid: str
+    dir_path: Path | None
+    """Directory of the completed download, None until it is ready."""
+    finished: list[JobStateObject]
+    """Jobs done with the download, cleaned up once the last member leaves."""
+    retained: bool
+    """Whether the files come from the retention store instead of a download of the leader."""
+
+    @property
+    def ready(self) -> bool:
+        return self.dir_path is not None
+
+class DownloadCoalescer:
+    """
+    Attaches the jobs of a release to the first job downloading it. Late jobs are held in the
+    scheduler until the download is ready, then each runs its own extraction from the same files.
+    The download is removed once every job is done with it.
+    """
+    def __init__(self):
+        self.downloads: dict[str, SharedDownload] = {}
+
+    def join(self, key: str, job: JobStateObject) -> SharedDownload:
+        """Adds a job to the download of its release, the first job (or the first after a failure) leads it."""
+        shared = self.downloads.get(key)
+        if shared is None:
+            shared = self.downloads[key] = SharedDownload(key)
+        elif shared.leader or shared.ready:
+            logger.info("Job %s joined the download of %s led by job %s.", job.job_id, key, shared.leader)
+        shared.members[job.job_id] = job
+        if not shared.leader and not shared.ready:
+            shared.leader = job.job_id
+        return shared
+
+    def is_held(self, shared: SharedDownload, job_id: str) -> bool:
+        """Whether the job waits for the leader's download."""
+        return not shared.ready and shared.leader != job_id
+
+    def publish(self, shared: SharedDownload, gid: str, dir_path: Path):
+        """Marks the download as ready and lets the held jobs start their extraction."""
+        shared.gid, shared.dir_path = gid, dir_path
+        for job_id in shared.members:
+            job_scheduler.unhold(job_id)
+
+    def leave(self, shared: SharedDownload, job: JobStateObject) -> list[JobStateObject]:
+        """
+        Removes a finished job. A leader leaving before its download was ready hands the download over
+        to the next member. Returns the jobs whose downloads and temp files can be removed now.
+        """
+        shared.members.pop(job.job_id, None)
+        if not shared.ready:
+            if shared.leader == job.job_id:
+                shared.leader = next(iter(shared.members), "")
+                if shared.leader:
+                    logger.info("Job %s took over the download of %s.", shared.leader, shared.key)
+                    job_scheduler.unhold(shared.leader)
+            if not shared.members:
+                self.downloads.pop(shared.key, None)
+            return [job]
+
+        # Keep the files until the last member is done extracting
+        shared.finished.append(job)
+        if shared.members:
+            return []
+        self.downloads.pop(shared.key, None)
+        return shared.finished
+
+# Shared coalescer of the jobs run by this process
+download_coalescer = DownloadCoalescer()
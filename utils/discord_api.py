@@ -0,0 +1,107 @@
+"""Discord API module with an async client and a TTL cache for the bot metadata."""
+
+import asyncio
+import time
+
+import aiohttp
+
+from config import APP_ID, DISCORD_API_CACHE_TTL, DISCORD_TOKEN
+from utils.logger import get_logger
+
+# Configure logging
+logger = get_logger("discord_api")
+
+DISCORD_API_URL = "https://discord.com/api/v9"
+
+class CacheEntry(dict):
+    """Type definition for a cached API response."""
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.value = data.get("value")
+        self.fetched_at = data.get("fetched_at", 0.0)
+
+    value: dict | list | None
+    """The decoded JSON response."""
+    fetched_at: float
+    """Monotonic time of the fetch."""
+
+class DiscordAPIClient:
+    """
+    Async client for the application endpoints, sharing one connection pool.
+
+    Responses are cached for `ttl` seconds. A failed refresh keeps serving the previous
+    response, so /help keeps working while the Discord API is unreachable.
+    """
+    def __init__(self, token: str | None, app_id: str | None, ttl: int):
+        self.token = token
+        self.app_id = app_id
+        self.ttl = ttl
+        self._session: aiohttp.ClientSession | None = None
+        self._cache: dict[str, CacheEntry] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._refresh_task: asyncio.Task | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers={"Authorization": f"Bot {self.token}"},
+                timeout=aiohttp.ClientTimeout(total=20),
+            )
+        return self._session
+
+    async def _fetch(self, path: str) -> dict | list:
+        async with self._get_session().get(f"{DISCORD_API_URL}/{path}") as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def _get_cached(self, path: str, force: bool = False) -> dict | list | None:
+        entry = self._cache.get(path)
+        if not force and entry and time.monotonic() - entry.fetched_at < self.ttl:
+            return entry.value
+
+        # Concurrent callers share a single request
+        async with self._locks.setdefault(path, asyncio.Lock()):
+            entry = self._cache.get(path)
+            if not force and entry and time.monotonic() - entry.fetched_at < self.ttl:
+                return entry.value
+            try:
+                value = await self._fetch(path)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning("Failed to fetch %s from the Discord API: %s", path, e)
+                return entry.value if entry else None
+            self._cache[path] = CacheEntry(value=value, fetched_at=time.monotonic())
+            return value
+
+    async def get_application(self, force: bool = False) -> dict:
+        """Returns the application information (bot user, avatar...)."""
+        return await self._get_cached(f"applications/{self.app_id}", force) or {}
+
+    async def get_commands(self, force: bool = False) -> list[dict]:
+        """Returns the global application commands."""
+        return await self._get_cached(f"applications/{self.app_id}/commands", force) or []
+
+    async def warm(self):
+        """Fetches every cached endpoint."""
+        await asyncio.gather(self.get_application(force=True), self.get_commands(force=True))
+        logger.info("Discord API cache warmed.")
+
+    async def _refresh_loop(self):
+        while True:
+            # Refresh before expiry, so /help never waits for the API
+            await asyncio.sleep(max(self.ttl * 0.9, 1))
+            await self.warm()
+
+    def start_refresh(self):
+        """Starts refreshing the cache in the background."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        """Stops the background refresh and closes the connection pool."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        if self._session is not None:
+            await self._session.close()
+
+# Shared client of the bot
+discord_api = DiscordAPIClient(DISCORD_TOKEN, APP_ID, DISCORD_API_CACHE_TTL)
@@ -0,0 +1,270 @@
+"""EBML module for reading the track layout straight from the head of a Matroska file."""
+
+import struct
+
+from utils.identification import Identification
+from utils.logger import get_logger
+
+# Configure logging
+logger = get_logger("ebml")
+
+# Element IDs (https://www.matroska.org/technical/elements.html)
+EBML_HEADER_ID = 0x1A45DFA3
+SEGMENT_ID = 0x18538067
+CLUSTER_ID = 0x1F43B675
+TRACKS_ID = 0x1654AE6B
+TRACK_ENTRY_ID = 0xAE
+TRACK_NUMBER_ID = 0xD7
+TRACK_TYPE_ID = 0x83
+FLAG_ENABLED_ID = 0xB9
+FLAG_DEFAULT_ID = 0x88
+FLAG_FORCED_ID = 0x55AA
+NAME_ID = 0x536E
+LANGUAGE_ID = 0x22B59C
+LANGUAGE_IETF_ID = 0x22B59D
+CODEC_ID_ID = 0x86
+CODEC_NAME_ID = 0x258688
+VIDEO_ID = 0xE0
+PIXEL_WIDTH_ID = 0xB0
+PIXEL_HEIGHT_ID = 0xBA
+AUDIO_ID = 0xE1
+SAMPLING_FREQUENCY_ID = 0xB5
+CHANNELS_ID = 0x9F
+ATTACHMENTS_ID = 0x1941A469
+ATTACHED_FILE_ID = 0x61A7
+FILE_NAME_ID = 0x466E
+FILE_MIME_TYPE_ID = 0x4660
+FILE_DATA_ID = 0x465C
+CHAPTERS_ID = 0x1043A770
+EDITION_ENTRY_ID = 0x45B9
+CHAPTER_ATOM_ID = 0xB6
+
+# Matroska track types mapped to the names used by mkvmerge
+TRACK_TYPES = {1: "video", 2: "audio", 17: "subtitles", 16: "logo", 18: "buttons", 32: "control"}
+
+# Codec IDs mapped to the codec names used by mkvmerge
+CODEC_NAMES = {
+    "S_TEXT/ASS": "SubStationAlpha",
+    "S_TEXT/SSA": "SubStationAlpha",
+    "S_TEXT/UTF8": "SubRip/SRT",
+    "S_TEXT/WEBVTT": "WebVTT",
+    "S_HDMV/PGS": "HDMV PGS",
+    "S_VOBSUB": "VobSub",
+    "A_AAC": "AAC",
+    "A_AC3": "AC-3",
+    "A_EAC3": "E-AC-3",
+    "A_DTS": "DTS",
+    "A_FLAC": "FLAC",
+    "A_OPUS": "Opus",
+    "A_VORBIS": "Vorbis",
+    "A_TRUEHD": "TrueHD",
+    "A_MPEG/L3": "MP3",
+    "A_PCM/INT/LIT": "PCM",
+    "V_MPEG4/ISO/AVC": "AVC/H.264/MPEG-4p10",
+    "V_MPEGH/ISO/HEVC": "HEVC/H.265/MPEG-H",
+    "V_AV1": "AV1",
+    "V_VP9": "VP9",
+}
+
+UNKNOWN_SIZE = -1
+
+class EBMLIncompleteError(Exception):
+    """Raised when the element being read extends past the available data."""
+
+def _read_vint(data: bytes, pos: int, keep_marker: bool) -> tuple[int, int]:
+    """Reads an EBML variable size integer, returns its value and the position after it."""
+    if pos >= len(data):
+        raise EBMLIncompleteError("Unexpected end of data while reading a vint.")
+    first = data[pos]
+    if first == 0:
+        raise ValueError(f"Invalid EBML vint at offset {pos}.")
+    length = 8 - first.bit_length() + 1
+    if pos + length > len(data):
+        raise EBMLIncompleteError("Unexpected end of data while reading a vint.")
+
+    value = first if keep_marker else first & (0xFF >> length)
+    all_ones = value == (0xFF >> length)
+    for byte in data[pos + 1:pos + length]:
+        value = (value << 8) | byte
+        all_ones = all_ones and byte == 0xFF
+    if not keep_marker and all_ones:
+        return UNKNOWN_SIZE, pos + length
+    return value, pos + length
+
+def _read_element_header(data: bytes, pos: int) -> tuple[int, int, int]:
+    """Reads an element header, returns its ID, data size and the position of its data."""
+    element_id, pos = _read_vint(data, pos, keep_marker=True)
+    size, pos = _read_vint(data, pos, keep_marker=False)
+    return element_id, size, pos
+
+def _iter_children(data: bytes, start: int, end: int):
+    """Iterates over the child elements of a master element."""
+    pos = start
+    while pos < end:
+        element_id, size, data_pos = _read_element_header(data, pos)
+        if size == UNKNOWN_SIZE:
+            raise ValueError(f"Unknown-size element 0x{element_id:X} inside a sized master element.")
+        if data_pos + size > len(data):
+            raise EBMLIncompleteError(f"Element 0x{element_id:X} extends past the available data.")
+        yield element_id, data_pos, data_pos + size
+        pos = data_pos + size
+
+def _read_uint(data: bytes, start: int, end: int) -> int:
+    return int.from_bytes(data[start:end], "big") if end > start else 0
+
+def _read_float(data: bytes, start: int, end: int) -> float:
+    if end - start == 4:
+        return struct.unpack(">f", data[start:end])[0]
+    if end - start == 8:
+        return struct.unpack(">d", data[start:end])[0]
+    return 0.0
+
+def _read_string(data: bytes, start: int, end: int) -> str:
+    return data[start:end].split(b"\0", 1)[0].decode("utf-8", errors="replace")
+
+def _parse_track_entry(data: bytes, start: int, end: int, track_id: int) -> dict:
+    """Parses a TrackEntry element into an mkvmerge-like track dict."""
+    track_type = 0
+    codec_id = ""
+    codec_name = ""
+    properties = {
+        "language": "eng",  # Matroska default when the element is missing
+        "default_track": True,
+        "forced_track": False,
+        "enabled_track": True,
+    }
+
+    for element_id, c_start, c_end in _iter_children(data, start, end):
+        if element_id == TRACK_NUMBER_ID:
+            properties["number"] = _read_uint(data, c_start, c_end)
+        elif element_id == TRACK_TYPE_ID:
+            track_type = _read_uint(data, c_start, c_end)
+        elif element_id == FLAG_ENABLED_ID:
+            properties["enabled_track"] = bool(_read_uint(data, c_start, c_end))
+        elif element_id == FLAG_DEFAULT_ID:
+            properties["default_track"] = bool(_read_uint(data, c_start, c_end))
+        elif element_id == FLAG_FORCED_ID:
+            properties["forced_track"] = bool(_read_uint(data, c_start, c_end))
+        elif element_id == NAME_ID:
+            properties["track_name"] = _read_string(data, c_start, c_end)
+        elif element_id == LANGUAGE_ID:
+            properties["language"] = _read_string(data, c_start, c_end)
+        elif element_id == LANGUAGE_IETF_ID:
+            properties["language_ietf"] = _read_string(data, c_start, c_end)
+        elif element_id == CODEC_ID_ID:
+            codec_id = _read_string(data, c_start, c_end)
+        elif element_id == CODEC_NAME_ID:
+            codec_name = _read_string(data, c_start, c_end)
+        elif element_id == VIDEO_ID:
+            width = height = 0
+            for v_id, v_start, v_end in _iter_children(data, c_start, c_end):
+                if v_id == PIXEL_WIDTH_ID:
+                    width = _read_uint(data, v_start, v_end)
+                elif v_id == PIXEL_HEIGHT_ID:
+                    height = _read_uint(data, v_start, v_end)
+            if width and height:
+                properties["pixel_dimensions"] = f"{width}x{height}"
+        elif element_id == AUDIO_ID:
+            for a_id, a_start, a_end in _iter_children(data, c_start, c_end):
+                if a_id == SAMPLING_FREQUENCY_ID:
+                    properties["audio_sampling_frequency"] = int(_read_float(data, a_start, a_end))
+                elif a_id == CHANNELS_ID:
+                    properties["audio_channels"] = _read_uint(data, a_start, a_end)
+
+    properties["codec_id"] = codec_id
+    codec = CODEC_NAMES.get(codec_id) or next(
+        (name for prefix, name in CODEC_NAMES.items() if codec_id.startswith(prefix)),
+        codec_name or codec_id or "unknown"
+    )
+    return {
+        "id": track_id,
+        "type": TRACK_TYPES.get(track_type, "unknown"),
+        "codec": codec,
+        "properties": properties,
+    }
+
+def _parse_attachments(data: bytes, start: int, end: int) -> list[dict]:
+    attachments = []
+    for element_id, c_start, c_end in _iter_children(data, start, end):
+        if element_id != ATTACHED_FILE_ID:
+            continue
+        attachment = {"id": len(attachments) + 1, "file_name": "", "content_type": "", "size": 0}
+        for a_id, a_start, a_end in _iter_children(data, c_start, c_end):
+            if a_id == FILE_NAME_ID:
+                attachment["file_name"] = _read_string(data, a_start, a_end)
+            elif a_id == FILE_MIME_TYPE_ID:
+                attachment["content_type"] = _read_string(data, a_start, a_end)
+            elif a_id == FILE_DATA_ID:
+                attachment["size"] = a_end - a_start
+        attachments.append(attachment)
+    return attachments
+
+def _parse_chapters(data: bytes, start: int, end: int) -> list[dict]:
+    chapters = []
+    for element_id, c_start, c_end in _iter_children(data, start, end):
+        if element_id == EDITION_ENTRY_ID:
+            num_entries = sum(1 for a_id, _, _ in _iter_children(data, c_start, c_end) if a_id == CHAPTER_ATOM_ID)
+            chapters.append({"num_entries": num_entries})
+    return chapters
+
+def parse_head(data: bytes) -> Identification | None:
+    """
+    Parses the track layout from the first bytes of a Matroska file.
+
+    Args:
+        data (bytes): The head of the file, as many bytes as are available.
+
+    Returns:
+        Identification | None: The tracks and, when they are stored before the first cluster, the
+        attachments and chapters (None otherwise). None if the Tracks element is not fully contained
+        in the data or the data is not a valid Matroska head.
+    """
+    try:
+        element_id, size, pos = _read_element_header(data, 0)
+        if element_id != EBML_HEADER_ID:
+            return None
+        pos += size
+
+        element_id, size, segment_start = _read_element_header(data, pos)
+        if element_id != SEGMENT_ID:
+            return None
+        segment_end = len(data) if size == UNKNOWN_SIZE else min(segment_start + size, len(data))
+
+        info: dict = {}
+        pos = segment_start
+        while pos < segment_end:
+            element_id, size, data_pos = _read_element_header(data, pos)
+            if element_id == CLUSTER_ID or size == UNKNOWN_SIZE:
+                break
+            if data_pos + size > len(data):
+                # Only the track layout is required, the rest is a best effort
+                break
+
+            if element_id == TRACKS_ID:
+                info["tracks"] = [
+                    _parse_track_entry(data, c_start, c_end, track_id)
+                    for track_id, (_, c_start, c_end) in enumerate(
+                        child for child in _iter_children(data, data_pos, data_pos + size)
+                        if child[0] == TRACK_ENTRY_ID
+                    )
+                ]
+            elif element_id == ATTACHMENTS_ID:
+                info["attachments"] = _parse_attachments(data, data_pos, data_pos + size)
+            elif element_id == CHAPTERS_ID:
+                info["chapters"] = _parse_chapters(data, data_pos, data_pos + size)
+            pos = data_pos + size
+
+        return Identification.from_dict(info) if "tracks" in info else None
+    except (EBMLIncompleteError, ValueError) as e:
+        logger.debug("Could not parse Matroska head: %s", e)
+        return None
+
+def read_head(filepath: str, max_bytes: int) -> Identification | None:
+    """Reads up to `max_bytes` from the start of a file and parses its track layout."""
+    try:
+        with open(filepath, "rb") as f:
+            data = f.read(max_bytes)
+    except OSError as e:
+        logger.warning("Could not read head of %s: %s", filepath, e)
+        return None
+    return parse_head(data)
@@ -0,0 +1,107 @@
+"""Extraction engine module, running the extractors of an extraction type on one Matroska file."""
+
+from pathlib import Path
+
+from utils.file_utils import save_file_to_extract_dir
+from utils.io_control import drop_cache
+from utils.mkv_service import MKVService, MKVExtractReturnType, SPLIT_SIZE
+from utils.track_filter import TrackFilter
+
+# Extraction types including each content
+EXTRACTION_CONTENTS = {
+    "subtitles": ("subtitles", "all", "all_without_audio"),
+    "attachments": ("attachments", "all", "all_without_audio"),
+    "chapters": ("chapters", "all", "all_without_audio"),
+    "audio": ("audio", "all"),
+}
+CONTENT_LABELS = {
+    "subtitles": "Subtitles",
+    "attachments": "Attachments",
+    "chapters": "Chapters",
+    "audio": "Audio Tracks",
+}
+EXTRACTION_TYPES = ("all", "all_without_audio", "subtitles", "attachments", "chapters", "audio")
+
+def includes(extraction_type: str, content: str) -> bool:
+    """Whether an extraction type extracts a content (subtitles, attachments, chapters or audio)."""
+    return extraction_type in EXTRACTION_CONTENTS[content]
+
+class ExtractionResult(dict):
+    """Type definition for the outputs of one Matroska file."""
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.file = data.get("file", "")
+        self.extraction_type = data.get("extraction_type", "all")
+        self.mediainfo_path = data.get("mediainfo_path")
+        self.subtitles = data.get("subtitles")
+        self.attachments = data.get("attachments")
+        self.chapters = data.get("chapters")
+        self.audio = data.get("audio")
+
+    file: str
+    extraction_type: str
+    mediainfo_path: Path | None
+    subtitles: MKVExtractReturnType | None
+    attachments: MKVExtractReturnType | None
+    chapters: dict | None
+    """{"path": chapters.xml, "count": number of chapters}"""
+    audio: MKVExtractReturnType | None
+
+    @property
+    def paths(self) -> list[Path]:
+        """The files to deliver: media report, chapters, then the (split) zips."""
+        paths = [self.mediainfo_path, self.chapters.get("path") if self.chapters else None]
+        for zipped in (self.subtitles, self.attachments, self.audio):
+            paths.extend(zipped.paths if zipped else [])
+        return [Path(path) for path in paths if path is not None]
+
+    def counts(self) -> dict[str, int]:
+        """Number of extracted items of every content of the extraction type."""
+        counts = {}
+        for content in EXTRACTION_CONTENTS:
+            if not includes(self.extraction_type, content):
+                continue
+            extracted = getattr(self, content)
+            counts[content] = (extracted.get("count", 0) if content == "chapters" else extracted.count) if extracted else 0
+        return counts
+
+def extract_file(file: str, output_dir: Path, extraction_type: str = "all", track_filter: TrackFilter | None = None, full_mediainfo: bool = False, split_size: int = SPLIT_SIZE) -> ExtractionResult:
+    """
+    Extracts the contents of an extraction type from a Matroska file, plus its media report.
+
+    Args:
+        file (str): The path to the Matroska file.
+        output_dir (Path): The directory the outputs are written to.
+        extraction_type (str): all, all_without_audio, subtitles, attachments, chapters or audio.
+        track_filter (TrackFilter | None): Only extract the tracks selected by this filter.
+        full_mediainfo (bool): Save the full MediaInfo report instead of the built-in one.
+        split_size (int): Zips larger than this are split into parts of this size, 0 keeps a single zip.
+
+    Returns:
+        ExtractionResult: The outputs, a content is None when nothing was extracted.
+    """
+    try:
+        # Always save the media report, built from the cached identification unless the full one is requested
+        mediainfo = MKVService.get_media_report(file, full=full_mediainfo)
+        result = ExtractionResult(
+            file=file,
+            extraction_type=extraction_type,
+            mediainfo_path=save_file_to_extract_dir(mediainfo.encode("utf-8"), "mediainfo.txt", output_dir),
+        )
+
+        if includes(extraction_type, "subtitles"):
+            result.subtitles = result["subtitles"] = MKVService.extract_subtitles(
+                file, output_dir=output_dir, track_filter=track_filter, split_size=split_size
+            )
+        if includes(extraction_type, "attachments"):
+            result.attachments = result["attachments"] = MKVService.extract_attachments(file, output_dir=output_dir, split_size=split_size)
+        if includes(extraction_type, "chapters"):
+            result.chapters = result["chapters"] = MKVService.extract_chapters(file, output_dir=output_dir)
+        if includes(extraction_type, "audio"):
+            result.audio = result["audio"] = MKVService.extract_audio(
+                file, output_dir=output_dir, track_filter=track_filter, split_size=split_size
+            )
+        return result
+    finally:
+        # Every tool is done with the source file, keep its pages from evicting the downloads in progress
+        drop_cache(file)
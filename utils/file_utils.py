@@ -2,13 +2,19 @@
 
 import os
 from pathlib import Path
-import shutil
 import json
+import time
+import uuid
 
-from config import TEMP_DIR, EXTRACT_DIR, DOWNLOAD_DIR
-from config import ALLOWED_CHANNELS_FILE, CURRENT_DL_FILE, QUEUE_FILE
+from config import TEMP_DIR, EXTRACT_DIR, DOWNLOAD_DIR, ARIA2_BACKENDS
+from config import ALLOWED_CHANNELS_FILE, QUEUE_FILE, JOB_STATE_FILE, WATCH_INDEX_FILE, RETENTION_INDEX_FILE
+from utils.cleanup import trash_collector
+from utils.link_identity import get_known_link_key
 from utils.logger import get_logger
 
+# Extensions of the Matroska files that can be extracted
+MATROSKA_EXTENSIONS = (".mkv", ".mk3d", ".mka")
+
 # Define return type for allowed channels
 # will be like this:
 # {"allowed_channels": [{"guild": guild_id, "channels": [channel_id1, channel_id2]}, ...]}
@@ -36,32 +42,112 @@ class GuildObject(dict):
     guild: str
     channels: list[str]
 
-class CurrentDLObject(dict):
-    """Type definition for current download object."""
+class JobStateObject(dict):
+    """Type definition for the durable state of a download and extraction job."""
     def __init__(self, **data):
         super().__init__(**data)
-        self.gid = data.get("gid", "")
+        self.job_id = data.get("job_id", "")
+        self.kind = data.get("kind", "extract")
         self.user_id = data.get("user_id", "")
         self.guild_id = data.get("guild_id", "")
-
-    gid: str
+        self.channel_id = data.get("channel_id", "")
+        self.url = data.get("url", "")
+        self.extraction_type = data.get("extraction_type", "all")
+        self.filters = data.get("filters", "")
+        self.full_mediainfo = data.get("full_mediainfo", False)
+        self.queue = data.get("queue")
+        self.priority = data.get("priority", 0)
+        self.stage = data.get("stage", "queued")
+        self.gids = data.get("gids", [])
+        self.dir_path = data.get("dir_path", "")
+        self.shared_from = data.get("shared_from", "")
+        self.completed_files = data.get("completed_files", [])
+        self.uploaded = data.get("uploaded", [])
+        self.updated_at = data.get("updated_at", 0)
+
+    job_id: str
+    kind: str
+    """"extract" for a single /extract run, "queue" for a link processed by /start_queue, "api" for a job of the job API."""
     user_id: str
     guild_id: str
+    channel_id: str
+    url: str
+    extraction_type: str
+    filters: str
+    full_mediainfo: bool
+    queue: dict | None
+    """Options of the /start_queue run the job belongs to (type, filters, full_mediainfo)."""
+    priority: int
+    """Scheduling priority, 1 for the jobs of administrators."""
+    stage: str
+    """Last reached stage: queued, downloading, downloaded or extracting."""
+    gids: list[str]
+    """Aria2 GIDs of the job, the last one being the download that holds the files."""
+    dir_path: str
+    shared_from: str
+    """ID of the job whose download of the same release the job extracts from."""
+    completed_files: list[str]
+    """Matroska files whose results have been uploaded."""
+    uploaded: list[dict]
+    """Uploaded results, as {"file": file, "results": [file names]}."""
+    updated_at: float
+
+class WatchedFileObject(dict):
+    """Type definition for a file of the watch folder that has been processed."""
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.path = data.get("path", "")
+        self.size = data.get("size", 0)
+        self.mtime_ns = data.get("mtime_ns", 0)
+        self.status = data.get("status", "completed")
+        self.processed_at = data.get("processed_at", 0)
+
+    path: str
+    size: int
+    mtime_ns: int
+    status: str
+    """completed or failed, the file is only processed again once its size or mtime changes."""
+    processed_at: float
+
+class RetainedDownloadObject(dict):
+    """Type definition for a completed download kept for the next jobs of its release."""
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.key = data.get("key", "")
+        self.path = data.get("path", "")
+        self.size = data.get("size", 0)
+        self.retained_at = data.get("retained_at", 0)
+        self.last_used_at = data.get("last_used_at", 0)
+        self.hits = data.get("hits", 0)
+
+    key: str
+    """Canonical key of the release (see link_identity)."""
+    path: str
+    """Directory of the download's files, under the `.retained` directory of its download root."""
+    size: int
+    retained_at: float
+    last_used_at: float
+    """When a job last started or finished using the files, the TTL and the LRU order count from it."""
+    hits: int
+    """Jobs that reused the files instead of downloading them."""
 
 class QueueItem(dict):
-    """Type definition for a single queue item with link and extraction type."""
+    """Type definition for a single queue item with link, extraction type and track filters."""
     def __init__(self, **data):
         super().__init__(**data)
         # Handle both old format (string) and new format (dict)
         if isinstance(data.get("link"), dict):
             self.link = data["link"].get("link", "")
             self.type = data["link"].get("type", "all_without_audio")
+            self.filters = data["link"].get("filters", "")
         else:
             self.link = data.get("link", "")
             self.type = data.get("type", "all_without_audio")
+            self.filters = data.get("filters", "")
 
     link: str
     type: str
+    filters: str
 
 class QueueObject(dict):
     """Type definition for queue object."""
@@ -77,25 +163,27 @@ class QueueObject(dict):
 
     @staticmethod
     def _normalize_links(links: list) -> list[dict]:
-        """Converts links to new format {link, type} if needed."""
+        """Converts links to new format {link, type, filters} if needed."""
         normalized = []
         for item in links:
             if isinstance(item, str):
                 # Old format: just a link string
-                normalized.append({"link": item, "type": "all_without_audio"})
+                normalized.append({"link": item, "type": "all_without_audio", "filters": ""})
             elif isinstance(item, dict):
                 # New format: already a dict
                 normalized.append({
                     "link": item.get("link", ""),
-                    "type": item.get("type", "all_without_audio")
+                    "type": item.get("type", "all_without_audio"),
+                    "filters": item.get("filters", "")
                 })
         return normalized
 
 def clear_temp(path: Path = Path(TEMP_DIR)):
-    """Clears the temporary directory."""
+    """Clears the temporary directory, and the download directories of the Aria2 backends."""
     if path.exists():
-        shutil.rmtree(path)
-        path.mkdir(parents=True, exist_ok=True)
+        trash_collector.empty(path)
+    for backend in ARIA2_BACKENDS:
+        clear_directory(Path(backend.get("dir", DOWNLOAD_DIR)))
 
 def get_temp_files(path: Path) -> dict[str, list[str]] | None:
     """
@@ -118,7 +206,7 @@ def get_temp_files(path: Path) -> dict[str, list[str]] | None:
             file_list.append(full_path)
 
     # Remove all files except matroska files
-    file_list = [f for f in file_list if f.lower().endswith(('.mkv', '.mk3d', '.mka'))]
+    file_list = [f for f in file_list if f.lower().endswith(MATROSKA_EXTENSIONS)]
     file_list.sort()
 
     # Return a dict containing file with full paths & relative paths
@@ -127,57 +215,165 @@ def get_temp_files(path: Path) -> dict[str, list[str]] | None:
         "filenames": [os.path.relpath(f, path) for f in file_list]
     }
 
+def get_tree_size(path: Path) -> int:
+    """Returns the bytes of the files under a directory."""
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+def get_unique_name(name: str, taken: set[str]) -> str:
+    """Returns the file name, numbered (name_2.ext, name_3.ext...) if taken, and adds it to the taken names."""
+    stem, suffix, n = Path(name).stem, Path(name).suffix, 1
+    while name in taken:
+        n += 1
+        name = f"{stem}_{n}{suffix}"
+    taken.add(name)
+    return name
+
 def clear_download_dir(path: Path = Path(DOWNLOAD_DIR)):
     """Clears all files and subdirectories in the specified download directory."""
-    if path.exists() and path.is_dir():
-        shutil.rmtree(path)
-        path.mkdir(parents=True, exist_ok=True)
+    clear_directory(path)
 
 def clear_extract_dir(path: Path = Path(EXTRACT_DIR)):
     """Clears all files and subdirectories in the specified extract directory."""
-    if path.exists() and path.is_dir():
-        shutil.rmtree(path)
-        path.mkdir(parents=True, exist_ok=True)
+    clear_directory(path)
 
 def clear_directory(path: Path):
-    """Clears all files and subdirectories in the specified directory."""
+    """
+    Clears all files and subdirectories in the specified directory. They are moved to the trash
+    at once and deleted in the background, so the directory can be reused right away.
+    """
     if path.exists() and path.is_dir():
-        shutil.rmtree(path)
-        path.mkdir(parents=True, exist_ok=True)
+        trash_collector.empty(path)
 
-def save_file_to_extract_dir(content: bytes, filename: str):
+def get_job_download_dir(job_id: str, root: str = DOWNLOAD_DIR) -> Path:
+    """Returns the directory a job downloads to, under the download directory of a backend."""
+    return Path(root) / job_id
+
+def get_job_extract_dir(job_id: str) -> Path:
+    """Returns the directory a job extracts to."""
+    return Path(EXTRACT_DIR) / job_id
+
+def clear_job_dirs(job_id: str):
+    """Removes the download and extraction directories of a job, on every Aria2 backend."""
+    roots = [DOWNLOAD_DIR, *(backend.get("dir", DOWNLOAD_DIR) for backend in ARIA2_BACKENDS)]
+    for path in [get_job_extract_dir(job_id), *(get_job_download_dir(job_id, root) for root in roots)]:
+        trash_collector.discard(path)
+
+def save_file_to_extract_dir(content: bytes, filename: str, directory: Path = Path(EXTRACT_DIR)):
     """Saves content to a file in the extract directory."""
-    filepath = Path(EXTRACT_DIR) / filename
+    filepath = directory / filename
     filepath.parent.mkdir(parents=True, exist_ok=True)
     with open(filepath, "wb") as f:
         f.write(content)
     return filepath
 
-def save_current_dl(gid="", user_id="", guild_id="", file_path: Path = Path(CURRENT_DL_FILE)):
-    """Saves the current download GID to a file."""
-    data = {
-        "gid": gid,
-        "user_id": user_id,
-        "guild_id": guild_id
-    }
+def load_jobs(file_path: Path = Path(JOB_STATE_FILE)) -> list[JobStateObject]:
+    """Loads the state of all unfinished jobs from a file."""
+    # Configure logging
+    logger = get_logger("load_jobs_utils")
 
-    os.makedirs(file_path.parent, exist_ok=True)
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+    try:
+        if not file_path.exists():
+            return []
+
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return [JobStateObject(**item) for item in data]
+    except (json.JSONDecodeError, TypeError) as e:
+        logger.error("Error loading job state: %s", e)
+        return []
 
-def load_current_dl(file_path: Path = Path(CURRENT_DL_FILE)) -> CurrentDLObject | None:
-    """Loads the current download GID from a file."""
-    if not file_path.exists():
+def _save_jobs(jobs: list[JobStateObject], file_path: Path = Path(JOB_STATE_FILE)):
+    """Atomically writes the state of all unfinished jobs to a file."""
+    os.makedirs(file_path.parent, exist_ok=True)
+    tmp_path = file_path.with_name(f"{file_path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(jobs, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, file_path)
+
+def create_job(file_path: Path = Path(JOB_STATE_FILE), **data) -> JobStateObject:
+    """Creates and saves the state of a new job, with a new ID unless `job_id` is given."""
+    job = JobStateObject(**{"job_id": uuid.uuid4().hex[:12], "stage": "queued", "updated_at": time.time(), **data})
+    jobs = load_jobs(file_path)
+    jobs.append(job)
+    _save_jobs(jobs, file_path)
+    return job
+
+def get_job(job_id: str, file_path: Path = Path(JOB_STATE_FILE)) -> JobStateObject | None:
+    """Retrieves the saved state of a job."""
+    return next((j for j in load_jobs(file_path) if j.job_id == job_id), None)
+
+def update_job(job_id: str, file_path: Path = Path(JOB_STATE_FILE), **changes) -> JobStateObject | None:
+    """Updates the saved state of a job (checkpoint) and returns the new state."""
+    jobs = load_jobs(file_path)
+    job = next((j for j in jobs if j.job_id == job_id), None)
+    if job is None:
         return None
 
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    return CurrentDLObject(**data)
+    updated = JobStateObject(**{**job, **changes, "updated_at": time.time()})
+    _save_jobs([updated if j.job_id == job_id else j for j in jobs], file_path)
+    return updated
+
+def remove_job(job_id: str, file_path: Path = Path(JOB_STATE_FILE)):
+    """Removes a finished, failed or cancelled job from the saved state."""
+    jobs = load_jobs(file_path)
+    remaining = [j for j in jobs if j.job_id != job_id]
+    if len(remaining) != len(jobs):
+        _save_jobs(remaining, file_path)
+
+def load_watch_index(file_path: Path = Path(WATCH_INDEX_FILE)) -> dict[str, WatchedFileObject]:
+    """Loads the processed files of the watch folder, by path."""
+    # Configure logging
+    logger = get_logger("load_watch_index_utils")
+
+    try:
+        if not file_path.exists():
+            return {}
+
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return {item["path"]: WatchedFileObject(**item) for item in data}
+    except (json.JSONDecodeError, TypeError, KeyError) as e:
+        logger.error("Error loading watch index: %s", e)
+        return {}
+
+def save_watch_index(index: dict[str, WatchedFileObject], file_path: Path = Path(WATCH_INDEX_FILE)):
+    """Atomically writes the processed files of the watch folder to a file."""
+    os.makedirs(file_path.parent, exist_ok=True)
+    tmp_path = file_path.with_name(f"{file_path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(list(index.values()), f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, file_path)
+
+def load_retention_index(file_path: Path = Path(RETENTION_INDEX_FILE)) -> dict[str, RetainedDownloadObject]:
+    """Loads the retained downloads, by release key."""
+    # Configure logging
+    logger = get_logger("load_retention_index_utils")
+
+    try:
+        if not file_path.exists():
+            return {}
+
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return {item["key"]: RetainedDownloadObject(**item) for item in data}
+    except (json.JSONDecodeError, TypeError, KeyError) as e:
+        logger.error("Error loading retention index: %s", e)
+        return {}
 
-def clear_current_dl(file_path: Path = Path(CURRENT_DL_FILE)):
-    """Clears the current download file."""
-    if os.path.exists(file_path):
-        os.remove(file_path)
+def save_retention_index(index: dict[str, RetainedDownloadObject], file_path: Path = Path(RETENTION_INDEX_FILE)):
+    """Atomically writes the retained downloads to a file."""
+    os.makedirs(file_path.parent, exist_ok=True)
+    tmp_path = file_path.with_name(f"{file_path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(list(index.values()), f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, file_path)
 
 def load_allowed_channels(file_path: Path = Path(ALLOWED_CHANNELS_FILE)) -> AllowedChannelsType | None:
     """Loads the content of allowed channel IDs from a file."""
@@ -264,14 +460,15 @@ def get_user_queue(user_id: str, file_path: Path = Path(QUEUE_FILE)) -> QueueObj
     user_queue = next((item for item in data if item.user_id == user_id), None)
     return user_queue
 
-def save_queue(user_id: str, links: list, file_path: Path = Path(QUEUE_FILE), extraction_type: str = "all_without_audio") -> int:
+def save_queue(user_id: str, links: list, file_path: Path = Path(QUEUE_FILE), extraction_type: str = "all_without_audio", filters: str = "") -> int:
     """Saves the download queue to a file.
     
     Args:
         user_id: User ID
-        links: List of links (can be strings for backward compatibility) or list of dicts with {link, type}
+        links: List of links (can be strings for backward compatibility) or list of dicts with {link, type, filters}
         file_path: Path to queue file
         extraction_type: Default extraction type if links are strings
+        filters: Default track filter expression if links are strings
     """
     # Configure logging
     logger = get_logger("save_queue_utils")
@@ -280,11 +477,12 @@ def save_queue(user_id: str, links: list, file_path: Path = Path(QUEUE_FILE), ex
     normalized_links = []
     for link in links:
         if isinstance(link, str):
-            normalized_links.append({"link": link, "type": extraction_type})
+            normalized_links.append({"link": link, "type": extraction_type, "filters": filters})
         elif isinstance(link, dict):
             normalized_links.append({
                 "link": link.get("link", ""),
-                "type": link.get("type", extraction_type)
+                "type": link.get("type", extraction_type),
+                "filters": link.get("filters", filters)
             })
 
     # Load existing data
@@ -309,8 +507,9 @@ def save_queue(user_id: str, links: list, file_path: Path = Path(QUEUE_FILE), ex
             logger.info("Adding new user %s to queue with %d links.", user_id, added)
         # If found, update the links (avoid duplicates)
         else:
-            existing_link_urls = {item["link"] for item in user_queue.links}
-            new_items = [item for item in normalized_links if item["link"] not in existing_link_urls]
+            # Same source, or a .torrent link already resolved to the infohash of a magnet (see get_known_link_key)
+            existing_link_keys = {get_known_link_key(item["link"]) for item in user_queue.links}
+            new_items = [item for item in normalized_links if get_known_link_key(item["link"]) not in existing_link_keys]
             new_links = user_queue.links + new_items
             added = len(new_items)
             data = [item for item in data if item.user_id != user_id]  # Remove old entry
@@ -336,9 +535,9 @@ def remove_from_queue(user_id: str, links: list[str], file_path: Path = Path(QUE
     # Remove the user's links from their queue
     user_queue = next((item for item in data if item.user_id == user_id), None)
     if user_queue is not None:
-        # Extract just the link URLs for comparison
-        links_to_remove = set(links)
-        new_links = [item for item in user_queue.links if item.get("link", item) not in links_to_remove]
+        # Compare the sources the links point to, not their exact text (see get_known_link_key)
+        links_to_remove = {get_known_link_key(link) for link in links}
+        new_links = [item for item in user_queue.links if get_known_link_key(item.get("link", item)) not in links_to_remove]
         difference = len(user_queue.links) - len(new_links)
         
         # If the user's queue is empty, remove it
@@ -0,0 +1,361 @@
+"""Identification module, compact records of the mkvmerge identification output and its streaming parser."""
+
+import json
+import re
+from typing import IO, Iterator
+
+# Characters read from the mkvmerge output at a time
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Body of a string after its opening quote, up to and including the closing quote
+_STRING_BODY = re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_LITERAL = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null")
+_STRUCTURAL = re.compile(r'[\[\]{}"]')
+# Characters that can follow the part of a number matched so far
+_NUMBER_CHARS = frozenset("0123456789.eE+-")
+
+class JsonStreamReader:
+    """
+    Pull parser of a JSON text stream, building only the values it is asked for.
+
+    Only the unread part of the current chunk is buffered, and skipped values (tags, unused
+    properties) are scanned past with regular expressions without creating any object.
+    """
+    def __init__(self, stream: IO[str], chunk_size: int = CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.consumed = 0
+
+    consumed: int
+    """Characters read from the stream so far."""
+
+    def _fill(self) -> bool:
+        """Reads the next chunk, dropping the parsed part of the buffer. Returns False at the end of the stream."""
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.consumed += len(chunk)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _error(self, message: str) -> ValueError:
+        return ValueError(f"{message} at character {self.consumed - len(self.buffer) + self.pos}")
+
+    def peek(self) -> str:
+        """Returns the next non-whitespace character without consuming it, "" at the end of the stream."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        """Consumes the next non-whitespace character, which must be `char`."""
+        if self.peek() != char:
+            raise self._error(f"Expected {char!r}")
+        self.pos += 1
+
+    def _match_string_body(self) -> re.Match:
+        while True:
+            match = _STRING_BODY.match(self.buffer, self.pos)
+            if match is not None:
+                self.pos = match.end()
+                return match
+            if not self._fill():
+                raise self._error("Unterminated string")
+
+    def read_string(self) -> str:
+        """Parses the next value, which must be a string."""
+        self.expect('"')
+        raw = self._match_string_body().group()
+        return json.loads(f'"{raw}') if "\\" in raw else raw[:-1]
+
+    def _read_literal(self):
+        while True:
+            match = _LITERAL.match(self.buffer, self.pos)
+            # A number at the end of the buffer, or cut after its "." or exponent, may continue in the next chunk
+            if match is not None and match.end() < len(self.buffer) and self.buffer[match.end()] not in _NUMBER_CHARS:
+                break
+            if not self._fill():
+                if match is None:
+                    raise self._error("Invalid value")
+                break
+        self.pos = match.end()
+        return json.loads(match.group())
+
+    def read_value(self):
+        """Parses the next value into Python objects."""
+        char = self.peek()
+        if char == "{":
+            return {key: self.read_value() for key in self.iter_object()}
+        if char == "[":
+            return [self.read_value() for _ in self.iter_array()]
+        if char == '"':
+            return self.read_string()
+        return self._read_literal()
+
+    def skip_value(self):
+        """Skips the next value without building it."""
+        char = self.peek()
+        if char == '"':
+            self.pos += 1
+            self._match_string_body()
+            return
+        if char not in ("{", "["):
+            self._read_literal()
+            return
+
+        depth = 0
+        while True:
+            match = _STRUCTURAL.search(self.buffer, self.pos)
+            if match is None:
+                self.pos = len(self.buffer)
+                if not self._fill():
+                    raise self._error("Unterminated value")
+                continue
+            self.pos = match.end()
+            char = match.group()
+            if char == '"':
+                self._match_string_body()
+            elif char in ("{", "["):
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def iter_object(self) -> Iterator[str]:
+        """Yields the keys of the next object, the caller reads or skips the value of each key."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_string()
+            self.expect(":")
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise self._error("Expected ',' or '}'")
+
+    def iter_array(self) -> Iterator[None]:
+        """Yields once per item of the next array, the caller reads or skips each item."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise self._error("Expected ',' or ']'")
+
+#region Records
+# mkvmerge track properties kept in the Track records, by record field
+TRACK_PROPERTIES = {
+    "codec_id": "codec_id",
+    "language": "language",
+    "language_ietf": "language_ietf",
+    "track_name": "name",
+    "default_track": "default",
+    "forced_track": "forced",
+    "pixel_dimensions": "pixel_dimensions",
+    "audio_channels": "audio_channels",
+    "audio_sampling_frequency": "audio_sampling_frequency",
+    # Statistics tag written by mkvmerge, e.g. "tag_number_of_bytes": "123456"
+    "tag_number_of_bytes": "size",
+}
+CONTAINER_PROPERTIES = ("title", "duration", "muxing_application", "writing_application")
+
+class Track:
+    """A track of a Matroska file, with the fields read by the extractors, track filters and reports."""
+    __slots__ = (
+        "id", "type", "codec", "codec_id", "language", "language_ietf", "name", "default", "forced",
+        "pixel_dimensions", "audio_channels", "audio_sampling_frequency", "size",
+    )
+
+    def __init__(self, id: int, type: str, codec: str = "", codec_id: str = "", language: str = "und", language_ietf: str = "", name: str = "", default: bool = False, forced: bool = False, pixel_dimensions: str = "", audio_channels: int | None = None, audio_sampling_frequency: int | None = None, size: int | None = None):
+        self.id = id
+        self.type = type
+        self.codec = codec
+        self.codec_id = codec_id
+        self.language = language
+        self.language_ietf = language_ietf
+        self.name = name
+        self.default = default
+        self.forced = forced
+        self.pixel_dimensions = pixel_dimensions
+        self.audio_channels = audio_channels
+        self.audio_sampling_frequency = audio_sampling_frequency
+        self.size = size
+
+    id: int
+    type: str
+    """video, audio or subtitles."""
+    size: int | None
+    """Bytes of the track's frames from the statistics tags, None if the file has none."""
+
+    @classmethod
+    def from_dict(cls, track: dict) -> "Track":
+        """Builds a record from a track of an mkvmerge-like identification dict."""
+        properties = track.get("properties", {}) or {}
+        fields = {field: properties[name] for name, field in TRACK_PROPERTIES.items() if properties.get(name) is not None}
+        if "size" in fields:
+            fields["size"] = int(fields["size"])
+        return cls(id=track["id"], type=track.get("type", ""), codec=track.get("codec", ""), **fields)
+
+    def __repr__(self) -> str:
+        return f"Track(id={self.id}, type={self.type!r}, codec={self.codec!r}, language={self.language!r})"
+
+class Attachment:
+    """An attachment of a Matroska file."""
+    __slots__ = ("id", "file_name", "content_type", "size")
+
+    def __init__(self, id: int, file_name: str = "", content_type: str = "", size: int = 0):
+        self.id = id
+        self.file_name = file_name
+        self.content_type = content_type
+        self.size = size
+
+    @classmethod
+    def from_dict(cls, attachment: dict) -> "Attachment":
+        return cls(
+            id=attachment["id"], file_name=attachment.get("file_name", ""),
+            content_type=attachment.get("content_type", ""), size=attachment.get("size", 0)
+        )
+
+    def __repr__(self) -> str:
+        return f"Attachment(id={self.id}, file_name={self.file_name!r})"
+
+class ChapterSet:
+    """An edition of the chapters of a Matroska file."""
+    __slots__ = ("num_entries",)
+
+    def __init__(self, num_entries: int = 0):
+        self.num_entries = num_entries
+
+    def __repr__(self) -> str:
+        return f"ChapterSet(num_entries={self.num_entries})"
+
+class Identification:
+    """
+    Compact identification of a Matroska file, a few hundred bytes per track instead of the whole
+    mkvmerge output. `attachments` and `chapters` are None when they are unknown (track layouts
+    read from the head of a file).
+    """
+    __slots__ = (
+        "container_type", "title", "duration", "muxing_application", "writing_application",
+        "tracks", "attachments", "chapters",
+    )
+
+    def __init__(self, container_type: str = "Matroska", tracks: list[Track] | None = None, attachments: list[Attachment] | None = None, chapters: list[ChapterSet] | None = None, title: str = "", duration: int | None = None, muxing_application: str = "", writing_application: str = ""):
+        self.container_type = container_type
+        self.title = title
+        self.duration = duration
+        self.muxing_application = muxing_application
+        self.writing_application = writing_application
+        self.tracks = tracks or []
+        self.attachments = attachments
+        self.chapters = chapters
+
+    duration: int | None
+    """Duration in nanoseconds."""
+
+    @property
+    def chapter_count(self) -> int:
+        """Number of chapters of every edition."""
+        return sum(chapter_set.num_entries for chapter_set in self.chapters or [])
+
+    @classmethod
+    def from_dict(cls, info: dict) -> "Identification":
+        """Builds the records of an mkvmerge-like identification dict (mkvmerge -J, or a parsed file head)."""
+        container = info.get("container", {}) or {}
+        properties = container.get("properties", {}) or {}
+        return cls(
+            container_type=container.get("type", "Matroska"),
+            tracks=[Track.from_dict(track) for track in info.get("tracks", [])],
+            attachments=[Attachment.from_dict(a) for a in info["attachments"]] if "attachments" in info else None,
+            chapters=[ChapterSet(c.get("num_entries", 0)) for c in info["chapters"]] if "chapters" in info else None,
+            **{name: properties[name] for name in CONTAINER_PROPERTIES if properties.get(name) is not None},
+        )
+
+    def __repr__(self) -> str:
+        return f"Identification(tracks={self.tracks!r}, attachments={len(self.attachments or [])}, chapters={self.chapter_count})"
+#endregion
+
+#region Streaming parse
+def _read_fields(reader: JsonStreamReader, fields: dict[str, str]) -> dict:
+    """Reads the listed keys of the next object (key to field name), skipping the others."""
+    values = {}
+    for key in reader.iter_object():
+        if key in fields:
+            values[fields[key]] = reader.read_value()
+        else:
+            reader.skip_value()
+    return values
+
+def _read_track(reader: JsonStreamReader) -> Track:
+    fields = {}
+    for key in reader.iter_object():
+        if key in ("id", "type", "codec"):
+            fields[key] = reader.read_value()
+        elif key == "properties":
+            fields.update(_read_fields(reader, TRACK_PROPERTIES))
+        else:
+            reader.skip_value()
+    if not isinstance(fields.get("id"), int) or not isinstance(fields.get("type"), str):
+        raise ValueError(f"Invalid track in identification output: {fields}")
+    if fields.get("size") is not None:
+        fields["size"] = int(fields["size"])
+    return Track(**{field: value for field, value in fields.items() if value is not None})
+
+def _read_attachment(reader: JsonStreamReader) -> Attachment:
+    fields = _read_fields(reader, {"id": "id", "file_name": "file_name", "content_type": "content_type", "size": "size"})
+    if not isinstance(fields.get("id"), int):
+        raise ValueError(f"Invalid attachment in identification output: {fields}")
+    return Attachment(**{field: value for field, value in fields.items() if value is not None})
+
+def read_identification(reader: JsonStreamReader) -> Identification:
+    """
+    Parses an mkvmerge identification output (mkvmerge -J) as it streams in, keeping only the fields
+    of the records. Tags, unused track properties and the other top-level keys are skipped unparsed.
+
+    Raises:
+        ValueError: If the output is not valid JSON or a track or attachment has no ID or type.
+    """
+    info = Identification()
+    for key in reader.iter_object():
+        if key == "container":
+            for container_key in reader.iter_object():
+                if container_key == "type":
+                    info.container_type = reader.read_string()
+                elif container_key == "properties":
+                    for name, value in _read_fields(reader, {name: name for name in CONTAINER_PROPERTIES}).items():
+                        setattr(info, name, value)
+                else:
+                    reader.skip_value()
+        elif key == "tracks":
+            info.tracks = [_read_track(reader) for _ in reader.iter_array()]
+        elif key == "attachments":
+            info.attachments = [_read_attachment(reader) for _ in reader.iter_array()]
+        elif key == "chapters":
+            info.chapters = [ChapterSet(_read_fields(reader, {"num_entries": "num_entries"}).get("num_entries") or 0) for _ in reader.iter_array()]
+        else:
+            reader.skip_value()
+    return info
+#endregion
@@ -0,0 +1,114 @@
+"""I/O control module, page cache hints for the source files and CPU and I/O priorities of threads and tools."""
+
+import ctypes
+import ctypes.util
+import os
+import subprocess
+from functools import cache
+
+from config import PAGE_CACHE_HINTS, PREFETCH_BYTES, TOOL_PRIORITIES
+from utils.logger import get_logger
+
+# Configure logging
+logger = get_logger("io_control")
+
+# ioprio_set(2) arguments (Linux only)
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+IO_CLASSES = {"best-effort": 2, "idle": 3}
+# Priority levels of the best-effort class, from 0 (highest) to 7 (lowest), unused by the idle class
+IOPRIO_DEFAULT_LEVEL = 4
+IOPRIO_LOWEST_LEVEL = 7
+SYS_IOPRIO_SET = {"x86_64": 251, "aarch64": 30}
+
+@cache
+def _get_libc() -> ctypes.CDLL:
+    return ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+
+def set_priority(thread_id: int, niceness: int = 0, io_class: str = "", io_level: int = IOPRIO_DEFAULT_LEVEL):
+    """
+    Sets the CPU and I/O priority of a thread or process, both are per thread on Linux and inherited
+    by the threads it starts afterwards. Best effort: unsupported platforms and classes are logged and ignored.
+
+    Args:
+        thread_id (int): The native thread id, or the pid of a process (its main thread).
+        niceness (int): The niceness, 0 leaves it unchanged.
+        io_class (str): best-effort or idle, anything else leaves the I/O priority unchanged.
+        io_level (int): The level within the best-effort class.
+    """
+    if niceness:
+        try:
+            os.setpriority(os.PRIO_PROCESS, thread_id, niceness)
+        except (AttributeError, OSError) as e:
+            logger.debug("Could not set the niceness of %d: %s", thread_id, e)
+
+    if io_class not in IO_CLASSES:
+        return
+    syscall = SYS_IOPRIO_SET.get(os.uname().machine)
+    if syscall is None:
+        logger.debug("I/O priority not supported on %s.", os.uname().machine)
+        return
+    priority = (IO_CLASSES[io_class] << IOPRIO_CLASS_SHIFT) | min(max(io_level, 0), IOPRIO_LOWEST_LEVEL)
+    if _get_libc().syscall(syscall, IOPRIO_WHO_PROCESS, thread_id, priority) != 0:
+        logger.debug("Could not set the I/O priority of %d: %s", thread_id, os.strerror(ctypes.get_errno()))
+
+def set_stage_priority(pid: int, stage: str):
+    """Applies the TOOL_PRIORITIES entry of a stage (identify, mediainfo, extract) to a tool's process."""
+    settings = TOOL_PRIORITIES.get(stage)
+    if settings:
+        set_priority(
+            pid, int(settings.get("nice", 0)), str(settings.get("io_class", "")).lower(),
+            int(settings.get("io_level", IOPRIO_DEFAULT_LEVEL))
+        )
+
+def run_tool(cmd: list[str], stage: str, capture_output: bool = False, text: bool = False, check: bool = True) -> subprocess.CompletedProcess:
+    """
+    Runs a tool like subprocess.run, with the priority of its stage applied as soon as it started.
+
+    The priority is not set from a preexec_fn, which is unsafe in the threads the extraction runs
+    in, so the tool runs its first instructions with the priority of the bot.
+    """
+    pipe = subprocess.PIPE if capture_output else None
+    with subprocess.Popen(cmd, stdout=pipe, stderr=pipe, text=text) as process:
+        set_stage_priority(process.pid, stage)
+        try:
+            stdout, stderr = process.communicate()
+        except BaseException:
+            process.kill()
+            raise
+    if check and process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+def advise(filepath: str, advice: int, offset: int = 0, length: int = 0):
+    """
+    Gives the kernel a posix_fadvise hint about a range of a file (0 length is up to the end).
+    Best effort: a disabled, unsupported or failed hint is ignored.
+    """
+    if not PAGE_CACHE_HINTS or not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(filepath, os.O_RDONLY)
+    except OSError as e:
+        logger.debug("Could not open %s for a page cache hint: %s", filepath, e)
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError as e:
+        logger.debug("Page cache hint %d failed on %s: %s", advice, filepath, e)
+    finally:
+        os.close(fd)
+
+def prefetch_head(filepath: str):
+    """
+    Starts reading the head of a source file (its headers, cues and first clusters) into the page
+    cache in the background, before the tools read it. Only the head, prefetching a whole multi-GB
+    file would evict the rest of the cache.
+    """
+    if PREFETCH_BYTES > 0 and hasattr(os, "POSIX_FADV_WILLNEED"):
+        advise(filepath, os.POSIX_FADV_WILLNEED, 0, PREFETCH_BYTES)
+
+def drop_cache(filepath: str):
+    """Drops the cached pages of a source file the tools are done reading, it is never read again."""
+    if hasattr(os, "POSIX_FADV_DONTNEED"):
+        advise(filepath, os.POSIX_FADV_DONTNEED)
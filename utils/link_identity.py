@@ -0,0 +1,184 @@
+"""Link identity module, mapping the links of a release to a canonical key."""
+
+import asyncio
+import base64
+import hashlib
+import re
+from collections import OrderedDict
+from urllib.parse import parse_qs, parse_qsl, quote, urlencode, urlsplit, urlunsplit
+
+import aiohttp
+
+from config import LINK_RESOLVE_TIMEOUT
+from utils.logger import get_logger
+
+# Configure logging
+logger = get_logger("link_identity")
+
+# Ports dropped from normalized URLs
+DEFAULT_PORTS = {"http": 80, "https": 443, "ftp": 21}
+# Query parameters that never change the file a link points to
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid")
+# Larger .torrent files are not fetched to compute their infohash
+MAX_TORRENT_FILE_SIZE = 10 * 1024 * 1024
+
+NYAA_PATTERN = re.compile(r"https?://(?:www\.)?nyaa\.si/(?:view|download)/(?P<id>\d+)(?:\.torrent)?/?$", re.IGNORECASE)
+
+# Infohashes of the .torrent links resolved so far, by normalized URL
+_resolved: OrderedDict[str, str] = OrderedDict()
+_RESOLVED_SIZE = 1024
+
+def get_magnet_key(url: str) -> str | None:
+    """Returns "btih:<hex infohash>" (or "btmh:<multihash>" for v2-only magnets), None if the magnet has no hash."""
+    topics = parse_qs(urlsplit(url).query).get("xt", [])
+    for topic in topics:
+        if topic.lower().startswith("urn:btih:"):
+            infohash = topic[9:]
+            # 32 characters hashes are base32 encoded
+            if len(infohash) == 32:
+                try:
+                    return f"btih:{base64.b32decode(infohash.upper()).hex()}"
+                except ValueError:
+                    return None
+            if len(infohash) == 40:
+                return f"btih:{infohash.lower()}"
+    for topic in topics:
+        if topic.lower().startswith("urn:btmh:"):
+            return f"btmh:{topic[9:].lower()}"
+    return None
+
+def normalize_url(url: str) -> str:
+    """
+    Normalizes a direct link: lowercase scheme and host, no default port, credentials or fragment,
+    consistent percent-encoding, and sorted query parameters without the tracking ones.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and DEFAULT_PORTS.get(scheme) != port:
+        host = f"{host}:{port}"
+    path = quote(parts.path, safe="/%:@!$&'()*+,;=-._~") or "/"
+    path = re.sub(r"%[0-9a-fA-F]{2}", lambda escape: escape.group().upper(), path)
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.lower().startswith(TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+def get_link_key(url: str) -> str:
+    """
+    Returns the canonical key of a link without any network call: the infohash of magnets,
+    the torrent ID of nyaa.si links and the normalized URL of the other links.
+    """
+    url = url.strip()
+    if url.lower().startswith("magnet:"):
+        return get_magnet_key(url) or url
+    match = NYAA_PATTERN.match(url)
+    if match:
+        return f"nyaa:{match.group('id')}"
+    return f"url:{normalize_url(url)}"
+
+def _bencode_end(data: bytes, i: int) -> int:
+    """
+    Returns the offset right after the bencoded value starting at `i`. Walks the nested lists and
+    dictionaries with a depth counter rather than recursion, a crafted file may nest thousands of them.
+    """
+    depth = 0
+    while True:
+        prefix = data[i:i + 1]
+        if prefix == b"i":
+            i = data.index(b"e", i) + 1
+        elif prefix in (b"l", b"d"):
+            depth += 1
+            i += 1
+        elif prefix == b"e" and depth:
+            depth -= 1
+            i += 1
+        elif prefix.isdigit():
+            colon = data.index(b":", i)
+            i = colon + 1 + int(data[i:colon])
+            if i > len(data):
+                raise ValueError("Truncated bencoded data")
+        elif not prefix and depth:
+            raise ValueError("Truncated bencoded data")
+        else:
+            raise ValueError(f"Invalid bencoded data at offset {i}")
+        if not depth:
+            return i
+
+def get_torrent_infohash(data: bytes) -> str:
+    """Returns the hex infohash of a .torrent file, the SHA-1 of its bencoded info dictionary."""
+    if data[:1] != b"d":
+        raise ValueError("Not a torrent file")
+    i = 1
+    while data[i:i + 1] != b"e":
+        key_end = _bencode_end(data, i)
+        key = data[data.index(b":", i) + 1:key_end]
+        value_end = _bencode_end(data, key_end)
+        if key == b"info":
+            return hashlib.sha1(data[key_end:value_end]).hexdigest()
+        i = value_end
+    raise ValueError("The torrent file has no info dictionary")
+
+async def fetch_torrent_infohash(url: str) -> str | None:
+    """Downloads a .torrent file and returns its infohash, None if it could not be read."""
+    try:
+        timeout = aiohttp.ClientTimeout(total=LINK_RESOLVE_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.get(url) as response:
+                response.raise_for_status()
+                if (response.content_length or 0) > MAX_TORRENT_FILE_SIZE:
+                    return None
+                data = await response.content.read(MAX_TORRENT_FILE_SIZE + 1)
+        if len(data) > MAX_TORRENT_FILE_SIZE:
+            return None
+        return get_torrent_infohash(data)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        logger.warning("Could not read the infohash of %s: %s", url, e)
+        return None
+
+def _get_torrent_url(key: str) -> str | None:
+    """Returns the .torrent file a link key points to, None for the other links."""
+    if key.startswith("nyaa:"):
+        return f"https://nyaa.si/download/{key[5:]}.torrent"
+    if key.startswith("url:") and urlsplit(key[4:]).path.lower().endswith(".torrent"):
+        return key[4:]
+    return None
+
+def get_known_link_key(url: str) -> str:
+    """
+    Returns the canonical key of a link without any network call, the "btih:" key of the .torrent
+    links (nyaa.si links included) already resolved by `resolve_link_key`, else `get_link_key`.
+    A .torrent link and a magnet of the same release only match once the link was resolved.
+    """
+    key = get_link_key(url)
+    torrent_url = _get_torrent_url(key)
+    if torrent_url is None:
+        return key
+    return _resolved.get(torrent_url, key)
+
+async def resolve_link_key(url: str) -> str:
+    """
+    Returns the canonical key of a link, fetching .torrent files (nyaa.si links included) so they
+    share the "btih:" key of the magnets of the same release. Falls back to `get_link_key`.
+    """
+    key = get_link_key(url)
+    torrent_url = _get_torrent_url(key)
+    if torrent_url is None:
+        return key
+
+    if torrent_url in _resolved:
+        _resolved.move_to_end(torrent_url)
+        return _resolved[torrent_url]
+    infohash = await fetch_torrent_infohash(torrent_url)
+    if infohash is None:
+        return key
+    _resolved[torrent_url] = f"btih:{infohash}"
+    if len(_resolved) > _RESOLVED_SIZE:
+        _resolved.popitem(last=False)
+    logger.info("Resolved %s to infohash %s", torrent_url, infohash)
+    return _resolved[torrent_url]
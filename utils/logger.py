@@ -1,14 +1,134 @@
 """Logger utility module."""
 
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+
+from config import LOG_FILE, LOG_LEVEL
+
+# Correlation fields attached to every record
+CONTEXT_FIELDS = ("job_id", "user_id", "guild_id", "gid", "stage")
+
+# Correlation fields of the running job, copied into every asyncio task it starts
+_log_context: ContextVar[dict] = ContextVar("log_context", default={})
+
+# Span events are DEBUG records of this logger, written to the JSON log but kept off the console
+trace_logger = logging.getLogger("trace")
+
+_listener: logging.handlers.QueueListener | None = None
+
+class ContextFilter(logging.Filter):
+    """Adds the correlation fields of the current job to the records."""
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _log_context.get()
+        for field in CONTEXT_FIELDS:
+            if getattr(record, field, None) is None:
+                setattr(record, field, context.get(field))
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as JSON lines, one event per line."""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if getattr(record, "event", None):
+            entry["event"] = record.event
+            entry["span"] = getattr(record, "span", None)
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info and not record.exc_text:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def _configure():
+    """Routes every record through a queue to the console and JSON log handlers, once per process."""
+    global _listener
+    if _listener is not None:
+        return
+
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(LOG_LEVEL)
+    console_handler.setFormatter(logging.Formatter(
+        datefmt='%d-%m-%Y %H:%M:%S',
+        fmt='[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s'
+    ))
+    handlers: list[logging.Handler] = [console_handler]
+
+    if LOG_FILE:
+        os.makedirs(os.path.dirname(os.path.abspath(LOG_FILE)), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=50 * 1024 * 1024, backupCount=5, encoding="utf-8"
+        )
+        file_handler.setLevel(logging.DEBUG)
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    # Handlers run on the listener thread, so a slow disk never blocks the event loop
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(queue_handler)
+    trace_logger.setLevel(logging.DEBUG)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
 
 def get_logger(name: str) -> logging.Logger:
     """Returns a logger with the specified name."""
     # Configure logging
-    logging.basicConfig(
-        level=logging.INFO,
-        datefmt='%d-%m-%Y %H:%M:%S',
-        format='[%(asctime)s] [%(levelname)s] [%(name)s] %(message)s'
-    )
+    _configure()
     logger = logging.getLogger(name)
     return logger
+
+def set_log_context(**fields) -> Token:
+    """Sets correlation fields (job_id, user_id, guild_id, gid, stage) for the current task."""
+    return _log_context.set({**_log_context.get(), **fields})
+
+def reset_log_context(token: Token):
+    """Restores the correlation fields saved by `set_log_context`."""
+    _log_context.reset(token)
+
+@contextmanager
+def span(name: str, **fields):
+    """
+    Logs a start and an end trace event around an operation, with its duration.
+
+    The yielded dict can be filled with result fields (e.g. "bytes") added to the end event.
+    """
+    _configure()
+    result: dict = {}
+    trace_logger.debug("%s started", name, extra={"event": "span_start", "span": name, "fields": fields})
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield result
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        trace_logger.debug(
+            "%s finished in %.3fs", name, duration,
+            extra={
+                "event": "span_end",
+                "span": name,
+                "fields": {**fields, **result, "duration_ms": round(duration * 1000, 3), "status": status},
+            }
+        )
@@ -0,0 +1,210 @@
+"""Metrics module exposing job, stage and resource metrics in the Prometheus text format."""
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+from utils.logger import get_logger
+
+# Configure logging
+logger = get_logger("metrics")
+
+# Stage duration buckets, from a quick mkvextract call to a long download (seconds)
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: dict | None = None) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(str(value))}"' for name, value in (extra or {}).items())
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    """Base class of the metrics, holding one value per label set."""
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> list[str]:
+        """Returns the exposition lines of the metric samples."""
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in self._values.items()]
+
+    def render(self) -> str:
+        """Renders the metric in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    """Monotonically increasing counter."""
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        """Increments the counter."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """Value that can go up and down, optionally computed at scrape time."""
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), callback: Callable[[], float] | None = None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        """Sets the gauge."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        """Increments the gauge."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        """Decrements the gauge."""
+        self.inc(-amount, **labels)
+
+    def samples(self) -> list[str]:
+        if self.callback is not None:
+            try:
+                self.set(self.callback())
+            except Exception as e:
+                logger.warning("Failed to collect gauge %s: %s", self.name, e)
+        return super().samples()
+
+class Histogram(Metric):
+    """Histogram of observed values with cumulative buckets."""
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        self._observations: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        """Records an observation."""
+        key = self._key(labels)
+        with self._lock:
+            # [bucket counts, sum, count]
+            observation = self._observations.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    observation[0][i] += 1
+            observation[1] += value
+            observation[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the wall time of the wrapped block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> list[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in self._observations.items():
+                for bound, bucket_count in zip(self.buckets, counts):
+                    labels = _format_labels(self.labelnames, key, {"le": bound})
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                labels = _format_labels(self.labelnames, key, {"le": "+Inf"})
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Registry:
+    """Collection of the metrics exposed on the /metrics endpoint."""
+    def __init__(self):
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        """Adds a metric to the registry."""
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Renders every metric in the Prometheus text format."""
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+registry = Registry()
+
+STAGE_DURATION: Histogram = registry.register(Histogram(
+    "subxtract_stage_duration_seconds",
+    "Duration of the job stages (metadata, download, identify, extract, mediainfo, zip, split, upload, job).",
+    ("stage",)
+))
+DOWNLOADED_BYTES: Counter = registry.register(Counter(
+    "subxtract_downloaded_bytes_total", "Bytes downloaded by Aria2 for completed downloads."
+))
+EXTRACTED_BYTES: Counter = registry.register(Counter(
+    "subxtract_extracted_bytes_total", "Bytes written by mkvextract, by extracted item type.", ("type",)
+))
+UPLOADED_BYTES: Counter = registry.register(Counter(
+    "subxtract_uploaded_bytes_total", "Bytes of result files uploaded to Discord."
+))
+JOBS: Counter = registry.register(Counter(
+    "subxtract_jobs_total", "Finished jobs by outcome (completed, failed, interrupted).", ("outcome",)
+))
+ACTIVE_JOBS: Gauge = registry.register(Gauge(
+    "subxtract_active_jobs", "Jobs currently downloading or extracting."
+))
+STALLED_DOWNLOADS: Counter = registry.register(Counter(
+    "subxtract_stalled_downloads_total", "Stalled downloads by action (requeued, kept, aborted).", ("action",)
+))
+RETENTION_LOOKUPS: Counter = registry.register(Counter(
+    "subxtract_retention_lookups_total", "Jobs looking for a retained download of their release, by result (hit, miss).", ("result",)
+))
+
+LOOP_LAG: Histogram = registry.register(Histogram(
+    "subxtract_event_loop_lag_seconds", "Event loop scheduling delay measured by the watchdog heartbeat.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+))
+LOOP_BLOCKED: Counter = registry.register(Counter(
+    "subxtract_event_loop_blocked_total", "Times the event loop was blocked longer than the watchdog threshold."
+))
+
+def register_gauge_callback(name: str, documentation: str, callback: Callable[[], float]) -> Gauge:
+    """Registers a gauge whose value is computed when the metrics are scraped."""
+    return registry.register(Gauge(name, documentation, callback=callback))
+
+async def _handle_metrics(_request: "web.Request") -> "web.Response":
+    from aiohttp import web
+
+    # Gauge callbacks may do blocking I/O (Aria2 RPC, queue file), keep them off the event loop
+    body = await asyncio.get_running_loop().run_in_executor(None, registry.render)
+    return web.Response(text=body, content_type="text/plain", charset="utf-8", headers={"X-Content-Type-Options": "nosniff"})
+
+async def start_metrics_server(host: str, port: int) -> "web.AppRunner":
+    """Starts the HTTP server exposing the /metrics endpoint."""
+    # Only the bot serves the metrics, the CLI and the workers never import the web server
+    from aiohttp import web
+
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Metrics endpoint listening on http://%s:%d/metrics", host, port)
+    return runner
@@ -2,15 +2,21 @@
 
 import subprocess
 import os
+import threading
 import json
+from collections import OrderedDict
+from functools import cache
 from pathlib import Path
 import zipfile
 
-from jsonschema import validate, ValidationError
-from config import SCHEMAS_DIR, EXTRACT_DIR
+from config import SCHEMAS_DIR, EXTRACT_DIR, IDENTIFICATION_CACHE_SIZE
 from gen_types import mkvmerge_return_type
 from utils.file_utils import create_split_zip
-from utils.logger import get_logger
+from utils.identification import Identification, JsonStreamReader, Track, read_identification
+from utils.io_control import prefetch_head, run_tool, set_stage_priority
+from utils.logger import get_logger, span
+from utils.metrics import STAGE_DURATION, EXTRACTED_BYTES
+from utils.track_filter import TrackFilter
 
 # Define logger
 logger = get_logger("mkv_service")
@@ -31,34 +37,235 @@ class MKVExtractReturnType(dict):
     count: int
     """Count of extracted items."""
 
-# Load MKV merge JSON schema
-mkvmerge_schema: dict = {}
-schema_path = os.path.join(SCHEMAS_DIR, "mkvmerge_schema.json")
-with open(schema_path, "r", encoding="utf-8") as schema_file:
-    mkvmerge_schema = json.load(schema_file)
+# Zips larger than Discord's upload limit are split into parts of this size
+SPLIT_SIZE = 10 * 1024 * 1024
+
+@cache
+def get_mkvmerge_schema() -> dict:
+    """Loads the mkvmerge JSON schema, on the first full identification."""
+    with open(os.path.join(SCHEMAS_DIR, "mkvmerge_schema.json"), "r", encoding="utf-8") as schema_file:
+        return json.load(schema_file)
+
+class FileInfoCache:
+    """
+    Small LRU cache of per-file results, invalidated when the file size or mtime changes.
+    Thread-safe, the CLI extracts several files at once.
+    """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple, object] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(filepath: str) -> tuple:
+        stat = os.stat(filepath)
+        return (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns)
+
+    def get(self, filepath: str):
+        """Returns the cached value for the file, or None if missing or stale."""
+        key = self._key(filepath)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, filepath: str, value):
+        """Caches a value for the current version of the file."""
+        key = self._key(filepath)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drops every cached value."""
+        with self._lock:
+            self._entries.clear()
+
+# Identification records and mediainfo outputs, so every extractor shares one mkvmerge/mediainfo run per file
+identification_cache = FileInfoCache(IDENTIFICATION_CACHE_SIZE)
+mediainfo_cache = FileInfoCache(IDENTIFICATION_CACHE_SIZE)
+
+def _format_size(size: int) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+        size /= 1024
+    return f"{size} B"
+
+def _format_duration(nanoseconds: int) -> str:
+    seconds, ms = divmod(nanoseconds // 1_000_000, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{ms:03d}"
+
+def _format_track_details(track: Track) -> str:
+    if track.type == "video" and track.pixel_dimensions:
+        return track.pixel_dimensions
+    if track.type == "audio":
+        channels = track.audio_channels
+        frequency = track.audio_sampling_frequency
+        return " ".join(part for part in (
+            f"{channels}ch" if channels else "", f"{frequency}Hz" if frequency else ""
+        ) if part)
+    return ""
+
+def format_track_table(info: Identification, details: bool = False) -> str:
+    """Formats the tracks of an identification output as a compact text table."""
+    lines = [f"{'ID':<3} {'Type':<9} {'Codec':<16} {'Lang':<5} {'Flags':<5} " + ("Details        Name" if details else "Name")]
+    for track in info.tracks:
+        flags = ("D" if track.default else "") + ("F" if track.forced else "")
+        line = (
+            f"{track.id:<3} {track.type:<9} {track.codec[:16]:<16} "
+            f"{track.language:<5} {flags:<5} "
+            + (f"{_format_track_details(track):<14} " if details else "")
+            + track.name[:32]
+        )
+        lines.append(line.rstrip())
+
+    if info.attachments is not None:
+        lines.append(f"Attachments: {len(info.attachments)}")
+    if info.chapters is not None:
+        lines.append(f"Chapters: {info.chapter_count}")
+    return "\n".join(lines)
+
+def format_media_report(info: Identification, filepath: str) -> str:
+    """Renders a lightweight media report from an identification output."""
+    lines = ["General", f"File name   : {os.path.basename(filepath)}"]
+    if os.path.exists(filepath):
+        lines.append(f"File size   : {_format_size(os.path.getsize(filepath))}")
+    lines.append(f"Container   : {info.container_type}")
+    if info.title:
+        lines.append(f"Title       : {info.title}")
+    if info.duration:
+        lines.append(f"Duration    : {_format_duration(info.duration)}")
+    if info.muxing_application:
+        lines.append(f"Muxing app  : {info.muxing_application}")
+    if info.writing_application:
+        lines.append(f"Writing app : {info.writing_application}")
+
+    lines.extend(["", "Tracks", format_track_table(
+        Identification(tracks=info.tracks), details=True
+    )])
+
+    attachments = info.attachments or []
+    if attachments:
+        lines.extend(["", f"Attachments ({len(attachments)})"])
+        lines.extend(
+            f"- {a.file_name} ({a.content_type or 'unknown'}, {_format_size(a.size)})"
+            for a in attachments
+        )
+
+    if info.chapter_count:
+        lines.extend(["", f"Chapters: {info.chapter_count}"])
+
+    lines.extend(["", "Built-in report, request the full MediaInfo report for every field."])
+    return "\n".join(lines)
 
 class MKVService:
     """Service class for MKV file operations."""
 
     @staticmethod
     def get_mediainfo(filepath: str):
-        """Retrieves information about the MKV file."""
+        """Retrieves information about the MKV file (cached per file version)."""
+        cached = mediainfo_cache.get(filepath)
+        if cached is not None:
+            return cached
+
         cmd = ["mediainfo", filepath]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        with STAGE_DURATION.time(stage="mediainfo"), span("mediainfo", file=os.path.basename(filepath)) as trace:
+            result = run_tool(cmd, "mediainfo", capture_output=True, text=True)
+            trace["bytes"] = len(result.stdout)
+        mediainfo_cache.set(filepath, result.stdout)
         return result.stdout
 
     @staticmethod
-    def get_mkv_formatted_info(filepath: str) -> MKVMergeReturnType | None:
-        """Retrieves formatted information about the MKV file."""
+    def get_media_report(filepath: str, full: bool = False) -> str:
+        """
+        Retrieves the media report of the MKV file.
+
+        Args:
+            filepath (str): The path to the MKV file.
+            full (bool): Run the external mediainfo tool instead of rendering the built-in report.
+
+        Returns:
+            str: The report text.
+        """
+        if full:
+            return MKVService.get_mediainfo(filepath)
+
+        info = MKVService.get_mkv_formatted_info(filepath)
+        if not info:
+            # Fall back to mediainfo when identification failed
+            return MKVService.get_mediainfo(filepath)
+        return format_media_report(info, filepath)
+
+    @staticmethod
+    def get_mkv_formatted_info(filepath: str, full: bool = False) -> Identification | MKVMergeReturnType | None:
+        """
+        Retrieves the identification of the MKV file.
+
+        The mkvmerge output is parsed as it streams in, keeping only the compact records of the
+        tracks, attachments and chapters (cached per file version).
+
+        Args:
+            filepath (str): The path to the MKV file.
+            full (bool): Return the whole mkvmerge output as a schema validated dict instead, not cached.
+
+        Returns:
+            Identification | MKVMergeReturnType | None: The identification, or None if mkvmerge failed.
+        """
+        if full:
+            return MKVService.get_mkv_full_info(filepath)
         try:
+            cached = identification_cache.get(filepath)
+            if cached is not None:
+                return cached
+
             cmd = ["mkvmerge", "-J", filepath]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            # The identification is the first read of a source file
+            prefetch_head(filepath)
+            with STAGE_DURATION.time(stage="identify"), span("mkvmerge_identify", file=os.path.basename(filepath)) as trace:
+                with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, encoding="utf-8") as process:
+                    set_stage_priority(process.pid, "identify")
+                    reader = JsonStreamReader(process.stdout)
+                    try:
+                        info = read_identification(reader)
+                    finally:
+                        # Drain the rest so mkvmerge never blocks on a full pipe
+                        process.stdout.read()
+                if process.returncode != 0:
+                    raise subprocess.CalledProcessError(process.returncode, cmd)
+                trace["bytes"] = reader.consumed
+            identification_cache.set(filepath, info)
+            return info
+        except (subprocess.CalledProcessError, OSError) as e:
+            print(f"Error retrieving MKV info: {e}")
+            return None
+        except ValueError as ve:
+            print(f"Invalid MKV info: {ve}")
+            return None
+
+    @staticmethod
+    def get_mkv_full_info(filepath: str) -> MKVMergeReturnType | None:
+        """Retrieves the whole mkvmerge identification output of the MKV file, validated against its schema."""
+        # jsonschema is only needed here, import it on first use to keep it out of the startup
+        from jsonschema import validate, ValidationError
+
+        try:
+            cmd = ["mkvmerge", "-J", filepath]
+            prefetch_head(filepath)
+            with STAGE_DURATION.time(stage="identify"), span("mkvmerge_identify", file=os.path.basename(filepath), full=True) as trace:
+                result = run_tool(cmd, "identify", capture_output=True, text=True)
+                trace["bytes"] = len(result.stdout)
             info = json.loads(result.stdout)
 
             # Validate against your JSON schema
-            validate(instance=info, schema=mkvmerge_schema)
+            validate(instance=info, schema=get_mkvmerge_schema())
             return info
-        except (subprocess.CalledProcessError, json.JSONDecodeError) as e:
+        except (subprocess.CalledProcessError, json.JSONDecodeError, OSError) as e:
             print(f"Error retrieving MKV info: {e}")
             return None
         except ValidationError as ve:
@@ -66,13 +273,15 @@ class MKVService:
             return None
 
     @staticmethod
-    def extract_subtitles(filepath: str, output_dir: Path = Path(EXTRACT_DIR)) -> MKVExtractReturnType | None:
+    def extract_subtitles(filepath: str, output_dir: Path = Path(EXTRACT_DIR), track_filter: TrackFilter | None = None, split_size: int = SPLIT_SIZE) -> MKVExtractReturnType | None:
         """
         Extracts subtitles from the MKV file to the specified output directory.
 
         Args:
             filepath (str): The path to the MKV file.
             output_dir (Path): The directory to save extracted subtitles.
+            track_filter (TrackFilter | None): Only extract the subtitle tracks selected by this filter.
+            split_size (int): Zips larger than this are split into parts of this size, 0 keeps a single zip.
 
         Returns:
             dict[str, Path|int] | None: A dictionary containing the paths of the extracted subtitle files and their count,
@@ -85,12 +294,18 @@ class MKVService:
             if not info:
                 return None
 
+            if track_filter:
+                selected_tracks = track_filter.select(info.tracks, "subtitles")
+                logger.info("Track filter selected %d subtitle tracks.", len(selected_tracks))
+            else:
+                selected_tracks = [t for t in info.tracks if t.type == "subtitles"]
+
             extracted_files = []
-            for s_id in info.get("tracks", []):
-                if s_id.get("type") == "subtitles":
+            for s_id in selected_tracks:
+                if s_id.type == "subtitles":
                     try:
-                        subtitle_codec = s_id.get("codec", "").strip()
-                        subtitle_language = s_id.get("properties", {}).get("language", "und")
+                        subtitle_codec = s_id.codec.strip()
+                        subtitle_language = s_id.language
 
                         # Determine extension based on codec
                         if subtitle_codec == "SubRip/SRT" or "srt" in subtitle_codec.lower():
@@ -105,35 +320,37 @@ class MKVService:
                         # Construct output path
                         out_path = os.path.join(
                             output_dir,
-                            f"subtitle_{s_id['id']}.{subtitle_language}.{extension}"
+                            f"subtitle_{s_id.id}.{subtitle_language}.{extension}"
                         )
 
                         # Command to extract subtitle track
-                        subprocess.run(
-                            ["mkvextract", filepath, "tracks", f"{s_id['id']}:{out_path}"], check=True
-                        )
+                        with STAGE_DURATION.time(stage="extract"), span("mkvextract", type="subtitles", track_id=s_id.id) as trace:
+                            run_tool(["mkvextract", filepath, "tracks", f"{s_id.id}:{out_path}"], "extract")
+                            trace["bytes"] = os.path.getsize(out_path)
+                        EXTRACTED_BYTES.inc(trace["bytes"], type="subtitles")
                         extracted_files.append(out_path)
                     except subprocess.CalledProcessError as extract_error:
-                        logger.warning("Failed to extract subtitle track %s, skipping: %s", s_id.get("id"), extract_error)
+                        logger.warning("Failed to extract subtitle track %s, skipping: %s", s_id.id, extract_error)
                         continue
                     except Exception as item_error:
-                        logger.warning("Error processing subtitle track %s, skipping: %s", s_id.get("id"), item_error)
+                        logger.warning("Error processing subtitle track %s, skipping: %s", s_id.id, item_error)
                         continue
 
             if not extracted_files:
                 return None
 
             zip_file_path = os.path.join(output_dir, "subtitles.zip")
-            with zipfile.ZipFile(zip_file_path, "w") as zipf:
+            with STAGE_DURATION.time(stage="zip"), zipfile.ZipFile(zip_file_path, "w") as zipf:
                 for file in extracted_files:
                     zipf.write(file, arcname=os.path.basename(file))
 
             # Check zip file size
             zip_file_size = os.path.getsize(zip_file_path)
-            if zip_file_size > 10 * 1024 * 1024:  # 10 MB limit
-                logger.warning("Subtitles zip file exceeds 10 MB, splitting...")
+            if split_size and zip_file_size > split_size:
+                logger.warning("Subtitles zip file exceeds %s bytes, splitting...", split_size)
                 try:
-                    split_files = create_split_zip(Path(zip_file_path), part_size=10 * 1024 * 1024)  # 10 MB parts
+                    with STAGE_DURATION.time(stage="split"):
+                        split_files = create_split_zip(Path(zip_file_path), part_size=split_size)
                     return MKVExtractReturnType(
                         paths=split_files,
                         count=len(extracted_files)
@@ -154,13 +371,14 @@ class MKVService:
             return None
 
     @staticmethod
-    def extract_attachments(filepath: str, output_dir: Path = Path(EXTRACT_DIR)) -> MKVExtractReturnType | None:
+    def extract_attachments(filepath: str, output_dir: Path = Path(EXTRACT_DIR), split_size: int = SPLIT_SIZE) -> MKVExtractReturnType | None:
         """
         Extracts attachments from the MKV file to the specified output directory.
         
         Args:
             filepath (str): The path to the MKV file.
             output_dir (Path): The directory to save extracted attachments.
+            split_size (int): Zips larger than this are split into parts of this size, 0 keeps a single zip.
 
         Returns:
             dict[str, Path|int] | None: A dictionary containing the path of the extracted attachments or
@@ -174,31 +392,31 @@ class MKVService:
                 return None
 
             extracted_files = []
-            for a_id in info.get("attachments", []):
+            for a_id in info.attachments or []:
                 try:
                     # Safely get content_type
-                    content_type = a_id.get("content_type", "").strip()
+                    content_type = a_id.content_type.strip()
                     
                     # Guess extension if not provided
-                    if a_id.get("content_type") == "application/font-sfnt":
+                    if content_type == "application/font-sfnt":
                         extension = "ttf"
-                    elif a_id.get("content_type") == "application/x-truetype-font":
+                    elif content_type == "application/x-truetype-font":
                         extension = "ttf"
-                    elif a_id.get("content_type") == "font/ttf":
+                    elif content_type == "font/ttf":
                         extension = "ttf"
-                    elif a_id.get("content_type") == "application/vnd.ms-opentype":
+                    elif content_type == "application/vnd.ms-opentype":
                         extension = "otf"
-                    elif a_id.get("content_type") == "font/otf":
+                    elif content_type == "font/otf":
                         extension = "otf"
-                    elif a_id.get("content_type") == "image/png":
+                    elif content_type == "image/png":
                         extension = "png"
-                    elif a_id.get("content_type") == "image/jpeg":
+                    elif content_type == "image/jpeg":
                         extension = "jpg"
                     else:
                         extension = "bin"
                     
                     # Get attachment name and sanitize it
-                    attachment_name = a_id.get("file_name", f"attachment_{a_id['id']}")
+                    attachment_name = a_id.file_name or f"attachment_{a_id.id}"
                     
                     # Ensure the filename is not too long by truncating if necessary
                     name_without_ext = os.path.splitext(attachment_name)[0][:50]
@@ -206,29 +424,33 @@ class MKVService:
                     
                     out_path = os.path.join(output_dir, safe_filename)
                     
-                    subprocess.run(["mkvextract", filepath, "attachments", f"{a_id['id']}:{out_path}"], check=True)
+                    with STAGE_DURATION.time(stage="extract"), span("mkvextract", type="attachments", attachment_id=a_id.id) as trace:
+                        run_tool(["mkvextract", filepath, "attachments", f"{a_id.id}:{out_path}"], "extract")
+                        trace["bytes"] = os.path.getsize(out_path)
+                    EXTRACTED_BYTES.inc(trace["bytes"], type="attachments")
                     extracted_files.append(out_path)
                 except subprocess.CalledProcessError as extract_error:
-                    logger.warning("Failed to extract attachment %s, skipping: %s", a_id.get("id"), extract_error)
+                    logger.warning("Failed to extract attachment %s, skipping: %s", a_id.id, extract_error)
                     continue
                 except Exception as item_error:
-                    logger.warning("Error processing attachment %s, skipping: %s", a_id.get("id"), item_error)
+                    logger.warning("Error processing attachment %s, skipping: %s", a_id.id, item_error)
                     continue
             
             if not extracted_files:
                 return None
 
             zip_file_path = os.path.join(output_dir, "attachments.zip")
-            with zipfile.ZipFile(zip_file_path, "w") as zipf:
+            with STAGE_DURATION.time(stage="zip"), zipfile.ZipFile(zip_file_path, "w") as zipf:
                 for file in extracted_files:
                     zipf.write(file, arcname=os.path.basename(file))
 
             # Check zip file size
             zip_file_size = os.path.getsize(zip_file_path)
-            if zip_file_size > 10 * 1024 * 1024:  # 10 MB limit, since discord file limit is 10 MB
-                logger.warning("Attachments zip file exceeds 10 MB, splitting...")
+            if split_size and zip_file_size > split_size:
+                logger.warning("Attachments zip file exceeds %s bytes, splitting...", split_size)
                 try:
-                    split_files = create_split_zip(Path(zip_file_path), part_size=10 * 1024 * 1024)  # 10 MB parts
+                    with STAGE_DURATION.time(stage="split"):
+                        split_files = create_split_zip(Path(zip_file_path), part_size=split_size)
                     return MKVExtractReturnType(
                         paths=split_files,
                         count=len(extracted_files)
@@ -268,16 +490,17 @@ class MKVService:
             if not info:
                 return None
 
-            chapters = info.get("chapters", [])
+            chapters = info.chapters
             if not chapters:
                 return None
 
             out_path = os.path.join(output_dir, "chapters.xml")
-            subprocess.run(["mkvextract", filepath, "chapters", ">", out_path], check=True)
+            with STAGE_DURATION.time(stage="extract"), span("mkvextract", type="chapters"):
+                run_tool(["mkvextract", filepath, "chapters", ">", out_path], "extract")
 
             return {
                 "path": Path(out_path),
-                "count": chapters[0].get("num_entries", 0) if chapters else 0
+                "count": chapters[0].num_entries if chapters else 0
             }
         except subprocess.CalledProcessError as e:
             print(f"Error extracting chapters: {e}")
@@ -287,13 +510,15 @@ class MKVService:
             return None
 
     @staticmethod
-    def extract_audio(filepath: str, output_dir: Path = Path(EXTRACT_DIR)) -> MKVExtractReturnType | None:
+    def extract_audio(filepath: str, output_dir: Path = Path(EXTRACT_DIR), track_filter: TrackFilter | None = None, split_size: int = SPLIT_SIZE) -> MKVExtractReturnType | None:
         """
         Extracts audio tracks from the MKV file to the specified output directory.
         
         Args:
             filepath (str): The path to the MKV file.
             output_dir (Path): The directory to save extracted audio.
+            track_filter (TrackFilter | None): Only extract the audio tracks selected by this filter.
+            split_size (int): Zips larger than this are split into parts of this size, 0 keeps a single zip.
 
         Returns:
             MKVExtractReturnType | None: A dictionary containing the paths of the extracted audio files and their count,
@@ -306,14 +531,20 @@ class MKVService:
             if not info:
                 return None
 
+            if track_filter:
+                selected_tracks = track_filter.select(info.tracks, "audio")
+                logger.info("Track filter selected %d audio tracks.", len(selected_tracks))
+            else:
+                selected_tracks = [t for t in info.tracks if t.type == "audio"]
+
             extracted_files = []
             audio_track_number = 1
             
-            for a_id in info.get("tracks", []):
-                if a_id.get("type") == "audio":
+            for a_id in selected_tracks:
+                if a_id.type == "audio":
                     try:
-                        audio_codec = a_id.get("codec", "unknown").strip()
-                        audio_language = a_id.get("properties", {}).get("language", "und")
+                        audio_codec = (a_id.codec or "unknown").strip()
+                        audio_language = a_id.language
                         
                         # Determine file extension based on codec
                         if audio_codec == "AAC" or "aac" in audio_codec.lower():
@@ -331,24 +562,25 @@ class MKVService:
 
                         # Naming: single track as "audio", multiple tracks as "audio_2", "audio_3", etc.
                         if audio_track_number == 1:
-                            audio_name = f"audio_{a_id['id']}.{audio_language}.{extension}"
+                            audio_name = f"audio_{a_id.id}.{audio_language}.{extension}"
                         else:
-                            audio_name = f"audio_{audio_track_number}_{a_id['id']}.{audio_language}.{extension}"
+                            audio_name = f"audio_{audio_track_number}_{a_id.id}.{audio_language}.{extension}"
 
                         out_path = os.path.join(output_dir, audio_name)
 
                         # Command to extract audio track
-                        subprocess.run(
-                            ["mkvextract", filepath, "tracks", f"{a_id['id']}:{out_path}"], check=True
-                        )
+                        with STAGE_DURATION.time(stage="extract"), span("mkvextract", type="audio", track_id=a_id.id) as trace:
+                            run_tool(["mkvextract", filepath, "tracks", f"{a_id.id}:{out_path}"], "extract")
+                            trace["bytes"] = os.path.getsize(out_path)
+                        EXTRACTED_BYTES.inc(trace["bytes"], type="audio")
                         extracted_files.append(out_path)
                         audio_track_number += 1
                     except subprocess.CalledProcessError as extract_error:
-                        logger.warning("Failed to extract audio track %s, skipping: %s", a_id.get("id"), extract_error)
+                        logger.warning("Failed to extract audio track %s, skipping: %s", a_id.id, extract_error)
                         audio_track_number += 1
                         continue
                     except Exception as item_error:
-                        logger.warning("Error processing audio track %s, skipping: %s", a_id.get("id"), item_error)
+                        logger.warning("Error processing audio track %s, skipping: %s", a_id.id, item_error)
                         audio_track_number += 1
                         continue
 
@@ -356,16 +588,17 @@ class MKVService:
                 return None
 
             zip_file_path = os.path.join(output_dir, "audio.zip")
-            with zipfile.ZipFile(zip_file_path, "w") as zipf:
+            with STAGE_DURATION.time(stage="zip"), zipfile.ZipFile(zip_file_path, "w") as zipf:
                 for file in extracted_files:
                     zipf.write(file, arcname=os.path.basename(file))
 
             # Check zip file size
             zip_file_size = os.path.getsize(zip_file_path)
-            if zip_file_size > 10 * 1024 * 1024:  # 10 MB limit
-                logger.warning("Audio zip file exceeds 10 MB, splitting...")
+            if split_size and zip_file_size > split_size:
+                logger.warning("Audio zip file exceeds %s bytes, splitting...", split_size)
                 try:
-                    split_files = create_split_zip(Path(zip_file_path), part_size=10 * 1024 * 1024)  # 10 MB parts
+                    with STAGE_DURATION.time(stage="split"):
+                        split_files = create_split_zip(Path(zip_file_path), part_size=split_size)
                     return MKVExtractReturnType(
                         paths=split_files,
                         count=len(extracted_files)
@@ -395,9 +628,10 @@ class MKVService:
             return []
 
         extracted_files = []
-        for t_id in info.get("tracks", []):
-            if t_id.get("type") == "video":
-                out_path = os.path.join(output_dir, f"track_{t_id['id']}.mkv")
-                subprocess.run(["mkvextract", "tracks", filepath, f"{t_id['id']}:{out_path}"], check=True)
+        for t_id in info.tracks:
+            if t_id.type == "video":
+                out_path = os.path.join(output_dir, f"track_{t_id.id}.mkv")
+                with span("mkvextract", type="video", track_id=t_id.id):
+                    run_tool(["mkvextract", "tracks", filepath, f"{t_id.id}:{out_path}"], "extract")
                 extracted_files.append(out_path)
         return extracted_files
@@ -0,0 +1,256 @@
+"""Profiler module for on-demand profiling of live jobs."""
+
+import asyncio
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows, subprocess CPU time is not available
+    resource = None
+
+from config import PROFILE_DIR, PROFILE_MODE, PROFILE_NEXT_JOBS, PROFILE_SAMPLE_INTERVAL
+from utils.logger import get_logger, trace_logger
+
+# Configure logging
+logger = get_logger("profiler")
+
+PROFILE_MODES = ("sampler", "cprofile")
+
+# Interval of the event-loop lag probe (seconds)
+LOOP_LAG_INTERVAL = 0.1
+
+def _children_cpu_time() -> tuple[float, float]:
+    """Returns the user and system CPU time of the terminated child processes."""
+    if resource is None:
+        return 0.0, 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime, usage.ru_stime
+
+class StackSampler:
+    """Samples the stack of a thread at a fixed interval into flamegraph-ready collapsed stacks."""
+    def __init__(self, thread_id: int, interval: float, profile: "JobProfile"):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.profile = profile
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if frames:
+                # Root the stack on the job stage, so the flamegraph splits by stage
+                self.stacks[";".join([f"stage:{self.profile.stage}", *reversed(frames)])] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+class SubprocessCollector(logging.Handler):
+    """Sums the wall time of the subprocess spans (mkvmerge, mkvextract, mediainfo) of a profile."""
+    def __init__(self):
+        super().__init__(level=logging.DEBUG)
+        self.calls: Counter[str] = Counter()
+        self.wall: Counter[str] = Counter()
+
+    def emit(self, record: logging.LogRecord):
+        if getattr(record, "event", None) != "span_end":
+            return
+        self.calls[record.span] += 1
+        self.wall[record.span] += (getattr(record, "fields", {}) or {}).get("duration_ms", 0) / 1000
+
+class JobProfile:
+    """Profile of one job: Python stacks or cProfile stats, event-loop lag and subprocess time."""
+    def __init__(self, job_id: str, mode: str, output_dir: Path):
+        self.job_id = job_id
+        self.mode = mode
+        self.output_dir = output_dir
+        self.stage = "starting"
+        self.loop_lags: list[float] = []
+        self.subprocesses = SubprocessCollector()
+        self._sampler: StackSampler | None = None
+        self._cprofile: cProfile.Profile | None = None
+        self._lag_task: asyncio.Task | None = None
+        self._started = 0.0
+        self._children_cpu = (0.0, 0.0)
+        self._lag_expected = 0.0
+
+    async def _probe_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._lag_expected = loop.time() + LOOP_LAG_INTERVAL
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lags.append(max(0.0, loop.time() - self._lag_expected))
+
+    def start(self):
+        """Starts profiling, must be called from the event loop thread."""
+        self._started = time.perf_counter()
+        self._children_cpu = _children_cpu_time()
+        if self.mode == "cprofile":
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        else:
+            self._sampler = StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL, self)
+            self._sampler.start()
+        trace_logger.addHandler(self.subprocesses)
+        self._lag_task = asyncio.create_task(self._probe_loop_lag())
+
+    async def stop(self) -> Path:
+        """Stops profiling and writes the results, returns their directory."""
+        duration = time.perf_counter() - self._started
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self._sampler is not None:
+            await asyncio.to_thread(self._sampler.stop)
+        trace_logger.removeHandler(self.subprocesses)
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            # A probe still waiting past its wake up time was delayed by a blocking call
+            overdue = asyncio.get_running_loop().time() - self._lag_expected
+            if overdue > 0:
+                self.loop_lags.append(overdue)
+
+        user, system = _children_cpu_time()
+        lags = sorted(self.loop_lags)
+        summary = {
+            "job_id": self.job_id,
+            "mode": self.mode,
+            "duration_s": round(duration, 3),
+            "loop_lag": {
+                "samples": len(lags),
+                "mean_ms": round(sum(lags) / len(lags) * 1000, 2) if lags else 0,
+                "p95_ms": round(lags[int(len(lags) * 0.95)] * 1000, 2) if lags else 0,
+                "max_ms": round(lags[-1] * 1000, 2) if lags else 0,
+            },
+            "subprocesses": {
+                name: {"calls": calls, "wall_s": round(self.subprocesses.wall[name], 3)}
+                for name, calls in self.subprocesses.calls.items()
+            },
+            # Includes every child process reaped while the job ran, other jobs' too
+            "subprocess_cpu_s": {
+                "user": round(user - self._children_cpu[0], 3),
+                "system": round(system - self._children_cpu[1], 3),
+            } if resource is not None else None,
+            "stack_samples": sum(self._sampler.stacks.values()) if self._sampler else None,
+        }
+        await asyncio.to_thread(self._write, summary)
+        return self.output_dir
+
+    def _write(self, summary: dict):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.output_dir / "summary.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=4)
+
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(self.output_dir / "profile.pstats")
+            report = io.StringIO()
+            pstats.Stats(self._cprofile, stream=report).sort_stats("cumulative").print_stats(40)
+            (self.output_dir / "profile.txt").write_text(report.getvalue(), encoding="utf-8")
+
+        if self._sampler is not None:
+            with open(self.output_dir / "stacks.collapsed", "w", encoding="utf-8") as f:
+                for stack, count in self._sampler.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+
+class Profiler:
+    """
+    Arms profiling for the next N jobs or a time window.
+
+    `sampler` mode samples the event loop thread stack, so concurrent profiled jobs are all
+    sampled. `cprofile` mode profiles one job at a time (Python allows a single active
+    profiler), the jobs starting while it runs fall back to the sampler.
+    """
+    def __init__(self):
+        self.mode = PROFILE_MODE if PROFILE_MODE in PROFILE_MODES else "sampler"
+        self.jobs_remaining = 0
+        self.window_end = 0.0
+        self.active: dict[str, JobProfile] = {}
+
+    @property
+    def armed(self) -> bool:
+        return self.jobs_remaining > 0 or time.time() < self.window_end
+
+    def enable(self, jobs: int = 0, seconds: int = 0, mode: str | None = None):
+        """Profiles the next `jobs` jobs, or every job starting in the next `seconds` seconds."""
+        if mode:
+            if mode not in PROFILE_MODES:
+                raise ValueError(f"Unknown profiling mode {mode}, use one of: {', '.join(PROFILE_MODES)}.")
+            self.mode = mode
+        self.jobs_remaining = jobs
+        self.window_end = time.time() + seconds if seconds else 0.0
+        logger.info("Profiling enabled (%s mode) for %s.", self.mode, self.describe())
+
+    def disable(self):
+        """Stops profiling new jobs, the running profiles finish with their job."""
+        self.jobs_remaining = 0
+        self.window_end = 0.0
+        logger.info("Profiling disabled.")
+
+    def describe(self) -> str:
+        """Describes what will be profiled."""
+        if self.jobs_remaining > 0:
+            return f"the next {self.jobs_remaining} job(s)"
+        if time.time() < self.window_end:
+            return f"jobs starting in the next {int(self.window_end - time.time())}s"
+        return "no jobs"
+
+    def _take(self) -> bool:
+        if self.jobs_remaining > 0:
+            self.jobs_remaining -= 1
+            return True
+        return time.time() < self.window_end
+
+    @asynccontextmanager
+    async def profile_job(self, job_id: str):
+        """Profiles the wrapped job if profiling is armed, yields the profile or None."""
+        if not self._take():
+            yield None
+            return
+
+        mode = self.mode
+        if mode == "cprofile" and any(p.mode == "cprofile" for p in self.active.values()):
+            logger.warning("A job is already profiled with cProfile, sampling job %s instead.", job_id)
+            mode = "sampler"
+
+        output_dir = Path(PROFILE_DIR) / f"{time.strftime('%Y%m%d-%H%M%S')}_{job_id}"
+        profile = JobProfile(job_id, mode, output_dir)
+        profile.start()
+        self.active[job_id] = profile
+        logger.info("Profiling job %s (%s mode).", job_id, mode)
+        try:
+            yield profile
+        finally:
+            del self.active[job_id]
+            path = await profile.stop()
+            logger.info("Profile of job %s saved to %s", job_id, path)
+
+    def set_stage(self, job_id: str, stage: str):
+        """Labels the following stack samples of a profiled job with its stage."""
+        profile = self.active.get(job_id)
+        if profile is not None:
+            profile.stage = stage
+
+# Shared profiler, armed at startup by PROFILE_NEXT_JOBS
+profiler = Profiler()
+if PROFILE_NEXT_JOBS > 0:
+    profiler.enable(jobs=PROFILE_NEXT_JOBS)
@@ -0,0 +1,243 @@
+"""Retention module, keeping completed downloads so the next jobs of the same release reuse them."""
+
+import asyncio
+import hashlib
+import os
+import shutil
+import time
+from pathlib import Path
+
+from config import RETENTION_TTL, RETENTION_BUDGET, RETENTION_INDEX_FILE
+from utils import file_utils
+from utils.admission import admission_controller
+from utils.cleanup import trash_collector
+from utils.logger import get_logger
+from utils.metrics import RETENTION_LOOKUPS
+
+# Configure logging
+logger = get_logger("retention")
+
+RETAINED_DIR_NAME = ".retained"
+
+class RetentionStore:
+    """
+    Completed downloads kept after their last job, by release key (see link_identity), so that a job
+    with another extraction type or filters extracts from the files at once instead of downloading
+    them again.
+
+    A download is retained by renaming its directory into the `.retained` directory of its download
+    root, which stays on one file system. Retained downloads are pinned while jobs extract from them,
+    and the unpinned ones are deleted once unused for the TTL, least recently used first when over
+    the size budget, and on demand when the admission controller runs short of disk space.
+    """
+    def __init__(self, ttl: int, budget: int, index_file: str):
+        self.ttl = ttl
+        self.budget = budget
+        self.index_file = Path(index_file)
+        self.entries: dict[str, file_utils.RetainedDownloadObject] = {}
+        self._pins: dict[str, int] = {}
+        self._loaded = False
+        self._reaper: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.budget > 0
+
+    @property
+    def used(self) -> int:
+        """Bytes of the retained downloads."""
+        self._load()
+        return sum(entry.size for entry in self.entries.values())
+
+    def _load(self):
+        if not self._loaded:
+            self.entries = file_utils.load_retention_index(self.index_file)
+            self._loaded = True
+
+    def _save(self):
+        file_utils.save_retention_index(self.entries, self.index_file)
+
+    def is_pinned(self, key: str) -> bool:
+        return self._pins.get(key, 0) > 0
+
+    def _remove(self, key: str) -> Path:
+        """Drops an entry from the index, returns the directory of its files."""
+        entry = self.entries.pop(key)
+        logger.info("Evicting the retained download of %s (%d bytes, %d reuses).", key, entry.size, entry.hits)
+        return Path(entry.path)
+
+    #region Jobs
+    def acquire(self, key: str) -> Path | None:
+        """
+        Pins the retained download of a release for a job.
+
+        Returns:
+            Path | None: The directory of the files, None if the release is not retained.
+        """
+        if not self.enabled:
+            return None
+        self._load()
+        entry = self.entries.get(key)
+        if entry is None or not Path(entry.path).is_dir():
+            if entry is not None:
+                # Deleted behind our back
+                self.entries.pop(key)
+                self._save()
+            RETENTION_LOOKUPS.inc(result="miss")
+            return None
+        if not self.is_pinned(key) and time.time() - entry.last_used_at > self.ttl:
+            trash_collector.discard(self._remove(key))
+            self._save()
+            RETENTION_LOOKUPS.inc(result="miss")
+            return None
+
+        self._pins[key] = self._pins.get(key, 0) + 1
+        self.entries[key] = file_utils.RetainedDownloadObject(**{**entry, "last_used_at": time.time(), "hits": entry.hits + 1})
+        self._save()
+        RETENTION_LOOKUPS.inc(result="hit")
+        return Path(entry.path)
+
+    def release(self, key: str):
+        """Unpins the retained download of a release once its jobs are done with it."""
+        count = self._pins.pop(key, 0) - 1
+        if count > 0:
+            self._pins[key] = count
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries[key] = file_utils.RetainedDownloadObject(**{**entry, "last_used_at": time.time()})
+        self.evict()
+
+    def retain(self, key: str, dir_path: Path) -> bool:
+        """
+        Moves a completed download out of its job's directory into the store. The download must have
+        been removed from Aria2 first, so nothing writes to it anymore.
+
+        Returns:
+            bool: Whether the download was retained, else it stays where it is for the job's cleanup.
+        """
+        if not self.enabled or not dir_path.is_dir() or dir_path.parent.name == RETAINED_DIR_NAME:
+            return False
+        self._load()
+        if self.is_pinned(key):
+            # Jobs extract from an older copy of the release, keep that one
+            return False
+
+        size = file_utils.get_tree_size(dir_path)
+        if size > self.budget:
+            logger.info("Download of %s (%d bytes) exceeds the retention budget, not retaining it.", key, size)
+            return False
+
+        dir_path = Path(os.path.abspath(dir_path))
+        root = trash_collector.get_root(dir_path) or dir_path.parent
+        target = root / RETAINED_DIR_NAME / hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+        if key in self.entries:
+            trash_collector.discard(self._remove(key))
+        # Orphan of an entry lost with the index
+        trash_collector.discard(target)
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.rename(dir_path, target)
+        except OSError as e:
+            logger.warning("Could not retain the download of %s: %s", key, e)
+            return False
+
+        now = time.time()
+        self.entries[key] = file_utils.RetainedDownloadObject(
+            key=key, path=str(target), size=size, retained_at=now, last_used_at=now, hits=0
+        )
+        logger.info("Retained the download of %s (%d bytes) for %ds.", key, size, self.ttl)
+        self.evict()
+        return True
+    #endregion
+
+    #region Eviction
+    def evict(self):
+        """Deletes the unpinned downloads unused for the TTL, then the least recently used ones over the budget."""
+        self._load()
+        now = time.time()
+        discarded = [
+            self._remove(key) for key, entry in list(self.entries.items())
+            if not self.is_pinned(key) and now - entry.last_used_at > self.ttl
+        ]
+        total = sum(entry.size for entry in self.entries.values())
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1].last_used_at):
+            if total <= self.budget:
+                break
+            if not self.is_pinned(key):
+                discarded.append(self._remove(key))
+                total -= entry.size
+        for path in discarded:
+            trash_collector.discard(path)
+        self._save()
+
+    def reclaimable_bytes(self, device: int) -> int:
+        """Returns the bytes of the unpinned downloads on a volume (st_dev)."""
+        self._load()
+        return sum(
+            entry.size for key, entry in self.entries.items()
+            if not self.is_pinned(key) and _get_device(Path(entry.path)) == device
+        )
+
+    async def reclaim(self, nbytes: int, device: int) -> int:
+        """
+        Deletes the least recently used unpinned downloads of a volume until `nbytes` are freed. They are
+        deleted right away rather than through the trash, a job is waiting for the space.
+
+        Returns:
+            int: The bytes freed.
+        """
+        self._load()
+        paths, freed = [], 0
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1].last_used_at):
+            if freed >= nbytes:
+                break
+            if not self.is_pinned(key) and _get_device(Path(entry.path)) == device:
+                paths.append(self._remove(key))
+                freed += entry.size
+        if paths:
+            self._save()
+            await asyncio.to_thread(lambda: [shutil.rmtree(path, ignore_errors=True) for path in paths])
+        return freed
+    #endregion
+
+    #region Lifecycle
+    def sweep(self):
+        """Drops the entries whose files are gone, and deletes the retained files no entry refers to."""
+        self._load()
+        for key in [key for key, entry in self.entries.items() if not Path(entry.path).is_dir()]:
+            self.entries.pop(key)
+        known = {Path(entry.path) for entry in self.entries.values()}
+        for root in trash_collector.get_roots():
+            retained_dir = root / RETAINED_DIR_NAME
+            if retained_dir.is_dir():
+                for child in retained_dir.iterdir():
+                    if child not in known:
+                        trash_collector.discard(child)
+        self.evict()
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(min(max(self.ttl / 4, 1), 300))
+            self.evict()
+
+    def start(self):
+        """Cleans up the store left by the last run and expires the downloads in the background."""
+        if not self.enabled:
+            # Retention was turned off, delete what the last run kept
+            self.budget = 0
+            self.sweep()
+            return
+        self.sweep()
+        admission_controller.add_reclaimer(self)
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap())
+    #endregion
+
+def _get_device(path: Path) -> int | None:
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return None
+
+# Shared retention store of the downloads of this process
+retention_store = RetentionStore(RETENTION_TTL, RETENTION_BUDGET, RETENTION_INDEX_FILE)
@@ -0,0 +1,196 @@
+"""Scheduler module, sharing the job slots fairly between users and guilds."""
+
+import asyncio
+import time
+from itertools import count
+
+from config import MAX_CONCURRENT_JOBS, MAX_JOBS_PER_USER, MAX_JOBS_PER_GUILD, MAX_QUEUE_JOBS
+from utils.logger import get_logger
+
+# Configure logging
+logger = get_logger("scheduler")
+
+# Priority levels, higher levels are started first
+PRIORITY_NORMAL = 0
+PRIORITY_ADMIN = 1
+
+class Ticket(dict):
+    """Type definition for a job waiting for, or holding, a slot."""
+    def __init__(self, **data):
+        super().__init__(**data)
+        self.job_id = data.get("job_id", "")
+        self.user_id = data.get("user_id", "")
+        self.guild_id = data.get("guild_id", "")
+        self.url = data.get("url", "")
+        self.priority = data.get("priority", PRIORITY_NORMAL)
+        self.background = data.get("background", False)
+        self.seq = data.get("seq", 0)
+        self.held = data.get("held", False)
+        self.enqueued_at = data.get("enqueued_at", 0)
+
+    job_id: str
+    user_id: str
+    guild_id: str
+    url: str
+    priority: int
+    """PRIORITY_ADMIN for the jobs of administrators."""
+    background: bool
+    """True for the links of a /start_queue run, which only use spare capacity."""
+    seq: int
+    """Submission order, breaks the ties."""
+    held: bool
+    """True while the job waits for the download of another job of the same release, it does not start before."""
+    enqueued_at: float
+
+class FairPolicy:
+    """
+    Orders the waiting jobs by priority, then interactive jobs before queue links, then round-robin
+    across guilds and users (the least recently served first), within the per-user, per-guild and
+    queue link caps (0 disables a cap).
+    """
+    def __init__(self, max_per_user: int, max_per_guild: int, max_background: int):
+        self.max_per_user = max_per_user
+        self.max_per_guild = max_per_guild
+        self.max_background = max_background
+        self._served = count()
+        self._served_users: dict[str, int] = {}
+        self._served_guilds: dict[str, int] = {}
+
+    def fits(self, ticket: Ticket, running: list[Ticket]) -> bool:
+        """Checks the caps of a waiting job against the running ones."""
+        if ticket.held:
+            return False
+        if self.max_per_user and sum(t.user_id == ticket.user_id for t in running) >= self.max_per_user:
+            return False
+        if self.max_per_guild and sum(t.guild_id == ticket.guild_id for t in running) >= self.max_per_guild:
+            return False
+        if ticket.background and self.max_background and sum(t.background for t in running) >= self.max_background:
+            return False
+        return True
+
+    def sort_key(self, ticket: Ticket) -> tuple:
+        """Scheduling order of a waiting job, the smallest goes first."""
+        return (
+            -ticket.priority,
+            ticket.background,
+            self._served_guilds.get(ticket.guild_id, -1),
+            self._served_users.get(ticket.user_id, -1),
+            ticket.seq,
+        )
+
+    def pick(self, waiting: list[Ticket], running: list[Ticket]) -> Ticket | None:
+        """Returns the next job to start, None when every waiting job is capped."""
+        candidates = [ticket for ticket in waiting if self.fits(ticket, running)]
+        if not candidates:
+            return None
+        ticket = min(candidates, key=self.sort_key)
+        served = next(self._served)
+        self._served_users[ticket.user_id] = served
+        self._served_guilds[ticket.guild_id] = served
+        return ticket
+
+class JobScheduler:
+    """
+    Runs at most `max_jobs` jobs at once, starting the waiting ones in the FairPolicy order.
+
+    Links of /start_queue runs are submitted one at a time as background jobs, so a long queue
+    only uses the slots no interactive job is waiting for, and never more than `max_background`.
+    """
+    def __init__(self, max_jobs: int, max_per_user: int, max_per_guild: int, max_background: int):
+        self.max_jobs = max(max_jobs, 1)
+        # By default, queue links leave a slot to interactive jobs
+        max_background = max_background or max(self.max_jobs - 1, 1)
+        self.policy = FairPolicy(max_per_user, max_per_guild, min(max_background, self.max_jobs))
+        self.waiting: list[Ticket] = []
+        self.running: dict[str, Ticket] = {}
+        self._seq = count()
+        self._wakeups: dict[str, asyncio.Event] = {}
+        self._cancel_events: dict[str, asyncio.Event] = {}
+
+    def enqueue(self, job_id: str, user_id: str, guild_id: str, url: str = "", priority: int = PRIORITY_NORMAL, background: bool = False, cancel_event: asyncio.Event | None = None, held: bool = False) -> Ticket:
+        """Adds a job to the waiting list, starting it right away when a slot is free (and it is not held)."""
+        ticket = Ticket(
+            job_id=job_id, user_id=user_id, guild_id=guild_id, url=url, priority=priority,
+            background=background, seq=next(self._seq), held=held, enqueued_at=time.time()
+        )
+        self._wakeups[job_id] = asyncio.Event()
+        self._cancel_events[job_id] = cancel_event or asyncio.Event()
+        self.waiting.append(ticket)
+        self._dispatch()
+        return ticket
+
+    def is_running(self, ticket: Ticket) -> bool:
+        """Whether the job holds a slot."""
+        return ticket.job_id in self.running
+
+    def position(self, ticket: Ticket) -> int:
+        """Position of a waiting job in the scheduling order, starting at 1."""
+        ordered = sorted(self.waiting, key=self.policy.sort_key)
+        return next((i for i, t in enumerate(ordered, start=1) if t.job_id == ticket.job_id), 0)
+
+    def unhold(self, job_id: str):
+        """Lets a held job start, once the download it waited for is ready or it has to download it itself."""
+        ticket = next((t for t in self.waiting if t.job_id == job_id), None)
+        if ticket is None or not ticket.held:
+            return
+        ticket.held = ticket["held"] = False
+        self._dispatch()
+
+    async def wait(self, ticket: Ticket) -> bool:
+        """Waits for the job to get a slot, returns False if it was cancelled first."""
+        wakeup = self._wakeups[ticket.job_id]
+        cancel_event = self._cancel_events[ticket.job_id]
+        while not self.is_running(ticket) and not cancel_event.is_set():
+            await wakeup.wait()
+            wakeup.clear()
+        return not cancel_event.is_set()
+
+    def release(self, ticket: Ticket):
+        """Frees the slot (or the waiting place) of a job and starts the next ones."""
+        self.running.pop(ticket.job_id, None)
+        if ticket in self.waiting:
+            self.waiting.remove(ticket)
+        self._wakeups.pop(ticket.job_id, None)
+        self._cancel_events.pop(ticket.job_id, None)
+        self._dispatch()
+
+    async def requeue(self, ticket: Ticket) -> bool:
+        """
+        Gives the slot of a running job to the waiting jobs, then waits for a new slot behind them as a
+        background job. Returns False if the job was cancelled while waiting.
+        """
+        if self.running.pop(ticket.job_id, None) is None:
+            return True
+        ticket.background = ticket["background"] = True
+        ticket.seq = ticket["seq"] = next(self._seq)
+        self.waiting.append(ticket)
+        logger.info("Job %s of user %s gave its slot to the waiting jobs.", ticket.job_id, ticket.user_id)
+        self._dispatch()
+        return await self.wait(ticket)
+
+    def cancel(self, user_id: str | None = None, job_id: str | None = None) -> int:
+        """Cancels the running and waiting jobs (of a user, or a single one), returns how many were cancelled."""
+        cancelled = 0
+        for ticket in [*self.running.values(), *self.waiting]:
+            if (user_id and ticket.user_id != user_id) or (job_id and ticket.job_id != job_id):
+                continue
+            self._cancel_events[ticket.job_id].set()
+            self._wakeups[ticket.job_id].set()
+            cancelled += 1
+        return cancelled
+
+    def _dispatch(self):
+        while len(self.running) < self.max_jobs:
+            ticket = self.policy.pick(self.waiting, list(self.running.values()))
+            if ticket is None:
+                return
+            self.waiting.remove(ticket)
+            self.running[ticket.job_id] = ticket
+            self._wakeups[ticket.job_id].set()
+            logger.info(
+                "Job %s of user %s started (%d running, %d waiting).",
+                ticket.job_id, ticket.user_id, len(self.running), len(self.waiting)
+            )
+
+# Shared scheduler of the jobs run by this process
+job_scheduler = JobScheduler(MAX_CONCURRENT_JOBS, MAX_JOBS_PER_USER, MAX_JOBS_PER_GUILD, MAX_QUEUE_JOBS)
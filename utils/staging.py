@@ -0,0 +1,113 @@
+"""Staging module, keeping the small extraction outputs of the jobs in memory (tmpfs) within a budget."""
+
+import os
+import shutil
+import threading
+from pathlib import Path
+
+from config import STAGING_DIR, STAGING_BUDGET
+from utils.file_utils import get_tree_size
+from utils.logger import get_logger
+
+# Configure logging
+logger = get_logger("staging")
+
+class StagingArea:
+    """
+    Extraction outputs staged in a memory-backed directory (e.g. a tmpfs like /dev/shm).
+
+    The outputs of a file are staged when the estimate from its identification fits in what is
+    left of the budget and of the file system, else they go to the job's extraction directory on
+    disk. Once extracted, the reservation becomes the real size of the outputs, and outputs that
+    pushed the staged total over the budget (a low estimate) spill to disk before the upload.
+    """
+    def __init__(self, root: str, budget: int):
+        self.root = Path(root) if root else None
+        self.budget = budget
+        self._reserved: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.root is not None and self.budget > 0
+
+    @property
+    def used(self) -> int:
+        """Bytes reserved by the staged outputs of every job."""
+        with self._lock:
+            return sum(self._reserved.values())
+
+    def get_job_dir(self, job_id: str) -> Path:
+        return self.root / job_id
+
+    def acquire(self, job_id: str, estimate: int | None) -> Path | None:
+        """
+        Reserves the estimated bytes of the next outputs of a job.
+
+        Returns:
+            Path | None: The staging directory of the job, or None when the outputs go to disk
+            (staging disabled, unknown estimate, or not enough budget or memory left).
+        """
+        if not self.enabled or estimate is None:
+            return None
+        with self._lock:
+            if sum(self._reserved.values()) + estimate > self.budget:
+                return None
+            try:
+                self.root.mkdir(parents=True, exist_ok=True)
+                # The tmpfs may be smaller than the budget, or shared with other processes
+                if shutil.disk_usage(self.root).free < estimate:
+                    return None
+            except OSError as e:
+                logger.warning("Staging directory %s is not usable: %s", self.root, e)
+                return None
+            self._reserved[job_id] = estimate
+        path = self.get_job_dir(job_id)
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def settle(self, job_id: str, keep: list[Path], disk_dir: Path) -> Path:
+        """
+        Drops the staged files of a job that are not delivered (the tracks already zipped), then
+        replaces its reservation with the real size of the rest, spilling them to `disk_dir` when
+        they do not fit in the budget.
+
+        Returns:
+            Path: The directory now holding the kept files, at the same relative paths.
+        """
+        path = self.get_job_dir(job_id)
+        kept = {Path(file).resolve() for file in keep}
+        for root, _dirs, files in os.walk(path):
+            for name in files:
+                if Path(root, name).resolve() not in kept:
+                    os.unlink(os.path.join(root, name))
+        size = get_tree_size(path)
+        with self._lock:
+            others = sum(reserved for other, reserved in self._reserved.items() if other != job_id)
+            if others + size <= self.budget:
+                self._reserved[job_id] = size
+                return path
+            self._reserved.pop(job_id, None)
+
+        logger.info("Staged outputs of job %s (%d bytes) exceed the staging budget, spilling them to disk.", job_id, size)
+        disk_dir.mkdir(parents=True, exist_ok=True)
+        for child in path.iterdir():
+            shutil.move(child, disk_dir / child.name)
+        shutil.rmtree(path, ignore_errors=True)
+        return disk_dir
+
+    def release(self, job_id: str):
+        """Deletes the staged outputs of a job, freeing its reservation."""
+        with self._lock:
+            self._reserved.pop(job_id, None)
+        if self.enabled:
+            # Deleting from a tmpfs only frees memory, it never waits on a disk
+            shutil.rmtree(self.get_job_dir(job_id), ignore_errors=True)
+
+    def clear(self):
+        """Deletes the outputs staged before a restart."""
+        if self.enabled and self.root.is_dir():
+            for child in self.root.iterdir():
+                shutil.rmtree(child, ignore_errors=True)
+
+staging_area = StagingArea(STAGING_DIR, STAGING_BUDGET)
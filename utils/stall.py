@@ -0,0 +1,44 @@
+"""Stall detection module, watching the progress of a download over a sliding window."""
+
+import time
+from collections import deque
+
+class StallDetector:
+    """
+    Keeps the downloaded byte counts of the last `window` seconds. A download is stalled once the
+    window is covered and its average speed over the window is below `min_speed`.
+    """
+    def __init__(self, window: float, min_speed: int):
+        self.window = window
+        self.min_speed = min_speed
+        self.stalls = 0
+        self._samples: deque[tuple[float, int]] = deque()
+
+    def reset(self):
+        """Starts a new window, e.g. after the download changed or was paused."""
+        self._samples.clear()
+
+    def add(self, completed_length: int, now: float | None = None):
+        """Records the downloaded bytes, dropping the samples older than the window."""
+        now = time.monotonic() if now is None else now
+        self._samples.append((now, completed_length))
+        # Keep one sample at or before the start of the window, it is the reference of the average
+        while len(self._samples) > 1 and now - self._samples[1][0] >= self.window:
+            self._samples.popleft()
+
+    @property
+    def speed(self) -> float:
+        """Average speed over the window, in bytes per second."""
+        if len(self._samples) < 2:
+            return 0.0
+        (start, start_length), (end, end_length) = self._samples[0], self._samples[-1]
+        return (end_length - start_length) / (end - start) if end > start else 0.0
+
+    @property
+    def stalled(self) -> bool:
+        """Whether the window is covered and the download is slower than `min_speed`."""
+        if self.window <= 0 or len(self._samples) < 2:
+            return False
+        if self._samples[-1][0] - self._samples[0][0] < self.window:
+            return False
+        return self.speed < self.min_speed
@@ -0,0 +1,155 @@
+"""Track filter module for selecting which MKV tracks get extracted."""
+
+from typing import Literal
+
+from utils.identification import Track
+
+# Track types a filter term can be scoped to, e.g. "subs.lang:eng"
+FILTER_SCOPES = {
+    "subs": "subtitles",
+    "sub": "subtitles",
+    "subtitles": "subtitles",
+    "audio": "audio",
+}
+
+# Supported filter keys and their aliases
+FILTER_KEYS = {
+    "lang": "lang",
+    "language": "lang",
+    "codec": "codec",
+    "name": "name",
+    "default": "default",
+    "forced": "forced",
+}
+
+FLAG_VALUES = {
+    "yes": True,
+    "true": True,
+    "1": True,
+    "no": False,
+    "false": False,
+    "0": False,
+}
+
+FILTER_HELP = (
+    "Space separated terms like `lang:eng,jpn`, `codec:ass`, `name:full`, `default`, `forced:no`. "
+    "Prefix a term with `subs.` or `audio.` to scope it and with `!` to negate it."
+)
+
+class FilterTerm:
+    """A single `[!][scope.]key:value[,value]` term of a track filter."""
+    def __init__(self, key: str, values: list[str], scope: str | None = None, negate: bool = False):
+        self.key = key
+        self.values = values
+        self.scope = scope
+        self.negate = negate
+
+    key: str
+    """Normalized filter key (lang, codec, name, default or forced)."""
+    values: list[str]
+    """Lower-cased accepted values, any of them matching is enough."""
+    scope: str | None
+    """Track type the term applies to, or None for every track type."""
+    negate: bool
+    """Whether the term excludes matching tracks instead of selecting them."""
+
+    def applies_to(self, track_type: str) -> bool:
+        """Checks if the term applies to the given track type."""
+        return self.scope is None or self.scope == track_type
+
+    def matches(self, track: Track) -> bool:
+        """Checks if a track of the identification output matches the term."""
+        if self.key == "lang":
+            language = track.language.lower()
+            language_ietf = track.language_ietf.lower()
+            candidates = {language, language_ietf, language_ietf.split("-")[0]}
+            matched = any(value in candidates for value in self.values)
+        elif self.key == "codec":
+            codec = f"{track.codec} {track.codec_id}".lower()
+            matched = any(value in codec for value in self.values)
+        elif self.key == "name":
+            name = track.name.lower()
+            matched = any(value in name for value in self.values)
+        else:
+            flag = bool(getattr(track, self.key))
+            matched = any(FLAG_VALUES[value] == flag for value in self.values)
+
+        return not matched if self.negate else matched
+
+    def __str__(self) -> str:
+        scope = next((k for k, v in FILTER_SCOPES.items() if v == self.scope), None)
+        prefix = ("!" if self.negate else "") + (f"{scope}." if scope else "")
+        return f"{prefix}{self.key}:{','.join(self.values)}"
+
+class TrackFilter:
+    """
+    Track filter built from a user supplied expression.
+
+    Terms with different keys must all match (AND), values inside a term are
+    alternatives (OR). Terms only constrain the track types they are scoped to.
+    """
+    def __init__(self, terms: list[FilterTerm], expression: str = ""):
+        self.terms = terms
+        self.expression = expression
+
+    terms: list[FilterTerm]
+    expression: str
+
+    def matches(self, track: Track) -> bool:
+        """Checks if a track of the identification output is selected by the filter."""
+        return all(term.matches(track) for term in self.terms if term.applies_to(track.type))
+
+    def select(self, tracks: list[Track], track_type: Literal["subtitles", "audio"]) -> list[Track]:
+        """Returns the tracks of the given type that are selected by the filter."""
+        return [t for t in tracks if t.type == track_type and self.matches(t)]
+
+    def __str__(self) -> str:
+        return " ".join(str(term) for term in self.terms)
+
+def parse_track_filter(expression: str | None) -> TrackFilter | None:
+    """
+    Parses a track filter expression.
+
+    Args:
+        expression (str | None): The filter expression, e.g. "subs.lang:eng !name:signs audio.lang:jpn".
+
+    Returns:
+        TrackFilter | None: The parsed filter, or None if the expression is empty.
+
+    Raises:
+        ValueError: If the expression contains an unknown scope, key or flag value.
+    """
+    if not expression or not expression.strip():
+        return None
+
+    terms = []
+    for raw_term in expression.split():
+        term = raw_term.strip()
+        negate = term.startswith("!")
+        if negate:
+            term = term[1:]
+
+        key, _, raw_values = term.partition(":")
+        scope = None
+        if "." in key:
+            raw_scope, key = key.split(".", 1)
+            scope = FILTER_SCOPES.get(raw_scope.lower())
+            if scope is None:
+                raise ValueError(f"Unknown filter scope `{raw_scope}` in `{raw_term}`.")
+
+        normalized_key = FILTER_KEYS.get(key.lower())
+        if normalized_key is None:
+            raise ValueError(f"Unknown filter key `{key}` in `{raw_term}`.")
+
+        values = [v.strip().lower() for v in raw_values.split(",") if v.strip()]
+        if normalized_key in ("default", "forced"):
+            values = values or ["yes"]
+            invalid = [v for v in values if v not in FLAG_VALUES]
+            if invalid:
+                raise ValueError(f"Invalid value `{invalid[0]}` for `{normalized_key}`, use yes or no.")
+        elif not values:
+            raise ValueError(f"Missing value for filter term `{raw_term}`.")
+
+        terms.append(FilterTerm(key=normalized_key, values=values, scope=scope, negate=negate))
+
+    return TrackFilter(terms, expression=expression.strip())
@@ -3,17 +3,34 @@
 import asyncio
 import os
 import re
+import time
 from pathlib import Path
+from types import SimpleNamespace
 from typing import Literal
 
-import requests
 from interactions import File
-from interactions import Message, SlashContext
-
-from config import DISCORD_TOKEN, APP_ID
-from utils import aria2_service, file_utils, mkv_service
-from utils.controller import extraction_cancel_event
-from utils.logger import get_logger
+from interactions import Message, Permissions, SlashContext
+
+from config import EXTRACT_DIR, INSPECT_HEAD_SIZE, INSPECT_TIMEOUT
+from config import MAX_DOWNLOAD_SIZE, ADMISSION_TIMEOUT, WORKER_MODE
+from config import STALL_TIMEOUT, STALL_MIN_SPEED, STALL_RETRIES
+from utils import aria2_service, ebml, extraction, file_utils, mkv_service
+from utils.admission import admission_controller, estimate_extraction_bytes, estimate_extraction_bytes_from_info, format_bytes
+from utils.broker import job_broker
+from utils.coalescer import download_coalescer, SharedDownload
+from utils.identification import Identification
+from utils.link_identity import get_known_link_key, resolve_link_key
+from utils.logger import get_logger, set_log_context, reset_log_context
+from utils.metrics import STAGE_DURATION, DOWNLOADED_BYTES, UPLOADED_BYTES, JOBS, ACTIVE_JOBS, STALLED_DOWNLOADS
+from utils.profiler import profiler
+from utils.retention import retention_store
+from utils.scheduler import job_scheduler, PRIORITY_ADMIN, PRIORITY_NORMAL
+from utils.staging import staging_area
+from utils.stall import StallDetector
+from utils.track_filter import TrackFilter, parse_track_filter
+
+# Users whose queue is being processed, by /start_queue or resumed at startup, a queue runs once at a time
+running_queue_users: set[str] = set()
 
 def get_download_status_message(status: dict, gid: str) -> str:
     """Generates a status message for a download."""
@@ -30,12 +47,11 @@ def get_download_status_message(status: dict, gid: str) -> str:
     )
 
 def remove_duplicates_preserve_order(links: list[str]) -> list[str]:
-    """Removes duplicate links while preserving the original order."""
-    unique_links = []
+    """Removes the links of the same source (see get_known_link_key) while preserving the original order."""
+    unique_links = {}
     for link in links:
-        if link.strip() not in unique_links:
-            unique_links.append(link.strip())
-    return unique_links
+        unique_links.setdefault(get_known_link_key(link), link.strip())
+    return list(unique_links.values())
 
 def get_merge_commands(files: list[Path], track_type: Literal["subs", "attachments", "audio"]) -> str:
     """Generates commands for merging zip files (subtitles, attachments, or audio)."""
@@ -51,43 +67,25 @@ def get_merge_commands(files: list[Path], track_type: Literal["subs", "attachmen
         f"Linux/Unix:\n{unix_command}```"
     )
 
-# Get Bot infos
-def get_bot_infos():
-    """Get bot informations through GET request"""
-    bot_token = DISCORD_TOKEN
-    app_id = APP_ID
-
-    # URL to make the GET request to
-    url = f'https://discord.com/api/v9/applications/{app_id}'
-
-    # Construct the headers with the authorization token
-    headers = {
-        'Authorization': f'Bot {bot_token}'
-    }
-
-    # Perform the GET request with the headers
-    response = requests.get(url, headers=headers, timeout=20).json()
-
-    return response
-
-# Get commands
-def get_commands():
-    """Get commands through GET request"""
-    bot_token = DISCORD_TOKEN
-    app_id = APP_ID
-
-    # URL to make the GET request to
-    url = f'https://discord.com/api/v9/applications/{app_id}/commands'
-
-    # Construct the headers with the authorization token
-    headers = {
-        'Authorization': f'Bot {bot_token}'
-    }
+async def send_chunked_code_block(ctx: SlashContext, header: str, lines: list[str]):
+    """Sends lines inside ```text code blocks, split to respect Discord's 2000-character limit."""
+    current_chunk = header + "```text\n"
 
-    # Perform the GET request with the headers
-    response = requests.get(url, headers=headers, timeout=20).json()
+    for line in lines:
+        line = f"{line}\n"
+        # Check against 1990 to leave room for the closing "```"
+        if len(current_chunk) + len(line) > 1990:
+            current_chunk += "```"
+            await ctx.send(current_chunk)
+            # Reset chunk for the next message
+            current_chunk = "```text\n" + line
+        else:
+            current_chunk += line
 
-    return response
+    # Send the final remaining chunk if it contains lines
+    if current_chunk not in (header + "```text\n", "```text\n"):
+        current_chunk += "```"
+        await ctx.send(current_chunk)
 
 # Check if the command has been run in the allowed channel
 async def is_allowed_channel(ctx: SlashContext) -> bool:
@@ -126,12 +124,11 @@ def get_nyaa_torrent_link(url: str) -> str | None:
 
     return None
 
-async def download_file(gid: str, ctx: SlashContext, message: Message) -> bool | None:
+async def download_file(gid: str, ctx: SlashContext, message: Message, job_id: str | None = None) -> bool | None:
     """Downloads a file and tracks its progress."""
     # Configure logging
     logger = get_logger("downloader")
 
-    file_utils.save_current_dl(gid=gid, user_id=str(ctx.author.id), guild_id=str(ctx.guild_id))
     try:
         progress = aria2_service.track_progress(gid)
         try:
@@ -139,26 +136,24 @@ async def download_file(gid: str, ctx: SlashContext, message: Message) -> bool |
         except StopIteration:
             return True
         
-        # Check for file size limit (Increased to 20 GB)
-        if status["full_size_bytes"] > 20 * 1024 * 1024 * 1024: # More than 20 GB
-            aria2_service.remove_all_downloads(force=True)
-            file_utils.clear_current_dl()
-            file_utils.clear_temp()
+        # Check for file size limit (direct links only report their size once started)
+        if status["full_size_bytes"] > MAX_DOWNLOAD_SIZE:
             await message.edit(
-                content="Error: The file size exceeds 20GB. Please download smaller files."
+                content=f"Error: The file size exceeds {format_bytes(MAX_DOWNLOAD_SIZE)}. Please download smaller files."
             )
-            logger.error("The file size exceeds 20GB for GID: %s", gid)
+            logger.error("The file size exceeds %s for GID: %s", format_bytes(MAX_DOWNLOAD_SIZE), gid)
             return False
 
+        # Bytes written so far are already counted in the free disk space
+        if job_id:
+            admission_controller.update(job_id, downloaded=status["downloaded_bytes"])
+
         # Check for errors in status
         if status["status"] == "error":
             await message.edit(
                 content=f"Download error: {status.get('error', 'Unknown error')}"
             )
             logger.error("Download error: %s", status.get('error', 'Unknown error'))
-            aria2_service.remove_all_downloads(force=True)
-            file_utils.clear_current_dl()
-            file_utils.clear_temp()
             return False
         await message.edit(
             content=get_download_status_message(status, gid)
@@ -170,16 +165,17 @@ async def download_file(gid: str, ctx: SlashContext, message: Message) -> bool |
             )
             return True
         await asyncio.sleep(2)
+    except aria2_service.Aria2BackendError as e:
+        # The caller restarts the download on another backend
+        logger.warning("Lost the Aria2 backend while tracking progress: %s", e)
+        return None
     except Exception as e:
         await ctx.send(f"An error occurred while tracking progress: {e}")
         logger.error("An error occurred while tracking progress: %s", e)
-        aria2_service.remove_all_downloads(force=True)
-        file_utils.clear_current_dl()
-        file_utils.clear_temp()
         return False
 
-async def extract_from_download(gid: str, ctx: SlashContext, message: Message, dir_path: Path, extraction_type: str = "all", event = extraction_cancel_event) -> str | None:
-    """Extracts files from the downloaded archive based on extraction type."""
+async def extract_from_download(gid: str, ctx: SlashContext, message: Message, dir_path: Path, extraction_type: str = "all", event: asyncio.Event | None = None, track_filter: TrackFilter | None = None, full_mediainfo: bool = False, job: file_utils.JobStateObject | None = None) -> str | None:
+    """Extracts files from the downloaded archive based on extraction type, checkpointing each uploaded file."""
     # Configure logging
     logger = get_logger("extract_from_download")
 
@@ -191,113 +187,73 @@ async def extract_from_download(gid: str, ctx: SlashContext, message: Message, d
     if not files:
         await ctx.send("No Matroska files (.mkv, .mk3d, .mka) found for extraction.")
         logger.warning("No Matroska files found for extraction, Extraction aborted.")
-        aria2_service.remove_all_downloads(force=True)
-        file_utils.clear_current_dl()
-        file_utils.clear_temp()
         return
         
     # Chunk the files list to respect Discord's 2000-character limit
-    header = "Files List:\n"
-    current_chunk = header + "```text\n"
+    await send_chunked_code_block(ctx, "Files List:\n", [f"- {file_name}" for file_name in files])
 
-    for file_name in files:
-        line = f"- {file_name}\n"
-        # Check against 1990 to leave room for the closing "```"
-        if len(current_chunk) + len(line) > 1990:
-            current_chunk += "```"
-            await ctx.send(current_chunk)
-            # Reset chunk for the next message
-            current_chunk = "```text\n" + line 
-        else:
-            current_chunk += line
-
-    # Send the final remaining chunk if it contains files
-    if current_chunk not in (header + "```text\n", "```text\n"):
-        current_chunk += "```"
-        await ctx.send(current_chunk)
+    set_log_context(gid=gid, stage="extracting")
+    # Every job extracts to its own directory
+    extract_dir = file_utils.get_job_extract_dir(job.job_id) if job else Path(EXTRACT_DIR)
+    if job:
+        profiler.set_stage(job.job_id, "extracting")
+        job = file_utils.update_job(job.job_id, stage="extracting") or job
 
     # Perform extraction
     for i, file in enumerate(full_paths, start=1):
+        # Skip files already uploaded before a restart
+        if job and file in job.completed_files:
+            logger.info("Skipping (%d/%d), already uploaded before restart.", i, len(full_paths))
+            continue
+
         # Check for cancellation
-        if event.is_set():
-            aria2_service.remove_all_downloads(force=True)
-            file_utils.clear_current_dl()
-            file_utils.clear_temp()
+        if event and event.is_set():
             await ctx.send("Extraction has been cancelled.")
             logger.info("Extraction for download with GID: %s has been cancelled.", gid)
             return
         logger.info("Processing (%d/%d)", i, len(full_paths))
         message = await ctx.send(f"Processing file ({i}/{len(full_paths)})...")
         try:
-            mkv_service_class = mkv_service.MKVService()
-            
-            # Initialize extraction results
-            zipped_subs = None
-            zipped_attachments = None
-            zipped_audio = None
-            chapters = None
-            mediainfo_path = None
-
-            # Always save mediainfo
-            mediainfo = mkv_service_class.get_mediainfo(file)
-            mediainfo_path = file_utils.save_file_to_extract_dir(mediainfo.encode("utf-8"), "mediainfo.txt")
-
-            # Extract based on type
-            if extraction_type in ["subtitles", "all", "all_without_audio"]:
-                zipped_subs = mkv_service_class.extract_subtitles(file)
-            
-            if extraction_type in ["attachments", "all", "all_without_audio"]:
-                zipped_attachments = mkv_service_class.extract_attachments(file)
-            
-            if extraction_type in ["chapters", "all", "all_without_audio"]:
-                chapters = mkv_service_class.extract_chapters(file)
-            
-            if extraction_type in ["audio", "all"]:
-                zipped_audio = mkv_service_class.extract_audio(file)
-
-            # Files' paths to send
-            files=[
-                mediainfo_path,
-                chapters.get("path") if chapters else None
-            ]
-            files.extend(zipped_subs.paths if zipped_subs else [])
-            files.extend(zipped_attachments.paths if zipped_attachments else [])
-            files.extend(zipped_audio.paths if zipped_audio else [])
-            
+            # Refine the extraction reservation with the track sizes of this file
+            extraction_bytes = None
+            if job:
+                info = await asyncio.to_thread(mkv_service.MKVService.get_mkv_formatted_info, file)
+                extraction_bytes = estimate_extraction_bytes_from_info(info, extraction_type, track_filter) if info else None
+                if extraction_bytes is not None:
+                    admission_controller.update(job.job_id, extraction=extraction_bytes)
+
+            # Outputs that fit the staging budget stay in memory, off the disk the downloads are written to
+            staged_dir = staging_area.acquire(job.job_id, extraction_bytes) if job else None
+            # The tools run in a thread, the other jobs keep running meanwhile
+            result = await asyncio.to_thread(
+                extraction.extract_file,
+                file, staged_dir or extract_dir, extraction_type=extraction_type, track_filter=track_filter, full_mediainfo=full_mediainfo
+            )
+            files = result.paths
+            if staged_dir:
+                output_dir = await asyncio.to_thread(staging_area.settle, job.job_id, files, extract_dir)
+                files = [output_dir / path.relative_to(staged_dir) for path in files]
+
             logger.info("Finished processing MKV file, Uploading results...")
             await message.edit(content="Uploading results...")
-            
+
             # Build the summary message
             summary = f"`{os.path.basename(file)}`\n```"
-            
-            if extraction_type in ["subtitles", "all", "all_without_audio"]:
-                summary += f"Subtitles: {zipped_subs.count if zipped_subs else 0}\n"
-            
-            if extraction_type in ["attachments", "all", "all_without_audio"]:
-                summary += f"Attachments: {zipped_attachments.count if zipped_attachments else 0}\n"
-            
-            if extraction_type in ["chapters", "all", "all_without_audio"]:
-                summary += f"Chapters: {chapters.get('count') if chapters else 0}\n"
-            
-            if extraction_type in ["audio", "all"]:
-                summary += f"Audio Tracks: {zipped_audio.count if zipped_audio else 0}\n"
-            
+            for content, count in result.counts().items():
+                summary += f"{extraction.CONTENT_LABELS[content]}: {count}\n"
+            if track_filter:
+                summary += f"Filters: {track_filter}\n"
             summary += "```"
-            
+
             # Build merge commands if needed
             merge_commands = ""
-            
-            if extraction_type in ["subtitles", "all", "all_without_audio"] and zipped_subs and len(zipped_subs.paths) > 1:
-                merge_commands += f"{get_merge_commands(zipped_subs.paths, 'subs')}\n"
-            
-            if extraction_type in ["attachments", "all", "all_without_audio"] and zipped_attachments and len(zipped_attachments.paths) > 1:
-                merge_commands += f"{get_merge_commands(zipped_attachments.paths, 'attachments')}\n"
-            
-            if extraction_type in ["audio", "all"] and zipped_audio and len(zipped_audio.paths) > 1:
-                merge_commands += f"{get_merge_commands(zipped_audio.paths, 'audio')}\n"
-            
-            # Filter out None values and prepare your list of Discord File objects
-            valid_files = [File(file=f, file_name=os.path.basename(f)) for f in files if f is not None]
+            for zipped, track_type in ((result.subtitles, "subs"), (result.attachments, "attachments"), (result.audio, "audio")):
+                if zipped and len(zipped.paths) > 1:
+                    merge_commands += f"{get_merge_commands(zipped.paths, track_type)}\n"
+
+            # Prepare the list of Discord File objects
+            valid_files = [File(file=f, file_name=os.path.basename(f)) for f in files]
+            upload_start = time.perf_counter()
 
             # Split the files into batches of 10 to comply with Discord's strict limits
             file_chunks = [valid_files[i:i + 10] for i in range(0, len(valid_files), 10)]
@@ -315,19 +271,443 @@ async def extract_from_download(gid: str, ctx: SlashContext, message: Message, d
             else:
                 # Fallback if somehow there are absolutely no files to attach
                 await message.edit(content=summary + merge_commands)
+            STAGE_DURATION.observe(time.perf_counter() - upload_start, stage="upload")
+            UPLOADED_BYTES.inc(sum(os.path.getsize(f) for f in files))
 
             logger.info("Finished upload results for: %s (Total files sent: %d)", os.path.basename(file), len(valid_files))
+
+            # Checkpoint the uploaded file so a restart resumes after it
+            if job:
+                job = file_utils.update_job(
+                    job.job_id,
+                    completed_files=[*job.completed_files, file],
+                    uploaded=[*job.uploaded, {"file": file, "results": [f.file_name for f in valid_files]}]
+                ) or job
         except Exception as e:
             await ctx.send(f"An error occurred while extracting MKV info from `{os.path.basename(file)}`: {e}")
             logger.error("An error occurred while extracting MKV info from %s: %s", os.path.basename(file), e)
             continue
-        file_utils.clear_extract_dir()
+        finally:
+            if job:
+                staging_area.release(job.job_id)
+        file_utils.clear_extract_dir(extract_dir)
+
+    # Extraction outputs are gone, only the download stays on disk until cleanup
+    if job:
+        admission_controller.release(job.job_id, "extraction")
+
+async def inspect_download(ctx: SlashContext, url: str, job: file_utils.JobStateObject, event: asyncio.Event | None = None) -> bool:
+    """Downloads only the head of every Matroska file and replies with their track layout."""
+    # Configure logging
+    logger = get_logger("inspector")
+
+    message = await ctx.send("Starting inspection...")
+    gid = aria2_service.add_torrent(url, options=aria2_service.get_head_first_options(INSPECT_HEAD_SIZE), subdir=job.job_id)
+    job = file_utils.update_job(job.job_id, gids=[*job.gids, gid]) or job
+    set_log_context(gid=gid, stage="inspecting")
+    logger.info("Started inspection with GID: %s", gid)
+
+    deadline = time.monotonic() + INSPECT_TIMEOUT
+    timed_out = False
+    layouts: dict[str, Identification | None] = {}
+    matroska_heads: list[dict] = []
+    status = aria2_service.get_status(gid)
+    while True:
+        # Check for cancellation
+        if event and event.is_set():
+            await message.edit(content="Inspection has been cancelled.")
+            logger.info("Inspection with GID: %s has been cancelled.", gid)
+            return False
+
+        status = aria2_service.get_status(gid)
+        # Metadata (magnet/.torrent) downloaded, follow the actual download
+        if status["followed_by_ids"]:
+            gid = status["followed_by_ids"][0]
+            job = file_utils.update_job(job.job_id, gids=[*job.gids, gid]) or job
+            set_log_context(gid=gid)
+            logger.info("Metadata downloaded, inspecting following download with GID: %s", gid)
+            continue
+
+        if status["status"] == "error":
+            await message.edit(content="Inspection failed: download error.")
+            logger.error("Download error while inspecting GID: %s", gid)
+            return False
+
+        # Parse the Tracks element of every file whose head is downloaded
+        heads = aria2_service.get_file_heads(gid, INSPECT_HEAD_SIZE)
+        matroska_heads = [
+            head for head in heads
+            if head["selected"] and head["path"].lower().endswith(file_utils.MATROSKA_EXTENSIONS)
+        ]
+        for head in matroska_heads:
+            if head["path"] not in layouts and head["head_complete"]:
+                # Reads up to INSPECT_HEAD_SIZE of every file, off the event loop
+                layouts[head["path"]] = await asyncio.to_thread(ebml.read_head, head["path"], INSPECT_HEAD_SIZE)
+
+        if matroska_heads and all(head["path"] in layouts for head in matroska_heads):
+            break
+        timed_out = time.monotonic() > deadline
+        if status["status"] == "complete" or timed_out:
+            break
+
+        await message.edit(
+            content=f"Inspecting `{status['name']}`: {len(layouts)}/{len(matroska_heads) or '?'} files identified..."
+        )
+        await asyncio.sleep(2)
+
+    # Stop the download as soon as the layouts are known
+    aria2_service.remove_downloads(job.gids)
+
+    if not matroska_heads:
+        await message.edit(content="No Matroska files (.mkv, .mk3d, .mka) found for inspection.")
+        logger.warning("No Matroska files found for inspection of GID: %s", gid)
+        return False
+
+    await message.edit(content=f"Track layout of `{status['name']}` ({len(matroska_heads)} files):")
+    for head in matroska_heads:
+        file_name = os.path.relpath(head["path"], status["dir"]) if status["dir"] else head["path"]
+        if head["path"] not in layouts:
+            # Never parsed, direct links only report their head once the whole file is downloaded
+            if timed_out:
+                await ctx.send(f"`{file_name}`: head not downloaded within the {INSPECT_TIMEOUT}s inspection timeout.")
+            else:
+                await ctx.send(f"`{file_name}`: head not downloaded.")
+            continue
+        layout = layouts[head["path"]]
+        if layout is None:
+            await ctx.send(f"`{file_name}`: track layout not found in the first {INSPECT_HEAD_SIZE // (1024 * 1024)} MB.")
+            continue
+        await send_chunked_code_block(
+            ctx, f"`{file_name}`\n", mkv_service.format_track_table(layout).splitlines()
+        )
+
+    logger.info("Inspection with GID: %s finished, %d/%d files identified.", gid, len([l for l in layouts.values() if l]), len(matroska_heads))
+    return True
+
+async def admit_download(message: Message, job: file_utils.JobStateObject, gid: str, status: dict) -> bool:
+    """Reserves disk space for a download once its size is known, keeping it paused while waiting."""
+    # Configure logging
+    logger = get_logger("admission")
+
+    total_length = status["total_length"]
+    if total_length > MAX_DOWNLOAD_SIZE:
+        await message.edit(
+            content=f"Error: The download size ({format_bytes(total_length)}) exceeds {format_bytes(MAX_DOWNLOAD_SIZE)}. Please download smaller files."
+        )
+        logger.error("The download size exceeds %s for GID: %s", format_bytes(MAX_DOWNLOAD_SIZE), gid)
+        return False
+
+    extraction = estimate_extraction_bytes(aria2_service.get_largest_selected_file_size(gid), job.extraction_type)
+    downloaded = status["completed_length"]
+    if not admission_controller.fits_now(job.job_id, total_length, extraction, downloaded):
+        aria2_service.pause_download(gid)
+        await message.edit(
+            content=(
+                f"Waiting for disk space: the download needs {format_bytes(total_length + extraction)}, "
+                f"{format_bytes(max(admission_controller.available_bytes(job.job_id), 0))} are available."
+            )
+        )
+
+    admitted, reason = await admission_controller.reserve(
+        job.job_id, total_length, extraction, timeout=ADMISSION_TIMEOUT, downloaded=downloaded
+    )
+    if not admitted:
+        await message.edit(content=f"Error: {reason}")
+        return False
+
+    # Torrents are paused once their metadata is known (pause-metadata), start them now
+    aria2_service.resume_download(gid)
+    return True
+
+async def admit_shared_download(message: Message, job: file_utils.JobStateObject, dir_path: Path) -> bool:
+    """Reserves the extraction space of a job reusing the download of another job (already on disk)."""
+    temp_files = file_utils.get_temp_files(dir_path)
+    largest_file = max((os.path.getsize(f) for f in temp_files["full_paths"]), default=0) if temp_files else 0
+    extraction = estimate_extraction_bytes(largest_file, job.extraction_type)
+    admitted, reason = await admission_controller.reserve(job.job_id, 0, extraction, timeout=ADMISSION_TIMEOUT)
+    if not admitted:
+        await message.edit(content=f"Error: {reason}")
+    return admitted
+
+async def handle_stall(message: Message, job: file_utils.JobStateObject, gid: str, status: dict, stall: StallDetector) -> bool:
+    """
+    Deprioritizes a stalled download: its slot goes to the waiting jobs while it is paused, or it keeps
+    running when no job is waiting. Once out of retries, the download is aborted. Returns False if aborted.
+    """
+    # Configure logging
+    logger = get_logger("stall")
+
+    seeders = f", {status['seeders']} seeders" if status.get("seeders") is not None else ""
+    details = f"{format_bytes(int(stall.speed))}/s over the last {int(stall.window)}s{seeders}"
+    if stall.stalls >= STALL_RETRIES:
+        STALLED_DOWNLOADS.inc(action="aborted")
+        await message.edit(content=f"Download stalled ({details}), it has been aborted.")
+        logger.warning("Download with GID: %s stalled (%s), aborted.", gid, details)
+        return False
+    stall.stalls += 1
+
+    ticket = job_scheduler.running.get(job.job_id)
+    if ticket is not None and any(not t.held for t in job_scheduler.waiting):
+        STALLED_DOWNLOADS.inc(action="requeued")
+        aria2_service.pause_download(gid)
+        await message.edit(content=f"Download stalled ({details}), giving its slot to the waiting jobs.")
+        logger.warning("Download with GID: %s stalled (%s), requeued.", gid, details)
+        # A cancellation while waiting is handled by the caller's next check
+        await job_scheduler.requeue(ticket)
+        aria2_service.resume_download(gid)
+    else:
+        STALLED_DOWNLOADS.inc(action="kept")
+        logger.warning("Download with GID: %s stalled (%s), no job is waiting for its slot.", gid, details)
+    stall.reset()
+    return True
+
+def get_resumable_gid(job: file_utils.JobStateObject) -> str | None:
+    """Returns the most recent GID of a job that Aria2 still knows about (restored from its session)."""
+    for gid in reversed(job.gids):
+        try:
+            status = aria2_service.get_status(gid)
+        except Exception:
+            continue
+        if status["status"] not in ("error", "removed"):
+            return gid
+    return None
+
+async def download_from_url(ctx: SlashContext, url: str, job: file_utils.JobStateObject, event: asyncio.Event | None = None) -> tuple[str, Path, Message] | None:
+    """Downloads a link (following metadata downloads), returns the final GID, its directory and the status message."""
+    # Configure logging
+    logger = get_logger("downloader")
+
+    # Resume the download restored from the Aria2 session, or add it again so Aria2 continues the partial files
+    gid = get_resumable_gid(job) if job.gids else None
+    if gid:
+        message = await ctx.send(f"Resuming download with GID: `{gid}`")
+        logger.info("Resuming download with GID: %s", gid)
+    else:
+        message = await ctx.send("Starting download...")
+        gid = aria2_service.add_torrent(url, subdir=job.job_id)
+        await message.edit(content=f"Added download with GID: `{gid}`")
+        logger.info("Started download with GID: %s", gid)
+        job = file_utils.update_job(job.job_id, stage="downloading", gids=[*job.gids, gid]) or job
+    set_log_context(gid=gid, stage="downloading")
+    profiler.set_stage(job.job_id, "downloading")
+
+    #region Track METADATA/DDL/Torrent progress
+    admitted = False
+    failovers = 0
+    # Stalled downloads give their slot away, then are aborted (STALL_TIMEOUT=0 disables it)
+    stall = StallDetector(STALL_TIMEOUT, STALL_MIN_SPEED)
+    stage_start = time.perf_counter()
+    while True:
+        # Check for cancellation
+        if event and event.is_set():
+            await message.edit(content="Download has been cancelled.")
+            logger.info("Download with GID: %s has been cancelled.", gid)
+            return None
 
-async def download_and_extract(ctx: SlashContext, url: str, extraction_type: str = "all") -> bool:
-    """Combined download and extraction process."""
-    # Reset cancellation event
-    extraction_cancel_event.clear()
+        try:
+            status = aria2_service.get_status(gid)
+        except aria2_service.Aria2BackendError as e:
+            # The backend holding the download stopped responding, start it over on another one
+            failovers += 1
+            if failovers > len(aria2_service.backends):
+                raise
+            logger.warning("Restarting the download of GID %s on another backend: %s", gid, e)
+            gid = aria2_service.add_torrent(url, subdir=job.job_id)
+            job = file_utils.update_job(job.job_id, gids=[*job.gids, gid]) or job
+            set_log_context(gid=gid)
+            message = await ctx.send(f"Aria2 backend stopped responding, restarted the download with GID: `{gid}`")
+            admitted = False
+            stall.reset()
+            continue
+        if status["status"] == "complete":
+            # Metadata (magnet/.torrent) downloaded, follow the actual download
+            if status["followed_by_ids"]:
+                STAGE_DURATION.observe(time.perf_counter() - stage_start, stage="metadata")
+                stage_start = time.perf_counter()
+                gid = status["followed_by_ids"][0]
+                set_log_context(gid=gid)
+                message = await ctx.send(f"Metadata downloaded. New GID: `{gid}`")
+                logger.info("Metadata downloaded, starting following download with GID: %s", gid)
+                job = file_utils.update_job(job.job_id, gids=[*job.gids, gid]) or job
+                admitted = False
+                stall.reset()
+                continue
+            STAGE_DURATION.observe(time.perf_counter() - stage_start, stage="download")
+            DOWNLOADED_BYTES.inc(status["total_length"])
+            break
+
+        # Reserve disk space as soon as the size of the download is known
+        if not admitted and status["total_length"] > 0:
+            admitted = await admit_download(message, job, gid, status)
+            if not admitted:
+                return None
+            # Waiting for disk space does not count as a stall
+            stall.reset()
+
+        stall.add(status["completed_length"])
+        if stall.stalled and not await handle_stall(message, job, gid, status, stall):
+            return None
+
+        # Check if complete
+        completed = await download_file(gid, ctx, message, job_id=job.job_id)
+        if completed is False:
+            return None
+    #endregion
+
+    dir_path = aria2_service.wait_for_completion(gid)
+    await message.edit(content=f"Download complete! Saved to `{dir_path}`", components=[])
+    logger.info("Download with GID: %s completed and saved to %s", gid, dir_path)
+    file_utils.update_job(job.job_id, stage="downloaded", dir_path=str(dir_path))
+    set_log_context(stage="downloaded")
+    return gid, Path(dir_path), message
+
+def get_priority(ctx: SlashContext) -> int:
+    """Scheduling priority of the user who ran the command, administrators go first."""
+    has_permission = getattr(ctx.author, "has_permission", None)
+    if has_permission is not None and has_permission(Permissions.ADMINISTRATOR):
+        return PRIORITY_ADMIN
+    return PRIORITY_NORMAL
+
+def cleanup_job(job: file_utils.JobStateObject):
+    """Removes the downloads and the temp files of a job, leaving the ones of the other jobs."""
+    job = file_utils.get_job(job.job_id) or job
+    aria2_service.remove_downloads(job.gids)
+    file_utils.clear_job_dirs(job.job_id)
+    # The job that downloaded the files finished before a restart
+    if job.shared_from:
+        file_utils.clear_job_dirs(job.shared_from)
+
+def retain_download(shared: SharedDownload, finished: list[file_utils.JobStateObject]):
+    """Keeps the files of a release once its last job is done with them, for the next jobs of the release."""
+    if shared.retained:
+        retention_store.release(shared.key)
+        return
+    leader = next((job for job in finished if job.job_id == shared.leader), None)
+    if leader is None or shared.dir_path is None:
+        return
+    # Aria2 must not write to (or seed from) the files anymore
+    aria2_service.remove_downloads(leader.gids)
+    retention_store.retain(shared.key, shared.dir_path)
+
+async def download_and_extract(ctx: SlashContext, url: str, extraction_type: str = "all", track_filter: TrackFilter | None = None, full_mediainfo: bool = False, job: file_utils.JobStateObject | None = None, queue_options: dict | None = None, event: asyncio.Event | None = None) -> bool:
+    """
+    Combined download and extraction process, checkpointed so it can resume after a restart.
+
+    The job waits for a slot of the scheduler first, links of a /start_queue run and API jobs as background jobs.
+    Jobs of the same release share one download, each running its own extraction from it.
+
+    Args:
+        ctx (SlashContext): The context to report progress and upload results to.
+        url (str): The torrent, magnet or direct download link.
+        extraction_type (str): What to extract from the Matroska files.
+        track_filter (TrackFilter | None): Only extract the tracks selected by this filter.
+        full_mediainfo (bool): Attach the full MediaInfo report instead of the built-in one.
+        job (JobStateObject | None): The saved state of an unfinished job to resume, or of a new API job.
+        queue_options (dict | None): Options of the /start_queue run the link belongs to.
+        event (asyncio.Event | None): Cancels the job when set, shared by the links of a /start_queue run.
+
+    Returns:
+        bool: True if the job completed.
+    """
+    # Configure logging
+    logger = get_logger("download_and_extractor")
 
+    # A worker process runs the job, its messages and results are relayed to ctx
+    if WORKER_MODE == "broker":
+        return await job_broker.submit_and_relay(ctx, {
+            "kind": "queue" if queue_options is not None else (job.kind if job else "extract"),
+            "user_id": str(ctx.author.id),
+            "guild_id": str(ctx.guild_id),
+            "channel_id": str(ctx.channel_id),
+            "url": url,
+            "extraction_type": extraction_type,
+            "filters": track_filter.expression if track_filter else "",
+            "full_mediainfo": full_mediainfo,
+            "queue": queue_options,
+            "priority": get_priority(ctx),
+        }, event, job_id=job.job_id if job else None)
+
+    # Resolved before the job is checkpointed, an error here must not leave a job that fails again at every startup
+    link_key = await resolve_link_key(url) if extraction_type != "inspect" else ""
+
+    if job is None:
+        job = file_utils.create_job(
+            kind="queue" if queue_options is not None else "extract",
+            user_id=str(ctx.author.id),
+            guild_id=str(ctx.guild_id),
+            channel_id=str(ctx.channel_id),
+            url=url,
+            extraction_type=extraction_type,
+            filters=track_filter.expression if track_filter else "",
+            full_mediainfo=full_mediainfo,
+            queue=queue_options,
+            priority=get_priority(ctx),
+        )
+    event = event or asyncio.Event()
+
+    # Correlate every record of the job, including the ones of the services it calls
+    log_token = set_log_context(job_id=job.job_id, user_id=job.user_id, guild_id=job.guild_id, stage=job.stage)
+
+    # Jobs of the same release share one download, inspections only fetch the heads of the files
+    shared = None
+    if link_key:
+        shared = download_coalescer.join(link_key, job)
+        # A download kept from the earlier jobs of the release is ready at once
+        if not shared.ready and shared.leader == job.job_id:
+            retained_dir = retention_store.acquire(shared.key)
+            if retained_dir is not None:
+                shared.retained = True
+                download_coalescer.publish(shared, "", retained_dir)
+    held = shared is not None and download_coalescer.is_held(shared, job.job_id)
+    ticket = job_scheduler.enqueue(
+        job.job_id, job.user_id, job.guild_id, url=job.url, priority=job.priority,
+        background=job.kind in ("queue", "api"), cancel_event=event, held=held
+    )
+    started = False
+    try:
+        if held:
+            await ctx.send("This release is already being downloaded for another job, your extraction starts once it completes.")
+            logger.info("Job %s waiting for the download of job %s.", job.job_id, shared.leader)
+        elif not job_scheduler.is_running(ticket):
+            await ctx.send(f"All download slots are busy, your job is number {job_scheduler.position(ticket)} in line.")
+            logger.info("Job %s waiting for a slot.", job.job_id)
+        started = await job_scheduler.wait(ticket)
+        if not started:
+            await ctx.send("Job has been cancelled before it started.")
+            completed = False
+        else:
+            ACTIVE_JOBS.inc()
+            job_start = time.perf_counter()
+            # Profiled when armed by PROFILE_NEXT_JOBS or the /profile command
+            async with profiler.profile_job(job.job_id):
+                completed = await _download_and_extract(ctx, url, extraction_type, track_filter, full_mediainfo, job, event, shared)
+            STAGE_DURATION.observe(time.perf_counter() - job_start, stage="job")
+    except asyncio.CancelledError:
+        # The bot is shutting down, keep the job so it resumes at the next startup
+        logger.warning("Job %s interrupted at stage %s, it will resume at startup.", job.job_id, job.stage)
+        JOBS.inc(outcome="interrupted")
+        raise
+    finally:
+        job_scheduler.release(ticket)
+        admission_controller.release(job.job_id)
+        if started:
+            ACTIVE_JOBS.dec()
+        reset_log_context(log_token)
+
+    JOBS.inc(outcome="completed" if completed else "failed")
+
+    # A shared download stays on disk until the last job of the release is done with it, then is retained
+    job = file_utils.get_job(job.job_id) or job
+    finished = download_coalescer.leave(shared, job) if shared is not None else [job]
+    if shared is not None and shared.ready and finished:
+        retain_download(shared, finished)
+    for finished_job in finished:
+        cleanup_job(finished_job)
+    file_utils.remove_job(job.job_id)
+    return completed
+
+async def _download_and_extract(ctx: SlashContext, url: str, extraction_type: str, track_filter: TrackFilter | None, full_mediainfo: bool, job: file_utils.JobStateObject, event: asyncio.Event, shared: SharedDownload | None = None) -> bool:
+    """Runs the stages of a job, skipping the ones completed before a restart."""
     # Configure logging
     logger = get_logger("download_and_extractor")
 
@@ -337,11 +717,6 @@ async def download_and_extract(ctx: SlashContext, url: str, extraction_type: str
         if not connection_established:
             await ctx.send("Error: Unable to connect to Aria2 RPC server.")
             return False
-
-        if file_utils.load_current_dl():
-            await ctx.send("A download is already in progress. Please wait for it to finish or cancel it before starting a new one.")
-            logger.warning("Download attempt rejected while another download is in progress.")
-            return False
         #endregion
 
         # Try to get direct torrent link from nyaa.si
@@ -349,101 +724,239 @@ async def download_and_extract(ctx: SlashContext, url: str, extraction_type: str
         if torrent_link:
             url = torrent_link
 
-        #region ---- Stage 1: Download ----
-        message = await ctx.send("Starting download...")
-        gid = aria2_service.add_torrent(url)
-        await message.edit(content=f"Added download with GID: `{gid}`")
-        logger.info("Started download with GID: %s", gid)
+        # Inspection stops after identification, nothing gets extracted
+        if extraction_type == "inspect":
+            return await inspect_download(ctx, url, job, event)
 
-        #region Track METADATA/DDL links progress
-        status = aria2_service.get_status(gid)
-        while True:
-            # Check for cancellation
-            if extraction_cancel_event.is_set():
-                aria2_service.remove_all_downloads(force=True)
-                file_utils.clear_current_dl()
-                file_utils.clear_temp()
-                await message.edit(content="Download has been cancelled.")
-                logger.info("Download with GID: %s has been cancelled.", gid)
-                return False
-            # Check if complete
-            completed = await download_file(gid, ctx, message)
-            if completed is True:
-                break
-            if completed is False:
+        #region ---- Stage 1: Download ----
+        if shared is not None and shared.ready and shared.retained:
+            # An earlier job of the same release downloaded the files
+            gid, dir_path = shared.gid, shared.dir_path
+            message = await ctx.send("Reusing the files of the same release kept from an earlier job.")
+            logger.info("Job %s extracting from the retained download of %s", job.job_id, shared.key)
+            job = file_utils.update_job(job.job_id, stage="downloaded", dir_path=str(dir_path)) or job
+            if not await admit_shared_download(message, job, dir_path):
                 return False
-        #endregion
-
-        #region Verify completion
-        try:
-            status = aria2_service.get_status(gid)
-            if status["status"] != "complete":
-                await ctx.send(f"Download failed or incomplete. Current status: {status['status']}")
-                logger.error("Download failed or incomplete. Current status: %s", status['status'])
-                aria2_service.remove_all_downloads(force=True)
-                file_utils.clear_current_dl()
-                file_utils.clear_temp()
+        elif shared is not None and shared.ready and shared.leader != job.job_id:
+            # Another job of the same release downloaded the files
+            gid, dir_path = shared.gid, shared.dir_path
+            message = await ctx.send(f"Reusing the download of the same release from job `{shared.leader}`.")
+            logger.info("Job %s extracting from the download of job %s", job.job_id, shared.leader)
+            job = file_utils.update_job(job.job_id, stage="downloaded", dir_path=str(dir_path), shared_from=shared.leader) or job
+            if not await admit_shared_download(message, job, dir_path):
                 return False
-        except Exception as e:
-            await ctx.send(f"An error occurred while verifying download: {e}")
-            logger.error("An error occurred while verifying download: %s", e)
-            aria2_service.remove_all_downloads(force=True)
-            file_utils.clear_current_dl()
-            file_utils.clear_temp()
-            return False
-        #endregion
-
-        #region Torrent download
-        if status["followed_by_ids"]:
-            try:
-                # Check for cancellation
-                if extraction_cancel_event.is_set():
-                    aria2_service.remove_all_downloads(force=True)
-                    file_utils.clear_current_dl()
-                    file_utils.clear_temp()
-                    await message.edit(content="Torrent download has been cancelled.")
-                    logger.info("Torrent download with GID: %s has been cancelled.", gid)
-                    return False
-                gid = status["followed_by_ids"][0]
-                message = await ctx.send(f"Metadata downloaded. New GID: `{gid}`")
-                logger.info("Metadata downloaded, starting following download with GID: %s", gid)
-                status = aria2_service.get_status(gid)
-                #region Track Torrent progress
-                while status["status"] != "complete":
-                    # Check for cancellation
-                    if extraction_cancel_event.is_set():
-                        aria2_service.remove_all_downloads(force=True)
-                        file_utils.clear_current_dl()
-                        file_utils.clear_temp()
-                        await message.edit(content="Download has been cancelled.")
-                        logger.info("Download with GID: %s has been cancelled.", gid)
-                        return False
-
-                    # Check if complete
-                    completed = await download_file(gid, ctx, message)
-                    if completed is True:
-                        break
-                    if completed is False:
-                        return False
-            #endregion
-            except Exception as e:
-                await ctx.send(f"An error occurred while downloading file: {e}")
-                logger.error("An error occurred while downloading file: %s", e)
-                aria2_service.remove_all_downloads(force=True)
-                file_utils.clear_current_dl()
-                file_utils.clear_temp()
+        elif job.stage in ("downloaded", "extracting") and job.dir_path and Path(job.dir_path).exists():
+            # Download finished before the restart, go straight to extraction
+            gid = job.gids[-1] if job.gids else ""
+            dir_path = Path(job.dir_path)
+            message = await ctx.send(f"Resuming extraction of `{dir_path}`")
+            logger.info("Resuming job %s at stage %s", job.job_id, job.stage)
+        else:
+            downloaded = await download_from_url(ctx, url, job, event)
+            if downloaded is None:
                 return False
-        #endregion
-
-        dir_path = aria2_service.wait_for_completion(gid)
-        await message.edit(content=f"Download complete! Saved to `{dir_path}`", components=[])
-        logger.info("Download with GID: %s completed and saved to %s", gid, dir_path)
+            gid, dir_path, message = downloaded
+        if shared is not None and not shared.ready:
+            download_coalescer.publish(shared, gid, dir_path)
         #endregion
 
         #region ---- Stage 2: Extraction ----
-        await extract_from_download(gid=gid, ctx=ctx, message=message, dir_path=dir_path, extraction_type=extraction_type)
+        await extract_from_download(
+            gid=gid, ctx=ctx, message=message, dir_path=dir_path,
+            extraction_type=extraction_type, event=event, track_filter=track_filter, full_mediainfo=full_mediainfo,
+            job=file_utils.get_job(job.job_id) or job
+        )
         return True
     except Exception as e:
         await ctx.send(f"An unexpected error occurred: {e}")
         logger.error("An unexpected error occurred: %s", e)
         return False
+
+async def process_queue(ctx: SlashContext, extraction_type: str, override_filter: TrackFilter | None = None, full_mediainfo: bool = False, resume_job: file_utils.JobStateObject | None = None):
+    """
+    Downloads, extracts and uploads the links of the user's queue one by one, removing each completed link.
+
+    Each link is scheduled as a background job, so the slots go to the other users' jobs in between.
+    """
+    user_id = str(ctx.author.id)
+    if user_id in running_queue_users:
+        await ctx.send(f"{ctx.author.mention}, Your queue is already being processed.")
+        if resume_job:
+            # The running run processes the interrupted link again, from the queue
+            cleanup_job(resume_job)
+            file_utils.remove_job(resume_job.job_id)
+        return
+    running_queue_users.add(user_id)
+    try:
+        await _process_queue(ctx, user_id, extraction_type, override_filter, full_mediainfo, resume_job)
+    finally:
+        running_queue_users.discard(user_id)
+
+async def _process_queue(ctx: SlashContext, user_id: str, extraction_type: str, override_filter: TrackFilter | None, full_mediainfo: bool, resume_job: file_utils.JobStateObject | None):
+    """Runs the links of a queue, once the user's run is registered."""
+    # Configure logging
+    logger = get_logger("process_queue")
+
+    queue = file_utils.get_user_queue(user_id)
+    queue_items = queue.links.copy() if queue else []
+
+    # The link interrupted by a restart goes first, with its saved state
+    pending: list[tuple[dict, file_utils.JobStateObject | None]] = []
+    if resume_job:
+        queue_items = [item for item in queue_items if item.get("link") != resume_job.url]
+        pending.append(({"link": resume_job.url, "filters": resume_job.filters}, resume_job))
+    pending.extend((item, None) for item in queue_items)
+    links_size = len(pending)
+
+    queue_options = {
+        "type": extraction_type,
+        "filters": override_filter.expression if override_filter else "",
+        "full_mediainfo": full_mediainfo
+    }
+    # Set by /stop_all through the link being processed, stops the whole run
+    cancel_event = asyncio.Event()
+
+    for i, (queue_item, job) in enumerate(pending, start=1):
+        url = queue_item.get("link", "")
+        try:
+            # Use the override filters if given, otherwise the ones stored with the link
+            track_filter = override_filter or parse_track_filter(queue_item.get("filters", ""))
+        except ValueError as e:
+            logger.warning("Ignoring invalid stored filters for URL %s: %s", url, e)
+            track_filter = None
+
+        # Check for cancellation
+        if cancel_event.is_set():
+            await ctx.send(content="queue processing has been cancelled.")
+            break
+
+        logger.info("Starting download and extraction for URL: %s with extraction type: %s", url, extraction_type)
+        completed = await download_and_extract(
+            ctx, url, extraction_type=extraction_type, track_filter=track_filter,
+            full_mediainfo=full_mediainfo, job=job, queue_options=queue_options, event=cancel_event
+        )
+
+        # Check if completed successfully
+        if completed is True:
+            # Remove the specific URL from queue
+            file_utils.remove_from_queue(user_id, [url])
+            logger.info("Extraction process completed for (%d/%d) links.", i, links_size)
+            await ctx.send(
+                f"{ctx.author.mention}, "
+                f"Extraction process completed for ({i}/{links_size}) links.\n"
+                f"{'Processing next link...' if i < links_size else ''}"
+            )
+        else:
+            logger.error("Extraction process failed for URL: %s", url)
+            await ctx.send(
+                f"{ctx.author.mention}, "
+                f"Extraction process failed for the link:\n"
+                f"{url}\n\n"
+                f"{'Skipping to the next link...' if i < links_size else ''}"
+            )
+
+    logger.info("Extraction process completed for all links.")
+    await ctx.send(
+        f"{ctx.author.mention}, Extraction process completed for all links, Have Fun :grin:"
+    )
+
+class ChannelContext:
+    """Minimal stand-in for SlashContext, used to report resumed jobs to their channel."""
+    def __init__(self, channel, user_id: str, guild_id: str):
+        self.channel = channel
+        self.channel_id = channel.id
+        self.guild_id = guild_id
+        self.author = SimpleNamespace(id=int(user_id), mention=f"<@{user_id}>")
+
+    async def send(self, content: str | None = None, **kwargs) -> Message:
+        """Sends a message to the job's channel."""
+        return await self.channel.send(content=content, **kwargs)
+
+async def resume_jobs(bot):
+    """Resumes the jobs left unfinished by a restart, from their last completed stage."""
+    # Configure logging
+    logger = get_logger("resume_jobs")
+
+    # The workers keep running the jobs, only relaying their messages is resumed
+    if WORKER_MODE == "broker":
+        await resume_remote_jobs(bot)
+        return
+
+    jobs = file_utils.load_jobs()
+    if not jobs:
+        return
+
+    logger.info("Resuming %d unfinished jobs.", len(jobs))
+    # The resumed jobs wait for their slots in the scheduler like new ones
+    await asyncio.gather(*(resume_job(bot, job) for job in jobs))
+
+async def resume_job(bot, job: file_utils.JobStateObject):
+    """Resumes a job left unfinished by a restart, or the /start_queue run it belongs to."""
+    # Configure logging
+    logger = get_logger("resume_jobs")
+
+    # API clients submit their jobs again
+    if job.kind == "api":
+        logger.info("Dropping API job %s interrupted at stage %s.", job.job_id, job.stage)
+        cleanup_job(job)
+        file_utils.remove_job(job.job_id)
+        return
+
+    try:
+        channel = await bot.fetch_channel(int(job.channel_id))
+    except Exception as e:
+        channel = None
+        logger.error("Could not fetch channel %s of job %s: %s", job.channel_id, job.job_id, e)
+    if channel is None:
+        cleanup_job(job)
+        file_utils.remove_job(job.job_id)
+        return
+
+    ctx = ChannelContext(channel, job.user_id, job.guild_id)
+    await ctx.send(f"{ctx.author.mention}, resuming your interrupted job from stage `{job.stage}`: {job.url}")
+    logger.info("Resuming job %s (%s) from stage %s", job.job_id, job.kind, job.stage)
+
+    if job.kind == "queue" and job.queue:
+        try:
+            override_filter = parse_track_filter(job.queue.get("filters", ""))
+        except ValueError:
+            override_filter = None
+        await process_queue(
+            ctx, job.queue.get("type", job.extraction_type), override_filter=override_filter,
+            full_mediainfo=job.queue.get("full_mediainfo", False), resume_job=job
+        )
+    else:
+        try:
+            track_filter = parse_track_filter(job.filters)
+        except ValueError:
+            track_filter = None
+        completed = await download_and_extract(
+            ctx, job.url, extraction_type=job.extraction_type, track_filter=track_filter,
+            full_mediainfo=job.full_mediainfo, job=job
+        )
+        if completed is True:
+            await ctx.send(f"{ctx.author.mention}, Extraction process completed for all files, Have Fun :grin:")
+
+async def resume_remote_jobs(bot):
+    """Re-attaches to the jobs the workers ran while the bot was offline, relaying their messages."""
+    # Configure logging
+    logger = get_logger("resume_jobs")
+
+    jobs = job_broker.list_jobs()
+    if not jobs:
+        return
+
+    logger.info("Re-attaching to %d worker jobs.", len(jobs))
+    for job in jobs:
+        try:
+            channel = await bot.fetch_channel(int(job.payload.get("channel_id", 0)))
+        except Exception as e:
+            channel = None
+            logger.error("Could not fetch channel of job %s: %s", job.job_id, e)
+        if channel is None:
+            job_broker.cancel_jobs(job_id=job.job_id)
+            continue
+
+        ctx = ChannelContext(channel, job.payload.get("user_id", "0"), job.payload.get("guild_id", ""))
+        await ctx.send(f"{ctx.author.mention}, the bot restarted, following your job again: {job.payload.get('url')}")
+        asyncio.create_task(job_broker.relay(ctx, job.job_id))
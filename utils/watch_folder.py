@@ -0,0 +1,368 @@
+"""Watch folder module, extracting the Matroska files landing in a local directory."""
+
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import shutil
+import struct
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from config import WATCH_CHANNEL_ID, WATCH_DIR, WATCH_EXTRACTION_TYPE, WATCH_FILTERS, WATCH_OUTPUT_DIR
+from config import WATCH_POLL_INTERVAL, WATCH_POLLING, WATCH_SETTLE_TIME
+from utils import extraction, file_utils
+from utils.file_utils import MATROSKA_EXTENSIONS
+from utils.logger import get_logger
+from utils.mkv_service import MKVService, SPLIT_SIZE
+from utils.scheduler import job_scheduler
+from utils.track_filter import TrackFilter, parse_track_filter
+from utils.utils import get_merge_commands
+
+# Configure logging
+logger = get_logger("watch_folder")
+
+# User and guild the watch folder jobs are scheduled as, they share one user's slots
+WATCH_USER = "watch"
+
+# Longest time between two size checks of a file being written (seconds)
+SETTLE_CHECK_INTERVAL = 1
+
+#region Inotify
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+# Writes are followed by the size checks, only new and finished files are reported
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# struct inotify_event header: wd, mask, cookie, len
+EVENT_HEADER = struct.Struct("iIII")
+
+class Inotify:
+    """Minimal ctypes binding of Linux inotify, reporting the new files of a directory tree."""
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: dict[int, Path] = {}
+
+    def add_tree(self, root: Path):
+        """Watches a directory and its subdirectories, hidden ones excepted."""
+        for dir_path, dir_names, _ in os.walk(root):
+            dir_names[:] = [name for name in dir_names if not name.startswith(".")]
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(dir_path), WATCH_MASK)
+            if wd < 0:
+                # ENOSPC when fs.inotify.max_user_watches is reached
+                raise OSError(ctypes.get_errno(), f"Could not watch {dir_path}")
+            self._dirs[wd] = Path(dir_path)
+
+    def read(self) -> list[tuple[Path | None, int]]:
+        """Reads the pending events as (path, mask), the path is None when events were lost."""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            i = 0
+            while i + EVENT_HEADER.size <= len(data):
+                wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, i)
+                name = data[i + EVENT_HEADER.size:i + EVENT_HEADER.size + length].rstrip(b"\0")
+                i += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    events.append((None, mask))
+                elif mask & IN_IGNORED:
+                    # The directory was removed
+                    self._dirs.pop(wd, None)
+                elif wd in self._dirs and name:
+                    events.append((self._dirs[wd] / os.fsdecode(name), mask))
+
+    def close(self):
+        os.close(self.fd)
+#endregion
+
+class FolderWatcher:
+    """
+    Watch-folder ingestion: every Matroska file landing in the watched directory tree is extracted once.
+
+    New files are reported by inotify (or found by polling the directory mtimes), then extracted once
+    their size and mtime stopped changing for `settle_time` seconds, as background jobs of the scheduler.
+    The processed files are kept in an index with their size and mtime, so a restart only processes
+    the files that are new or changed since. Results go to a Discord channel, or to the output directory.
+    """
+    def __init__(self, watch_dir: str, output_dir: str, settle_time: float, poll_interval: float, polling: bool):
+        self.watch_dir = Path(watch_dir).resolve()
+        self.output_dir = Path(output_dir).resolve()
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self.polling = polling
+        self.extraction_type = WATCH_EXTRACTION_TYPE
+        self.track_filter: TrackFilter | None = None
+        self.channel = None
+        self.index: dict[str, file_utils.WatchedFileObject] = {}
+        # Files waiting to settle, by path: (size, mtime_ns, time of the last change)
+        self._pending: dict[str, tuple[int, int, float]] = {}
+        self._processing: set[str] = set()
+        # Directories seen by the scans, by path: (mtime_ns, subdirectories)
+        self._dirs: dict[Path, tuple[int, list[Path]]] = {}
+        self._wake = asyncio.Event()
+        self._inotify: Inotify | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    #region Discovery
+    def _scan(self, root: Path, changed_only: bool = False) -> list[tuple[Path, int, int]]:
+        """
+        Lists the Matroska files under a directory as (path, size, mtime_ns). With `changed_only`, only the
+        directories whose mtime changed since the last scan are listed again, the others cost one stat.
+        """
+        files = []
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime_ns = directory.stat().st_mtime_ns
+            except OSError:
+                self._dirs.pop(directory, None)
+                continue
+            known = self._dirs.get(directory)
+            if changed_only and known is not None and known[0] == mtime_ns:
+                stack.extend(known[1])
+                continue
+
+            subdirs = []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.name.startswith("."):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(Path(entry.path))
+                        elif entry.name.lower().endswith(MATROSKA_EXTENSIONS) and entry.is_file():
+                            stat = entry.stat()
+                            files.append((Path(entry.path), stat.st_size, stat.st_mtime_ns))
+            except OSError as e:
+                logger.warning("Could not list %s: %s", directory, e)
+                continue
+            self._dirs[directory] = (mtime_ns, subdirs)
+            stack.extend(subdirs)
+        return files
+
+    def _consider(self, path: Path, size: int, mtime_ns: int):
+        """Starts the settle wait of a new or changed file."""
+        key = str(path)
+        entry = self.index.get(key)
+        if entry is not None and (entry.size, entry.mtime_ns) == (size, mtime_ns):
+            return
+        pending = self._pending.get(key)
+        if pending is None or pending[:2] != (size, mtime_ns):
+            self._pending[key] = (size, mtime_ns, time.monotonic())
+            self._wake.set()
+
+    async def _rescan(self, root: Path, changed_only: bool = False):
+        for path, size, mtime_ns in await asyncio.to_thread(self._scan, root, changed_only):
+            self._consider(path, size, mtime_ns)
+
+    def _on_inotify(self):
+        for path, mask in self._inotify.read():
+            if path is None:
+                logger.warning("Inotify events were lost, rescanning %s", self.watch_dir)
+                self._spawn(self._rescan(self.watch_dir))
+            elif mask & IN_ISDIR:
+                if path.name.startswith("."):
+                    continue
+                # Files may have landed in the directory before it was watched
+                try:
+                    self._inotify.add_tree(path)
+                except OSError as e:
+                    logger.error("Could not watch %s: %s", path, e)
+                self._spawn(self._rescan(path))
+            elif not path.name.startswith(".") and path.suffix.lower() in MATROSKA_EXTENSIONS:
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                self._consider(path, stat.st_size, stat.st_mtime_ns)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            await self._rescan(self.watch_dir, changed_only=True)
+
+    async def _settle(self):
+        """Queues the pending files once their size and mtime stopped changing for `settle_time`."""
+        while True:
+            if not self._pending:
+                await self._wake.wait()
+                self._wake.clear()
+                continue
+            await asyncio.sleep(min(SETTLE_CHECK_INTERVAL, self.settle_time))
+            now = time.monotonic()
+            for key, (size, mtime_ns, since) in list(self._pending.items()):
+                try:
+                    stat = os.stat(key)
+                except OSError:
+                    del self._pending[key]
+                    continue
+                if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                    self._pending[key] = (stat.st_size, stat.st_mtime_ns, now)
+                elif now - since >= self.settle_time and key not in self._processing:
+                    # A file changed while it was processed is queued again once that run is done
+                    del self._pending[key]
+                    self._processing.add(key)
+                    self._spawn(self._process(Path(key), size, mtime_ns))
+    #endregion
+
+    #region Processing
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _extract(self, path: Path, work_dir: Path) -> extraction.ExtractionResult:
+        if MKVService.get_mkv_formatted_info(str(path)) is None:
+            raise RuntimeError("mkvmerge could not identify the file")
+        return extraction.extract_file(
+            str(path), work_dir, extraction_type=self.extraction_type, track_filter=self.track_filter,
+            # Discord takes parts of at most 10 MB, the output directory whole zips
+            split_size=SPLIT_SIZE if self.channel is not None else 0
+        )
+
+    async def _deliver(self, path: Path, result: extraction.ExtractionResult):
+        relative = path.relative_to(self.watch_dir)
+        if self.channel is None:
+            destination = self.output_dir / relative.parent / path.stem
+            # A changed file replaces the results of its previous version
+            await asyncio.to_thread(shutil.rmtree, destination, True)
+            destination.mkdir(parents=True, exist_ok=True)
+            for output in result.paths:
+                await asyncio.to_thread(shutil.move, output, destination / output.name)
+            return
+
+        from interactions import File
+
+        summary = f"`{relative}`\n```"
+        for content, count in result.counts().items():
+            summary += f"{extraction.CONTENT_LABELS[content]}: {count}\n"
+        if self.track_filter:
+            summary += f"Filters: {self.track_filter}\n"
+        summary += "```"
+        for zipped, track_type in ((result.subtitles, "subs"), (result.attachments, "attachments"), (result.audio, "audio")):
+            if zipped and len(zipped.paths) > 1:
+                summary += f"{get_merge_commands(zipped.paths, track_type)}\n"
+
+        files = [File(file=str(output), file_name=output.name) for output in result.paths]
+        # Discord takes at most 10 files per message
+        chunks = [files[i:i + 10] for i in range(0, len(files), 10)] or [[]]
+        await self.channel.send(content=summary, files=chunks[0])
+        for chunk in chunks[1:]:
+            await self.channel.send(files=chunk)
+
+    async def _process(self, path: Path, size: int, mtime_ns: int):
+        """Extracts a settled file in a slot of the scheduler, then records it in the index."""
+        job_id = f"watch-{uuid.uuid4().hex[:8]}"
+        ticket = job_scheduler.enqueue(job_id, WATCH_USER, WATCH_USER, url=str(path), background=True)
+        try:
+            if not await job_scheduler.wait(ticket):
+                return
+            try:
+                stat = path.stat()
+            except OSError:
+                return
+            # The file changed while it waited for a slot, it settles again
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                self._consider(path, stat.st_size, stat.st_mtime_ns)
+                return
+
+            logger.info("Extracting %s from the watch folder.", path)
+            start = time.perf_counter()
+            status = "completed"
+            try:
+                result = await asyncio.to_thread(self._extract, path, file_utils.get_job_extract_dir(job_id))
+                await self._deliver(path, result)
+                logger.info("Extracted %s in %.2fs: %s", path, time.perf_counter() - start, result.counts())
+            except Exception as e:
+                status = "failed"
+                logger.error("Failed to extract %s from the watch folder: %s", path, e)
+            finally:
+                await asyncio.to_thread(file_utils.clear_job_dirs, job_id)
+
+            self.index[str(path)] = file_utils.WatchedFileObject(
+                path=str(path), size=size, mtime_ns=mtime_ns, status=status, processed_at=time.time()
+            )
+            await asyncio.to_thread(file_utils.save_watch_index, dict(self.index))
+        finally:
+            job_scheduler.release(ticket)
+            self._processing.discard(str(path))
+    #endregion
+
+    async def start(self, bot=None) -> bool:
+        """Starts watching, returns False if the configuration is invalid."""
+        if self.extraction_type not in extraction.EXTRACTION_TYPES:
+            logger.error("Invalid WATCH_EXTRACTION_TYPE %s, choose from: %s", self.extraction_type, ", ".join(extraction.EXTRACTION_TYPES))
+            return False
+        try:
+            self.track_filter = parse_track_filter(WATCH_FILTERS)
+        except ValueError as e:
+            logger.error("Invalid WATCH_FILTERS: %s", e)
+            return False
+        if not self.watch_dir.is_dir():
+            logger.error("Watch folder %s is not a directory.", self.watch_dir)
+            return False
+        if WATCH_CHANNEL_ID and bot is not None:
+            try:
+                self.channel = await bot.fetch_channel(int(WATCH_CHANNEL_ID))
+            except Exception as e:
+                logger.error("Could not fetch the watch folder channel %s: %s", WATCH_CHANNEL_ID, e)
+                return False
+
+        self.index = await asyncio.to_thread(file_utils.load_watch_index)
+        if not self.polling:
+            try:
+                self._inotify = Inotify()
+                await asyncio.to_thread(self._inotify.add_tree, self.watch_dir)
+                asyncio.get_running_loop().add_reader(self._inotify.fd, self._on_inotify)
+            except (OSError, AttributeError) as e:
+                logger.warning("Inotify unavailable (%s), polling %s every %.0fs instead.", e, self.watch_dir, self.poll_interval)
+                if self._inotify is not None:
+                    self._inotify.close()
+                    self._inotify = None
+
+        # Catch up with the files that landed while the bot was down, and forget the removed ones
+        found = await asyncio.to_thread(self._scan, self.watch_dir)
+        existing = {str(path) for path, _, _ in found}
+        removed = [key for key in self.index if key not in existing]
+        for key in removed:
+            del self.index[key]
+        if removed:
+            await asyncio.to_thread(file_utils.save_watch_index, dict(self.index))
+        for path, size, mtime_ns in found:
+            self._consider(path, size, mtime_ns)
+
+        self._spawn(self._settle())
+        if self._inotify is None:
+            self._spawn(self._poll())
+        logger.info(
+            "Watching %s (%s), %d files already processed, results to %s.", self.watch_dir,
+            "inotify" if self._inotify else "polling", len(self.index), f"channel {WATCH_CHANNEL_ID}" if self.channel else self.output_dir
+        )
+        return True
+
+    async def stop(self):
+        """Stops watching, the files being extracted are processed again at the next start."""
+        if self._inotify is not None:
+            asyncio.get_running_loop().remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+        for task in list(self._tasks):
+            task.cancel()
+
+# Shared watcher of the bot, started when WATCH_DIR is set
+folder_watcher = FolderWatcher(WATCH_DIR or ".", WATCH_OUTPUT_DIR, WATCH_SETTLE_TIME, WATCH_POLL_INTERVAL, WATCH_POLLING)
@@ -0,0 +1,90 @@
+"""Watchdog module detecting blocking calls on the event loop."""
+
+import asyncio
+import sys
+import threading
+import time
+import traceback
+
+from config import LOOP_WATCHDOG_INTERVAL, LOOP_WATCHDOG_THRESHOLD
+from utils.logger import get_logger
+from utils.metrics import LOOP_BLOCKED, LOOP_LAG
+
+# Configure logging
+logger = get_logger("watchdog")
+
+class LoopWatchdog:
+    """
+    Measures the event loop scheduling delay and reports the calls blocking it.
+
+    A heartbeat task wakes up every `interval` seconds and records how late it was woken up.
+    A separate thread checks the heartbeat: when it is late by more than `threshold` seconds,
+    the loop is stuck in a synchronous call, and the thread logs the stack of the loop thread
+    (the coroutine frames included) while the call is still running.
+    """
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_lag = 0.0
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._last_beat = time.monotonic()
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG.observe(lag)
+
+    def _watch(self):
+        blocked_since = None
+        while not self._stop.wait(self.interval / 2):
+            overdue = time.monotonic() - self._last_beat - self.interval
+            if overdue <= self.threshold:
+                if blocked_since is not None:
+                    logger.warning(
+                        "Event loop unblocked after %.0f ms.", (time.monotonic() - blocked_since) * 1000,
+                        extra={"event": "loop_unblocked", "fields": {"blocked_ms": round((time.monotonic() - blocked_since) * 1000, 1)}}
+                    )
+                    blocked_since = None
+                continue
+            if blocked_since is not None:
+                continue
+
+            # Dump the stack once per stall, while the blocking call is still running
+            blocked_since = self._last_beat + self.interval
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "(loop thread not found)"
+            LOOP_BLOCKED.inc()
+            logger.warning(
+                "Event loop blocked for more than %.0f ms, loop thread stack:\n%s", overdue * 1000, stack,
+                extra={"event": "loop_blocked", "fields": {"blocked_ms": round(overdue * 1000, 1), "stack": stack}}
+            )
+
+    def start(self):
+        """Starts the heartbeat task and the watchdog thread, must be called from the event loop."""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info("Event loop watchdog started (threshold %.0f ms).", self.threshold * 1000)
+
+    def stop(self):
+        """Stops the watchdog."""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+# Shared watchdog of the bot event loop
+loop_watchdog = LoopWatchdog(LOOP_WATCHDOG_INTERVAL, LOOP_WATCHDOG_THRESHOLD)
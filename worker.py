@@ -0,0 +1,175 @@
+"""
+Worker process running the download and extraction jobs queued by the bot's job broker.
+
+Every worker needs its own Aria2 instance and data directory. Several workers can run on one
+machine, e.g.:
+
+    python worker.py --data-dir ./data/workers/1 --aria2-port 6801
+    python worker.py --data-dir ./data/workers/2 --aria2-port 6802
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+from pathlib import Path
+
+from dotenv import dotenv_values
+
+def configure_environment(args: argparse.Namespace):
+    """Points the configuration at the worker's data directory, must run before any project module is imported."""
+    if args.data_dir:
+        data_dir = Path(args.data_dir).resolve()
+        temp_dir = data_dir / "temp"
+        defaults = {
+            "TEMP_DIR": temp_dir,
+            "DOWNLOAD_DIR": temp_dir / "downloads",
+            "EXTRACT_DIR": temp_dir / "extracted",
+            "JOB_STATE_FILE": data_dir / "job_state.json",
+            "LOG_FILE": data_dir / "logs" / "jobs.jsonl",
+            "PROFILE_DIR": data_dir / "profiles",
+            "RETENTION_INDEX_FILE": data_dir / "retention.json",
+        }
+        for name, value in defaults.items():
+            os.environ[name] = str(value)
+    if args.aria2_port:
+        os.environ["ARIA2_RPC_PORT"] = str(args.aria2_port)
+    if args.broker_url:
+        os.environ["BROKER_URL"] = args.broker_url
+    if args.worker_id:
+        os.environ["WORKER_ID"] = args.worker_id
+    # Workers on one machine share the tmpfs, each stages in its own directory
+    staging_dir = os.getenv("STAGING_DIR") or dotenv_values().get("STAGING_DIR")
+    if staging_dir:
+        name = args.worker_id or (Path(args.data_dir).name if args.data_dir else "worker")
+        os.environ["STAGING_DIR"] = str(Path(staging_dir) / f"worker-{name}")
+    # The bot serves the metrics, a worker only does when given its own port
+    os.environ["METRICS_PORT"] = str(args.metrics_port or "")
+    # A worker always runs its jobs itself
+    os.environ["WORKER_MODE"] = "local"
+
+async def heartbeat(client, job_id: str, interval: float, job_task: asyncio.Task):
+    """Renews the lease of a job, cancelling it when the broker cancelled it or gave it away."""
+    from utils.broker_client import LeaseLostError
+    from utils.logger import get_logger
+    from utils.scheduler import job_scheduler
+
+    logger = get_logger("worker")
+    while not job_task.done():
+        await asyncio.sleep(interval)
+        try:
+            if await client.heartbeat(job_id):
+                job_scheduler.cancel(job_id=job_id)
+        except LeaseLostError:
+            logger.warning("Lost the lease of job %s, stopping it.", job_id)
+            job_task.cancel()
+            return
+        except Exception as e:
+            logger.error("Heartbeat of job %s failed: %s", job_id, e)
+
+async def run_job(client, claimed: dict, lease_timeout: int):
+    """Runs a claimed job with a context streaming its messages to the broker."""
+    from utils import file_utils, utils
+    from utils.broker_client import LeaseLostError, RemoteContext
+    from utils.logger import get_logger
+    from utils.track_filter import parse_track_filter
+
+    logger = get_logger("worker")
+    job_id = claimed["job_id"]
+    ctx = RemoteContext(client, claimed)
+    try:
+        track_filter = parse_track_filter(claimed.get("filters", ""))
+    except ValueError:
+        track_filter = None
+
+    # Resume from the local checkpoint when this worker already ran the job before a restart
+    job = file_utils.get_job(job_id) or file_utils.create_job(
+        job_id=job_id,
+        kind=claimed.get("kind", "extract"),
+        user_id=claimed.get("user_id", ""),
+        guild_id=claimed.get("guild_id", ""),
+        channel_id=claimed.get("channel_id", ""),
+        url=claimed["url"],
+        extraction_type=claimed.get("extraction_type", "all"),
+        filters=claimed.get("filters", ""),
+        full_mediainfo=claimed.get("full_mediainfo", False),
+        queue=claimed.get("queue"),
+        priority=claimed.get("priority", 0),
+    )
+
+    job_task = asyncio.create_task(utils.download_and_extract(
+        ctx, job.url, extraction_type=job.extraction_type, track_filter=track_filter,
+        full_mediainfo=job.full_mediainfo, job=job
+    ))
+    heartbeat_task = asyncio.create_task(heartbeat(client, job_id, min(lease_timeout / 3, 5), job_task))
+    completed = False
+    try:
+        completed = await job_task
+    except asyncio.CancelledError:
+        if not heartbeat_task.done():
+            # The worker is shutting down, the checkpoint is kept for the next claim
+            raise
+        # Lease lost, another worker runs the job from the start
+        utils.cleanup_job(job)
+        file_utils.remove_job(job_id)
+    except LeaseLostError:
+        utils.cleanup_job(job)
+        file_utils.remove_job(job_id)
+        logger.warning("Job %s was given to another worker.", job_id)
+    heartbeat_task.cancel()
+
+    try:
+        await client.finish(job_id, completed)
+    except LeaseLostError:
+        logger.warning("Job %s finished after its lease was lost.", job_id)
+
+async def main(args: argparse.Namespace):
+    from config import BROKER_TOKEN, BROKER_URL, METRICS_HOST, METRICS_PORT, WORKER_ID
+    from utils import metrics
+    from utils.broker_client import BrokerClient
+    from utils.cleanup import trash_collector
+    from utils.retention import retention_store
+    from utils.staging import staging_area
+    from utils.logger import get_logger
+
+    logger = get_logger("worker")
+    worker_id = WORKER_ID or f"{socket.gethostname()}-{os.getpid()}"
+    client = BrokerClient(BROKER_URL, BROKER_TOKEN, worker_id)
+    if METRICS_PORT:
+        await metrics.start_metrics_server(METRICS_HOST, int(METRICS_PORT))
+    trash_collector.reclaim()
+    staging_area.clear()
+    retention_store.start()
+
+    logger.info("Worker %s waiting for jobs from %s", worker_id, BROKER_URL)
+    try:
+        while True:
+            try:
+                claimed, lease_timeout = await client.claim(wait=20)
+            except Exception as e:
+                logger.error("Failed to claim a job: %s", e)
+                await asyncio.sleep(5)
+                continue
+            if claimed is None:
+                continue
+            logger.info("Claimed job %s: %s", claimed["job_id"], claimed.get("url"))
+            await run_job(client, claimed, lease_timeout)
+    finally:
+        await client.close()
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Subxtract download and extraction worker.")
+    parser.add_argument("--data-dir", help="Directory of the worker's temp files and job state.")
+    parser.add_argument("--aria2-port", type=int, help="RPC port of the worker's own Aria2 instance.")
+    parser.add_argument("--broker-url", help="URL of the bot's job broker (defaults to BROKER_URL).")
+    parser.add_argument("--worker-id", help="Name of the worker (defaults to WORKER_ID or <hostname>-<pid>).")
+    parser.add_argument("--metrics-port", type=int, help="Serve the worker's metrics on this port.")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure_environment(arguments)
+    try:
+        asyncio.run(main(arguments))
+    except KeyboardInterrupt:
+        pass